@@ -1,18 +1,81 @@
+import functools
 import os
-import matplotlib.pyplot as plt
-import seaborn as sns
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import MaxAbsScaler
 
 # Importações dos módulos locais (pasta src)
 from src.ingest.loader import FlightDataLoader
-from src.features.engineer import FeatureEngineer
-from src.models.supervised import SupervisedModeler
+from src.features.calendar import DEFAULT_WINDOWS, calendar_feature_names
+from src.features.engineer import FeatureEngineer, SUPERVISED_FEATURES
+from src.features.transformer import FeatureTransformer
+from src.models.supervised import SupervisedModeler, build_model, plot_feature_importance
 from src.models.unsupervised import UnsupervisedModeler
+from src.pipeline.sharded import build_features
+from src.utils.profiling import profile_task
+from src.utils.stage_cache import SourceFile, StageCache
 
-# Configurações Globais de Estilo
-sns.set(style="whitegrid")
-plt.rcParams["figure.figsize"] = (10, 6)
+# PIPELINE_WORKERS>1 (ou -1 = todos os núcleos) calcula carga + features em
+# shards mensais num pool de processos, como o DAG faz com dynamic task mapping
+WORKERS = int(os.getenv("PIPELINE_WORKERS", "1"))
+# SHOW_PLOTS=false roda sem gráficos (e sem importar matplotlib/seaborn)
+SHOW_PLOTS = os.getenv("SHOW_PLOTS", "true").lower() == "true"
+
+
+def setup_plot_style():
+    # Configurações Globais de Estilo (só quando há gráficos)
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    sns.set(style="whitegrid")
+    plt.rcParams["figure.figsize"] = (10, 6)
+
+
+# ==========================================
+# ESTÁGIOS (memoizados pelo StageCache)
+# ==========================================
+
+def stage_load(source: SourceFile, sample_size=None):
+    # Lê do cache Parquet (reconstruído via streaming compacto se o CSV mudou).
+    return FlightDataLoader(file_path=os.fspath(source)).load_cached(sample_size=sample_size)
+
+
+def stage_features(df_raw, threshold: int, features: list, windows=None):
+    # ``features`` escolhe (e ordena) as colunas de X entre as calculadas
+    engineer = FeatureEngineer(df_raw)
+    engineer.create_target_classification(threshold=threshold)
+    if windows:
+        # Mesmas features de calendário usadas pelo DAG (FEATURE_SET=calendar)
+        engineer.add_calendar_features(windows=windows)
+    X, y = engineer.prepare_features_supervised()
+    return X[list(features)], y
+
+
+def stage_features_sharded(source: SourceFile, threshold: int, features: list, windows=None, workers: int = -1):
+    # Cada processo lê só o seu mês do cache Parquet; o resultado é o mesmo do
+    # stage_features (linhas em ordem de mês)
+    X, y = build_features(os.fspath(source), threshold=threshold, windows=windows or (), n_jobs=workers)
+    return X[list(features)], y
+
+
+def stage_train(X, y, models: dict):
+    trainer = SupervisedModeler(X, y)
+    comparison = trainer.train_many(models)
+    return comparison, trainer.models
+
+
+def stage_tune(X, y, space: str, n_candidates: int):
+    trainer = SupervisedModeler(X, y)
+    search = trainer.tune(space, n_candidates=n_candidates)
+    return search.best_estimator_
+
+
+def stage_airport_profile(df_raw):
+    return FeatureEngineer(df_raw).prepare_data_unsupervised()
+
+
+def stage_profiles(df_raw, profiles: list):
+    return tuple(FeatureEngineer(df_raw).prepare_profiles(profiles).values())
 
 
 
@@ -27,43 +90,86 @@ if __name__ == "__main__":
     base_dir = os.path.dirname(os.path.abspath(__file__))
     csv_path = os.path.join(base_dir, "data", "flights.csv")
     
-    loader = FlightDataLoader(file_path=csv_path)
-    
-    # Carrega os dados. Defina sample_size=None para carregar tudo.
-    # Isso permitirá verificar o volume total processado.
-    df_raw = loader.load_data(sample_size=None) 
+    # Estágios já executados com as mesmas entradas (dados, limiar, features,
+    # hiperparâmetros) são lidos do cache em vez de recalculados.
+    cache = StageCache(os.path.join(base_dir, ".stage_cache"))
+    if SHOW_PLOTS:
+        setup_plot_style()
+
+    # Cada estágio vira um span (tempo, CPU, pico de memória, linhas); o
+    # resumo é impresso ao final.
+    with profile_task("main", log=False):
+        @functools.cache
+        def load_raw():
+            # Carrega os dados (uma vez, sob demanda). Defina sample_size=None para
+            # carregar tudo. Em shards (WORKERS != 1) as features leem o cache
+            # Parquet por mês, e a base inteira só entra em memória nos estágios
+            # não supervisionados, depois do treino.
+            return cache.run("load", stage_load, SourceFile(csv_path), sample_size=None)
 
-    if not df_raw.empty:
         # 2. Engenharia de Features
-        engineer = FeatureEngineer(df_raw)
-        engineer.create_target_classification(threshold=15)
-        
-        # 3. Modelagem Supervisionada
-        print("\n--- INICIANDO FASE SUPERVISIONADA ---")
-        X, y = engineer.prepare_features_supervised()
-        
-        trainer = SupervisedModeler(X, y)
-        
-        # Modelo 1: Baseline (Regressão Logística)
-        trainer.train_evaluate("Logistic Regression", LogisticRegression(max_iter=1000))
-        
-        # Modelo 2: Avançado (Random Forest)
-        rf_model = trainer.train_evaluate("Random Forest", RandomForestClassifier(n_estimators=50, random_state=42))
-        trainer.plot_feature_importance("Random Forest", X.columns)
-
-        # 4. Modelagem Não Supervisionada
-        print("\n--- INICIANDO FASE NÃO SUPERVISIONADA ---")
-        # Prepara dados agregados por aeroporto
-        df_airports = engineer.prepare_data_unsupervised()
+        features = SUPERVISED_FEATURES + calendar_feature_names(DEFAULT_WINDOWS)
+        if not os.path.exists(csv_path):
+            # Antes de qualquer estágio: o fingerprint do SourceFile precisa do arquivo
+            print("❌ Arquivo não encontrado.")
+            X = y = None
+        elif WORKERS != 1:
+            X, y = cache.run("features_sharded", stage_features_sharded, SourceFile(csv_path), threshold=15,
+                             features=features, windows=DEFAULT_WINDOWS, workers=WORKERS)
+        elif not load_raw().empty:
+            X, y = cache.run("features", stage_features, load_raw(), threshold=15,
+                             features=features, windows=DEFAULT_WINDOWS)
+        else:
+            X = y = None
+
+        if X is not None and len(X):
+            # 3. Modelagem Supervisionada
+            print("\n--- INICIANDO FASE SUPERVISIONADA ---")
+            # Opcional: RandomForest com hiperparâmetros escolhidos por successive halving
+            tuned = {}
+            if os.getenv("TUNE_HYPERPARAMS", "false").lower() == "true":
+                tuned["Random Forest (tuned)"] = cache.run("tune", stage_tune, X, y, space="random_forest", n_candidates=27)
+
+            # Modelo 1: Baseline (Regressão Logística, com one-hot esparso das categóricas),
+            # Modelo 2: Random Forest e Modelo 3: HistGradientBoosting (categóricas nativas),
+            # treinados em paralelo com os dados compartilhados via memmap
+            comparison, models = cache.run("train", stage_train, X, y, models={
+                **tuned,
+                "Logistic Regression": make_pipeline(
+                    FeatureTransformer(categorical=('MONTH', 'DAY_OF_WEEK', 'AIRLINE'), encoding='onehot'),
+                    MaxAbsScaler(),
+                    LogisticRegression(max_iter=1000),
+                ),
+                "Random Forest": RandomForestClassifier(n_estimators=50, random_state=42),
+                "HistGradientBoosting": build_model('hist_gbm'),
+            })
+            print(comparison.to_string(index=False))
+            if SHOW_PLOTS:
+                plot_feature_importance(models["Random Forest"], "Random Forest", X.columns)
+
+            # 4. Modelagem Não Supervisionada
+            print("\n--- INICIANDO FASE NÃO SUPERVISIONADA ---")
+            # Prepara dados agregados por aeroporto
+            df_airports = cache.run("airport_profile", stage_airport_profile, load_raw())
         
-        cluster_modeler = UnsupervisedModeler(df_airports)
+            cluster_modeler = UnsupervisedModeler(df_airports)
         
-        # Análise do cotovelo para decidir K
-        cluster_modeler.find_optimal_k(max_k=8)
+            # Análise do cotovelo para decidir K
+            cluster_modeler.find_optimal_k(max_k=8, plot=SHOW_PLOTS)
         
-        # Supondo que K=3 seja bom após olhar o gráfico
-        df_clustered = cluster_modeler.train_clustering(k=3)
+            # Supondo que K=3 seja bom após olhar o gráfico
+            df_clustered = cluster_modeler.train_clustering(k=3)
         
-        # Interpretação dos Clusters
-        print("\n📊 Perfil dos Clusters (Médias):")
-        print(df_clustered.groupby('CLUSTER').mean())
\ No newline at end of file
+            # Interpretação dos Clusters
+            print("\n📊 Perfil dos Clusters (Médias):")
+            print(df_clustered.groupby('CLUSTER').mean())
+
+            # 5. Perfis de rotas e horários (todos calculados em uma passada)
+            df_routes, df_hours = cache.run("profiles", stage_profiles, load_raw(), profiles=['route', 'hour'])
+            print("\n🕒 Atraso por hora de partida:")
+            print(df_hours[['ARRIVAL_DELAY_MEAN', 'ARRIVAL_DELAY_P90', 'TOTAL_FLIGHTS']])
+            route_modeler = UnsupervisedModeler(df_routes)
+            route_modeler.find_optimal_k(max_k=8, plot=SHOW_PLOTS)
+            df_routes_clustered = route_modeler.train_clustering(k=route_modeler.best_k() or 3)
+            print("\n📊 Perfil dos Clusters de Rotas (Médias):")
+            print(df_routes_clustered.groupby('CLUSTER').mean())
\ No newline at end of file
@@ -0,0 +1,124 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Optional, Sequence
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DAG_FILE = os.path.join(ROOT, 'dags', 'flight_pipeline.py')
+# Tempo máximo (ms) para interpretar o DAG, com o Airflow já carregado (como no scheduler)
+DEFAULT_BUDGET_MS = 50.0
+# Pacotes pesados que não podem ser importados no parse do DAG (só dentro das tasks)
+HEAVY_MODULES = ('pandas', 'numpy', 'sklearn', 'scipy', 'mlflow', 'matplotlib', 'seaborn',
+                 'pyarrow', 'sqlalchemy', 'joblib')
+# Módulos que o scheduler já tem carregados quando interpreta o arquivo
+PRELOAD = ('airflow', 'airflow.models', 'airflow.operators.python')
+MARKER = '@@import_time'
+
+_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+# Executado em um processo novo com -X importtime: carrega o PRELOAD, marca o
+# início no stderr e mede a importação do alvo (arquivo .py ou módulo)
+_PROBE = '''
+import importlib, runpy, sys, time
+for name in {preload!r}:
+    try:
+        importlib.import_module(name)
+    except ImportError:
+        pass
+sys.stderr.write({marker!r} + "\\n")
+sys.stderr.flush()
+start = time.perf_counter()
+target = {target!r}
+if target.endswith(".py"):
+    runpy.run_path(target, run_name="import_time_probe")
+else:
+    importlib.import_module(target)
+sys.stderr.write("%s %.6f\\n" % ({marker!r}, time.perf_counter() - start))
+'''
+
+
+def parse_importtime(stderr: str) -> List[dict]:
+    """Linhas do ``-X importtime`` como dicts (módulo, self/cumulativo em ms, nível)."""
+    rows = []
+    for line in stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            rows.append({
+                'module': match.group(4),
+                'self_ms': int(match.group(1)) / 1000,
+                'cumulative_ms': int(match.group(2)) / 1000,
+                'level': len(match.group(3)) // 2,
+            })
+    return rows
+
+
+def measure(target: str = DAG_FILE, preload: Sequence[str] = PRELOAD) -> dict:
+    """Importa ``target`` em um interpretador novo e mede tempo e módulos carregados."""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(p for p in (ROOT, env.get('PYTHONPATH')) if p)
+    code = _PROBE.format(preload=tuple(preload), marker=MARKER, target=target)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, env=env,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Falha ao importar {target}:\n{proc.stderr[-2000:]}")
+    _, _, after = proc.stderr.partition(MARKER + '\n')
+    body, _, tail = after.rpartition(MARKER + ' ')
+    imports = parse_importtime(body)
+    top = min((r['level'] for r in imports), default=0)
+    return {
+        'target': target,
+        'wall_ms': float(tail.split()[0]) * 1000,
+        'import_ms': sum(r['cumulative_ms'] for r in imports if r['level'] == top),
+        'imports': imports,
+    }
+
+
+def heavy_imports(result: dict, heavy: Sequence[str] = HEAVY_MODULES) -> List[str]:
+    return sorted({r['module'].split('.')[0] for r in result['imports']} & set(heavy))
+
+
+def report(result: dict, top_n: int = 10) -> Dict[str, float]:
+    """Imprime o resumo e os imports mais caros; retorna o tempo por módulo de topo."""
+    imports = result['imports']
+    top = min((r['level'] for r in imports), default=0)
+    costs = {r['module']: r['cumulative_ms'] for r in imports if r['level'] == top}
+    print(f"⏱️ {os.path.relpath(result['target'], ROOT) if result['target'].endswith('.py') else result['target']}: "
+          f"{result['wall_ms']:.1f} ms ({result['import_ms']:.1f} ms em imports, {len(imports)} módulos novos)")
+    for name, ms in sorted(costs.items(), key=lambda kv: -kv[1])[:top_n]:
+        print(f"   {ms:8.1f} ms  {name}")
+    return costs
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Orçamento de tempo de import do DAG (python -X importtime)")
+    parser.add_argument('targets', nargs='*', default=[DAG_FILE],
+                        help="Arquivos .py ou módulos (padrão: o DAG do pipeline)")
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument('--forbid', default=','.join(HEAVY_MODULES),
+                        help="Pacotes que não podem ser importados (vírgula; vazio desliga)")
+    parser.add_argument('--repeat', type=int, default=3, help="Execuções por alvo (vale a mais rápida)")
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args(argv)
+    forbid = [m for m in args.forbid.split(',') if m]
+
+    failed = False
+    for target in args.targets:
+        target = os.path.abspath(target) if target.endswith('.py') else target
+        result = min((measure(target) for _ in range(max(args.repeat, 1))), key=lambda r: r['wall_ms'])
+        report(result, top_n=args.top)
+        heavy = heavy_imports(result, forbid)
+        if heavy:
+            failed = True
+            print(f"❌ Importa pacotes pesados no nível do módulo: {', '.join(heavy)}")
+        if result['wall_ms'] > args.budget_ms:
+            failed = True
+            print(f"❌ Acima do orçamento de {args.budget_ms:.0f} ms")
+        if not heavy and result['wall_ms'] <= args.budget_ms:
+            print(f"✅ Dentro do orçamento de {args.budget_ms:.0f} ms")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,233 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+import pandas as pd
+from src.benchmark.synthetic import GENERATOR_VERSION, synthetic_csv
+from src.utils.profiling import PeakMemory
+
+# Escalas nomeadas -> quantidade de linhas do CSV sintético
+SCALES = {'100k': 100_000, '1M': 1_000_000, '10M': 10_000_000}
+HISTORY_FILE = 'benchmark_history.json'
+DATA_DIR = '.benchmark_data'
+BENCH_TABLE = 'bench_flights'
+# Razão de tempo (atual / referência) acima da qual um estágio conta como regressão
+DEFAULT_TOLERANCE = 1.25
+# Estágios mais rápidos que isso não contam como regressão (ruído de medição)
+MIN_WALL_S = 0.05
+
+
+def parse_scale(scale: str) -> int:
+    """'100k', '1M', '10M' ou um inteiro."""
+    if scale in SCALES:
+        return SCALES[scale]
+    suffix = {'k': 1_000, 'm': 1_000_000}.get(scale[-1:].lower())
+    return int(float(scale[:-1]) * suffix) if suffix else int(scale)
+
+
+def _git_commit() -> Dict[str, object]:
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return {'commit': commit, 'dirty': dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': None, 'dirty': None}
+
+
+class BenchmarkRun:
+    """
+    Executa e mede os estágios do pipeline (carga -> banco -> features ->
+    treino -> clusterização) sobre um CSV sintético.
+
+    Cada estágio registra tempo de parede, CPU do processo, pico de RSS (e o
+    quanto subiu durante o estágio) e linhas processadas.
+    """
+    def __init__(self, rows: int, db_url: Optional[str] = None, data_dir: str = DATA_DIR, seed: int = 42,
+                 max_k: int = 8, n_jobs: int = -1, train_rows: Optional[int] = None):
+        self.rows = rows
+        self.data_dir = data_dir
+        self.db_url = db_url or f"sqlite:///{os.path.abspath(os.path.join(data_dir, f'bench_{rows}.db'))}"
+        self.seed = seed
+        self.max_k = max_k
+        self.n_jobs = n_jobs
+        self.train_rows = train_rows
+        self.steps: Dict[str, dict] = {}
+
+    def measure(self, name: str, fn: Callable, rows: Optional[Callable] = None):
+        """Executa ``fn()`` medindo tempo/memória; ``rows(result)`` conta as linhas."""
+        gc.collect()
+        cpu = time.process_time()
+        start = time.perf_counter()
+        with PeakMemory() as mem:
+            result = fn()
+        wall = time.perf_counter() - start
+        self.steps[name] = {
+            'wall_s': round(wall, 4),
+            'cpu_s': round(time.process_time() - cpu, 4),
+            'peak_rss_mb': round(mem.peak / 1024 ** 2, 1),
+            'rss_delta_mb': round(mem.delta / 1024 ** 2, 1),
+            'rows': int(rows(result)) if rows else None,
+        }
+        print(f"⏱️ {name}: {wall:.2f}s | pico {mem.peak / 1024 ** 2:.0f} MB (+{mem.delta / 1024 ** 2:.0f} MB)")
+        return result
+
+    def run(self) -> dict:
+        from src.ingest.loader import FlightDataLoader
+        from src.utils.storage import get_engine, read_table
+        from src.features.engineer import FeatureEngineer
+        from src.models.compact import CompactForest
+        from src.models.supervised import SupervisedModeler, build_model
+        from src.models.unsupervised import UnsupervisedModeler
+
+        csv_path = synthetic_csv(self.data_dir, self.rows, seed=self.seed)
+        print(f"\n📏 Benchmark com {self.rows:,} linhas | banco: {self.db_url.split('://')[0]}")
+
+        loader = FlightDataLoader(csv_path, cache_dir=os.path.join(self.data_dir, '.flights_cache'))
+        df = self.measure('load_data', loader.load_data, rows=len)
+        self.measure('save_to_db', lambda: loader.save_to_db(BENCH_TABLE, self.db_url), rows=lambda _: len(df))
+        engine = get_engine(self.db_url)
+        self.measure('read_table', lambda: read_table(engine, BENCH_TABLE), rows=len)
+        engine.dispose()
+
+        engineer = FeatureEngineer(df)
+        self.measure('create_target_classification', engineer.create_target_classification, rows=len)
+        X, y = self.measure('prepare_features_supervised', engineer.prepare_features_supervised,
+                            rows=lambda r: len(r[0]))
+
+        if self.train_rows and len(X) > self.train_rows:
+            X = X.sample(n=self.train_rows, random_state=self.seed)
+            y = y.loc[X.index]
+        trainer = SupervisedModeler(X, y)
+        model = self.measure('train_evaluate', lambda: trainer.train_evaluate('RandomForest', build_model('random_forest')),
+                             rows=lambda _: len(trainer.X_train))
+        compact = self.measure('export_compact', lambda: CompactForest.from_estimator(model))
+        self.measure('predict_proba', lambda: model.predict_proba(trainer.X_test), rows=len)
+        self.measure('compact_predict_proba', lambda: compact.predict_proba(trainer.X_test), rows=len)
+
+        profile = self.measure('prepare_data_unsupervised', engineer.prepare_data_unsupervised, rows=len)
+        clusterer = UnsupervisedModeler(profile)
+        self.measure('find_optimal_k', lambda: clusterer.find_optimal_k(max_k=self.max_k, n_jobs=self.n_jobs, plot=False),
+                     rows=lambda _: len(profile))
+        self.measure('train_clustering', lambda: clusterer.train_clustering(clusterer.best_k() or 3), rows=len)
+
+        return {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            **_git_commit(),
+            'rows': self.rows,
+            'db': self.db_url.split('://')[0],
+            'seed': self.seed,
+            'generator_version': GENERATOR_VERSION,
+            'train_rows': self.train_rows,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'steps': self.steps,
+        }
+
+
+def load_history(path: str = HISTORY_FILE) -> List[dict]:
+    if not os.path.exists(path):
+        return []
+    with open(path) as fh:
+        return json.load(fh).get('runs', [])
+
+
+def append_history(result: dict, path: str = HISTORY_FILE):
+    """Acrescenta um resultado ao histórico JSON (escrita atômica)."""
+    runs = load_history(path) + [result]
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as fh:
+        json.dump({'runs': runs}, fh, indent=2)
+    os.replace(tmp, path)
+
+
+def _comparable(run: dict, other: dict) -> bool:
+    keys = ('rows', 'db', 'seed', 'generator_version', 'train_rows')
+    return all(run.get(k) == other.get(k) for k in keys)
+
+
+def compare(runs: List[dict], current: Optional[dict] = None, baseline: Optional[str] = None,
+            tolerance: float = DEFAULT_TOLERANCE) -> pd.DataFrame:
+    """Compara uma execução com a referência no histórico.
+
+    A referência é a última execução comparável (mesmas linhas, banco,
+    semente e gerador) anterior a ``current`` ou, com ``baseline``, a última
+    desse commit. Retorna uma linha por estágio com as razões de tempo e
+    memória; ``regression`` marca quem ficou mais lento que ``tolerance``
+    (ignorando estágios abaixo de ``MIN_WALL_S``).
+    """
+    current = current or (runs[-1] if runs else None)
+    if current is None:
+        return pd.DataFrame()
+    candidates = [r for r in runs if r is not current and _comparable(r, current)
+                  and (baseline is None or r.get('commit') == baseline)]
+    if not candidates:
+        return pd.DataFrame()
+    ref = candidates[-1]
+    rows = []
+    for step, stats in current['steps'].items():
+        base = ref['steps'].get(step)
+        if base is None:
+            continue
+        ratio = stats['wall_s'] / base['wall_s'] if base['wall_s'] else float('nan')
+        rows.append({
+            'step': step,
+            'ref_commit': ref.get('commit'),
+            'ref_wall_s': base['wall_s'],
+            'wall_s': stats['wall_s'],
+            'wall_ratio': round(ratio, 3),
+            'ref_peak_rss_mb': base['peak_rss_mb'],
+            'peak_rss_mb': stats['peak_rss_mb'],
+            'regression': bool(ratio > tolerance and stats['wall_s'] >= MIN_WALL_S),
+        })
+    return pd.DataFrame(rows)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline com dados sintéticos")
+    parser.add_argument('--scales', default='100k', help="Escalas separadas por vírgula (100k, 1M, 10M ou inteiros)")
+    parser.add_argument('--db-url', default=None, help="URL SQLAlchemy (padrão: SQLite local por escala)")
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--history', default=HISTORY_FILE)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--max-k', type=int, default=8)
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('--train-rows', type=int, default=None, help="Amostra de linhas para o treino (padrão: todas)")
+    parser.add_argument('--baseline', default=None, help="Commit de referência na comparação")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--fail-on-regression', action='store_true')
+    parser.add_argument('--no-save', action='store_true', help="Não grava no histórico")
+    args = parser.parse_args(argv)
+
+    regressions = False
+    for scale in args.scales.split(','):
+        bench = BenchmarkRun(parse_scale(scale.strip()), db_url=args.db_url, data_dir=args.data_dir, seed=args.seed,
+                             max_k=args.max_k, n_jobs=args.n_jobs, train_rows=args.train_rows)
+        result = bench.run()
+        runs = load_history(args.history)
+        if not args.no_save:
+            append_history(result, args.history)
+            print(f"🗂️ Resultado salvo em {args.history}")
+        report = compare(runs + [result], current=result, baseline=args.baseline, tolerance=args.tolerance)
+        if report.empty:
+            print("ℹ️ Sem execução anterior comparável no histórico.")
+            continue
+        print(report.to_string(index=False))
+        if report['regression'].any():
+            regressions = True
+            print(f"⚠️ Regressão acima de {args.tolerance:.2f}x em: {', '.join(report.loc[report['regression'], 'step'])}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
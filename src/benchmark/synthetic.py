@@ -0,0 +1,120 @@
+import os
+import numpy as np
+import pandas as pd
+from typing import Iterator, Optional
+from src.ingest.loader import COLUMNS
+
+# Muda quando a distribuição gerada muda (invalida os CSVs já gerados)
+GENERATOR_VERSION = 1
+# Companhias do dataset original (2015)
+AIRLINES = ['AA', 'AS', 'B6', 'DL', 'EV', 'F9', 'HA', 'MQ', 'NK', 'OO', 'UA', 'US', 'VX', 'WN']
+N_AIRPORTS = 320
+# Linhas geradas por bloco ao escrever o CSV (limita a memória em 10M linhas)
+CHUNK_ROWS = 1_000_000
+CANCELLED_RATE = 0.015
+DIVERTED_RATE = 0.0025
+
+
+class _Universe:
+    """Aeroportos, companhias e efeitos fixos derivados da semente."""
+    def __init__(self, seed: int):
+        rng = np.random.default_rng(seed)
+        letters = np.array(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+        codes = set()
+        while len(codes) < N_AIRPORTS:
+            codes.add(''.join(rng.choice(letters, 3)))
+        self.airports = np.array(sorted(codes), dtype=object)
+        # Popularidade estilo Zipf: poucos hubs concentram a maior parte dos voos
+        weights = 1.0 / np.arange(1, N_AIRPORTS + 1) ** 1.1
+        self.airport_p = rng.permutation(weights / weights.sum())
+        self.coords = rng.uniform([25.0, -125.0], [48.0, -70.0], size=(N_AIRPORTS, 2))
+        self.airport_effect = rng.normal(0, 6, N_AIRPORTS)
+
+        self.airlines = np.array(AIRLINES, dtype=object)
+        share = rng.uniform(0.3, 1.0, len(AIRLINES))
+        self.airline_p = share / share.sum()
+        self.airline_effect = rng.normal(0, 5, len(AIRLINES))
+
+    def distance(self, origin: np.ndarray, dest: np.ndarray) -> np.ndarray:
+        """Distância aproximada em milhas (haversine) entre os aeroportos."""
+        lat1, lon1 = np.radians(self.coords[origin]).T
+        lat2, lon2 = np.radians(self.coords[dest]).T
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        return np.maximum(3959 * 2 * np.arcsin(np.sqrt(a)), 30).astype(np.int64)
+
+
+def generate_flights(rows: int, seed: int = 42, year: int = 2015, universe: Optional[_Universe] = None,
+                     chunk: int = 0) -> pd.DataFrame:
+    """
+    Voos sintéticos com as colunas do ``FlightDataLoader``.
+
+    Os atrasos dependem de companhia, aeroporto de origem, hora da partida e
+    mês (há sinal para os modelos), com cauda longa como no dado real.
+    Cancelados/desviados vêm com ``ARRIVAL_DELAY`` nulo.
+    """
+    universe = universe or _Universe(seed)
+    rng = np.random.default_rng([seed, chunk])
+
+    start = np.datetime64(f'{year}-01-01')
+    n_days = int((np.datetime64(f'{year + 1}-01-01') - start).astype(int))
+    dates = start + rng.integers(0, n_days, rows).astype('timedelta64[D]')
+    stamp = pd.DatetimeIndex(dates)
+
+    origin = rng.choice(N_AIRPORTS, rows, p=universe.airport_p)
+    dest = rng.choice(N_AIRPORTS, rows, p=universe.airport_p)
+    dest = np.where(dest == origin, (dest + 1) % N_AIRPORTS, dest)
+    airline = rng.choice(len(universe.airlines), rows, p=universe.airline_p)
+
+    # Partidas concentradas entre 6h e 22h
+    hour = np.clip(rng.normal(14, 4.5, rows), 0, 23).astype(np.int64)
+    minute = rng.integers(0, 12, rows) * 5
+    month = stamp.month.to_numpy()
+
+    mean = (universe.airline_effect[airline] + universe.airport_effect[origin]
+            + 0.8 * (hour - 12) + np.where(np.isin(month, (6, 7, 12)), 6.0, 0.0))
+    departure = np.round(mean + rng.exponential(12, rows) - 10)
+    arrival = np.round(departure + rng.normal(-4, 8, rows))
+
+    cancelled = (rng.random(rows) < CANCELLED_RATE).astype(np.int64)
+    diverted = ((rng.random(rows) < DIVERTED_RATE) & (cancelled == 0)).astype(np.int64)
+    arrival = np.where((cancelled | diverted) == 1, np.nan, arrival)
+    departure = np.where(cancelled == 1, np.nan, departure)
+
+    df = pd.DataFrame({
+        'YEAR': year,
+        'MONTH': month,
+        'DAY': stamp.day.to_numpy(),
+        'DAY_OF_WEEK': stamp.dayofweek.to_numpy() + 1,
+        'AIRLINE': universe.airlines[airline],
+        'FLIGHT_NUMBER': rng.integers(1, 7000, rows),
+        'ORIGIN_AIRPORT': universe.airports[origin],
+        'DESTINATION_AIRPORT': universe.airports[dest],
+        'SCHEDULED_DEPARTURE': hour * 100 + minute,
+        'DEPARTURE_DELAY': departure,
+        'DISTANCE': universe.distance(origin, dest),
+        'ARRIVAL_DELAY': arrival,
+        'DIVERTED': diverted,
+        'CANCELLED': cancelled,
+    })
+    return df[COLUMNS]
+
+
+def iter_flights(rows: int, seed: int = 42, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Gera ``rows`` voos em blocos de até ``chunk_rows`` linhas (determinístico pela semente)."""
+    universe = _Universe(seed)
+    for i, start in enumerate(range(0, rows, chunk_rows)):
+        yield generate_flights(min(chunk_rows, rows - start), seed=seed, universe=universe, chunk=i)
+
+
+def synthetic_csv(directory: str, rows: int, seed: int = 42, chunk_rows: int = CHUNK_ROWS) -> str:
+    """CSV sintético com ``rows`` linhas em ``directory`` (reaproveitado se já existir)."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'flights_{rows}_s{seed}_v{GENERATOR_VERSION}.csv')
+    if os.path.exists(path):
+        return path
+    print(f"🧪 Gerando {rows:,} voos sintéticos em {path}...")
+    tmp = path + '.tmp'
+    for i, chunk in enumerate(iter_flights(rows, seed=seed, chunk_rows=chunk_rows)):
+        chunk.to_csv(tmp, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+    os.replace(tmp, path)
+    return path
@@ -0,0 +1,180 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, List, Optional, Sequence
+from src.features.calendar import departure_hour
+
+# Perfis disponíveis: nome -> chaves do group-by
+PROFILES = {
+    'airport': ['ORIGIN_AIRPORT'],
+    'route': ['ORIGIN_AIRPORT', 'DESTINATION_AIRPORT'],
+    'airline_airport': ['AIRLINE', 'ORIGIN_AIRPORT'],
+    'hour': ['DEP_HOUR'],
+}
+PROFILE_METRICS = ['ARRIVAL_DELAY', 'DEPARTURE_DELAY', 'DISTANCE']
+# Bordas fixas dos histogramas (quantis aproximados e combináveis entre lotes)
+HIST_BINS = {
+    'ARRIVAL_DELAY': np.arange(-120, 1505, 5),
+    'DEPARTURE_DELAY': np.arange(-120, 1505, 5),
+    'DISTANCE': np.arange(0, 5050, 50),
+}
+
+
+def add_derived_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Colunas derivadas usadas como chave de perfil (ex.: hora da partida)."""
+    if 'DEP_HOUR' not in df.columns and 'SCHEDULED_DEPARTURE' in df.columns:
+        df = df.assign(DEP_HOUR=departure_hour(df['SCHEDULED_DEPARTURE']).astype(np.int8))
+    return df
+
+
+def _plain_index(obj):
+    """Troca níveis categóricos do índice por valores simples.
+
+    Cada chunk tem suas próprias categorias; sem isso o alinhamento entre
+    parciais de lotes diferentes (``add``) não funcionaria.
+    """
+    idx = obj.index
+    if isinstance(idx, pd.MultiIndex):
+        obj.index = idx.set_levels([lvl.astype(object) if isinstance(lvl, pd.CategoricalIndex) else lvl
+                                    for lvl in idx.levels])
+    elif isinstance(idx, pd.CategoricalIndex):
+        obj.index = idx.astype(object)
+    return obj
+
+
+def _merge(old, new):
+    return new if old is None else old.add(new, fill_value=0)
+
+
+def hist_quantile(counts: np.ndarray, edges: np.ndarray, q: float) -> np.ndarray:
+    """Quantil por linha a partir de histogramas (interpolação linear no bin)."""
+    cum = counts.cumsum(axis=1)
+    target = q * cum[:, -1]
+    idx = np.minimum((cum < target[:, None]).sum(axis=1), counts.shape[1] - 1)
+    rows = np.arange(len(counts))
+    prev = np.where(idx > 0, cum[rows, np.maximum(idx - 1, 0)], 0)
+    in_bin = counts[rows, idx]
+    frac = np.divide(target - prev, in_bin, out=np.zeros(len(counts)), where=in_bin > 0)
+    return edges[idx] + frac * (edges[idx + 1] - edges[idx])
+
+
+class ProfileAggregator:
+    """
+    Agregação de vários perfis (group-bys) em uma única passada pelos dados.
+
+    Para cada perfil guarda estatísticas suficientes e combináveis: contagem,
+    soma e soma dos quadrados por métrica, histogramas de bordas fixas (para
+    quantis aproximados) e pares chave x coluna (para contagem de distintos).
+    Agregadores de lotes ou de workers diferentes são combinados com ``merge``.
+    """
+    def __init__(self, profiles: Optional[Dict[str, List[str]]] = None, metrics: Optional[List[str]] = None,
+                 quantiles: Sequence[float] = (0.5, 0.9), bins: Optional[Dict[str, Sequence[float]]] = None,
+                 distinct: Sequence[str] = ('AIRLINE',)):
+        if profiles is None:
+            profiles = PROFILES
+        elif not isinstance(profiles, dict):
+            profiles = {name: PROFILES[name] for name in profiles}
+        self.profiles = {name: list(keys) for name, keys in profiles.items()}
+        self.metrics = list(metrics or PROFILE_METRICS)
+        self.quantiles = tuple(quantiles)
+        edges = dict(HIST_BINS, **(bins or {}))
+        self.bins = {m: np.asarray(edges[m], dtype=float) for m in self.metrics if m in edges} if self.quantiles else {}
+        self.distinct = list(distinct)
+        self.stats = {name: None for name in self.profiles}
+        self.hists = {name: {m: None for m in self.bins} for name in self.profiles}
+        self.pairs = {name: {c: None for c in self.distinct if c not in keys} for name, keys in self.profiles.items()}
+        self.rows = 0
+
+    def update(self, chunk: pd.DataFrame) -> 'ProfileAggregator':
+        """Acumula um lote em todos os perfis."""
+        if chunk.empty:
+            return self
+        chunk = add_derived_columns(chunk)
+        metrics = [m for m in self.metrics if m in chunk.columns]
+
+        # Valores e bins calculados uma vez por lote e reaproveitados por todos os perfis
+        values = {'n': np.ones(len(chunk))}
+        binned = {}
+        for m in metrics:
+            v = pd.to_numeric(chunk[m], errors='coerce').to_numpy(dtype=np.float64)
+            ok = ~np.isnan(v)
+            v0 = np.where(ok, v, 0.0)
+            values[f'{m}_count'] = ok.astype(np.float64)
+            values[f'{m}_sum'] = v0
+            values[f'{m}_sumsq'] = v0 * v0
+            if m in self.bins:
+                edges = self.bins[m]
+                b = np.clip(np.searchsorted(edges, v0, side='right') - 1, 0, len(edges) - 2)
+                binned[m] = pd.Series(b.astype(np.int16), index=chunk.index).where(ok)
+        values = pd.DataFrame(values, index=chunk.index)
+
+        for name, keys in self.profiles.items():
+            if any(k not in chunk.columns for k in keys):
+                continue
+            by = [chunk[k] for k in keys]
+            part = _plain_index(values.groupby(by, observed=True, sort=False).sum())
+            self.stats[name] = _merge(self.stats[name], part)
+            for m, b in binned.items():
+                if m in self.hists[name]:
+                    h = _plain_index(b.groupby(by + [b.rename(f'{m}_bin')], observed=True, sort=False).size())
+                    # Bins nulos (métrica ausente) ficam de fora; o nível volta a ser inteiro
+                    h.index = h.index.set_levels(h.index.levels[-1].astype(np.int16), level=-1)
+                    self.hists[name][m] = _merge(self.hists[name][m], h)
+            for col in self.pairs[name]:
+                if col in chunk.columns:
+                    p = _plain_index(chunk.groupby(by + [chunk[col]], observed=True, sort=False).size())
+                    self.pairs[name][col] = _merge(self.pairs[name][col], p)
+        self.rows += len(chunk)
+        return self
+
+    def merge(self, other: 'ProfileAggregator') -> 'ProfileAggregator':
+        """Combina os parciais de outro agregador (ex.: de outro worker)."""
+        for name in self.profiles:
+            self.stats[name] = _merge(self.stats[name], other.stats.get(name))
+            for m in self.hists[name]:
+                self.hists[name][m] = _merge(self.hists[name][m], other.hists.get(name, {}).get(m))
+            for col in self.pairs[name]:
+                self.pairs[name][col] = _merge(self.pairs[name][col], other.pairs.get(name, {}).get(col))
+        self.rows += other.rows
+        return self
+
+    def result(self, name: str, min_count: int = 0) -> pd.DataFrame:
+        """Perfil final (uma linha por chave), pronto para o UnsupervisedModeler."""
+        st = self.stats[name]
+        if st is None:
+            return pd.DataFrame()
+        keys = self.profiles[name]
+        out = pd.DataFrame(index=st.index)
+        for m in self.metrics:
+            if f'{m}_count' not in st.columns:
+                continue
+            cnt = st[f'{m}_count'].where(st[f'{m}_count'] > 0)
+            mean = st[f'{m}_sum'] / cnt
+            out[f'{m}_MEAN'] = mean
+            out[f'{m}_STD'] = np.sqrt((st[f'{m}_sumsq'] / cnt - mean ** 2).clip(lower=0))
+            hist = self.hists[name].get(m)
+            if hist is not None:
+                edges = self.bins[m]
+                dense = hist.unstack(f'{m}_bin', fill_value=0).reindex(
+                    index=st.index, columns=range(len(edges) - 1), fill_value=0).to_numpy(dtype=np.float64)
+                for q in self.quantiles:
+                    out[f'{m}_P{int(round(q * 100))}'] = hist_quantile(dense, edges, q)
+        for col, pairs in self.pairs[name].items():
+            if pairs is not None:
+                out[f'{col}_NUNIQUE'] = pairs[pairs > 0].groupby(level=keys).size().reindex(st.index, fill_value=0)
+        out['TOTAL_FLIGHTS'] = st['n'].astype(np.int64)
+        out = out.fillna(0)
+        if min_count:
+            out = out[out['TOTAL_FLIGHTS'] > min_count]
+        return out
+
+    def results(self, min_count: int = 0) -> Dict[str, pd.DataFrame]:
+        return {name: self.result(name, min_count) for name in self.profiles}
+
+
+def build_profiles(chunks: Iterable[pd.DataFrame], profiles=None, min_count: int = 0, **kwargs) -> Dict[str, pd.DataFrame]:
+    """Calcula todos os perfis com uma única leitura dos lotes (ex.: ``loader.iter_chunks()``)."""
+    agg = ProfileAggregator(profiles, **kwargs)
+    for chunk in chunks:
+        agg.update(chunk)
+    print(f"🔄 {len(agg.profiles)} perfis agregados em uma passada ({agg.rows} linhas).")
+    return agg.results(min_count)
@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+from typing import List, Optional, Sequence
+
+# Janelas (em dias) das taxas de atraso móveis por aeroporto/companhia
+DEFAULT_WINDOWS = (7, 28)
+# Distância máxima (dias) considerada na proximidade de feriados
+HOLIDAY_CAP = 30
+# Entidades das taxas móveis: prefixo da feature -> coluna
+ROLLING_KEYS = {'ORIGIN': 'ORIGIN_AIRPORT', 'AIRLINE': 'AIRLINE'}
+
+
+def calendar_feature_names(windows: Sequence[int] = DEFAULT_WINDOWS) -> List[str]:
+    names = ['DEP_HOUR', 'DEP_MINUTE', 'DEP_TIME_SIN', 'DEP_TIME_COS',
+             'DAY_OF_YEAR', 'DOY_SIN', 'DOY_COS', 'DAYS_TO_HOLIDAY', 'DAYS_FROM_HOLIDAY']
+    for prefix in ROLLING_KEYS:
+        for w in windows:
+            names += [f'{prefix}_DELAY_RATE_{w}D', f'{prefix}_FLIGHTS_{w}D']
+    return names + ['ORIGIN_SLOT_FLIGHTS', 'ROUTE_SLOT_FLIGHTS']
+
+
+def departure_hour(hhmm) -> np.ndarray:
+    """Hora da partida a partir do inteiro HHMM (2400 = meia-noite)."""
+    return (np.asarray(hhmm, dtype=np.int64) // 100) % 24
+
+
+def epoch_days(year, month, day) -> np.ndarray:
+    """Dias desde 1970-01-01 a partir de YEAR/MONTH/DAY, sem construir datetimes por linha."""
+    months = (np.asarray(year, dtype=np.int64) - 1970) * 12 + np.asarray(month, dtype=np.int64) - 1
+    return months.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64) + np.asarray(day, dtype=np.int64) - 1
+
+
+def shift_date_key(key: int, days: int) -> int:
+    """Soma ``days`` a uma chave YYYYMMDD (ex.: FLIGHT_DATE)."""
+    d = epoch_days(key // 10000, key // 100 % 100, key % 100) + days
+    return int(pd.Timestamp(np.datetime64(int(d), 'D')).strftime('%Y%m%d'))
+
+
+def _codes(values) -> np.ndarray:
+    """Códigos inteiros >= 0 (nulos viram um grupo próprio)."""
+    return pd.factorize(values, use_na_sentinel=True)[0].astype(np.int64) + 1
+
+
+def holiday_distance(days: np.ndarray, holidays: Optional[np.ndarray] = None, cap: int = HOLIDAY_CAP):
+    """Dias até o próximo feriado e desde o anterior (limitados a ``cap``)."""
+    if holidays is None:
+        from pandas.tseries.holiday import USFederalHolidayCalendar
+        lo, hi = np.datetime64(int(days.min()) - 366, 'D'), np.datetime64(int(days.max()) + 366, 'D')
+        holidays = USFederalHolidayCalendar().holidays(start=str(lo), end=str(hi))
+    hol = np.sort(np.asarray(holidays, dtype='datetime64[D]').astype(np.int64))
+    if len(hol) == 0:
+        full = np.full(len(days), cap, dtype=np.int64)
+        return full, full
+    pos = np.searchsorted(hol, days, side='left')
+    nxt = np.where(pos < len(hol), hol[np.minimum(pos, len(hol) - 1)] - days, cap)
+    # Para o anterior, um feriado no próprio dia conta como distância 0
+    pos_r = np.searchsorted(hol, days, side='right')
+    prv = np.where(pos_r > 0, days - hol[np.maximum(pos_r - 1, 0)], cap)
+    return np.minimum(nxt, cap), np.minimum(prv, cap)
+
+
+def rolling_rate(groups: np.ndarray, days: np.ndarray, events: np.ndarray, window: int):
+    """Contagem e taxa de eventos do grupo nos ``window`` dias anteriores.
+
+    Só usa dias estritamente anteriores ao da linha (sem vazamento do próprio
+    dia). As linhas são agregadas por (grupo, dia) em chaves ordenadas; a
+    soma da janela é a diferença de duas somas acumuladas localizadas com
+    ``searchsorted``.
+    """
+    offset = days - days.min() + window
+    span = int(offset.max()) + 1
+    key = groups * span + offset
+    uniq, inv = np.unique(key, return_inverse=True)
+    inv = inv.ravel()
+    cum_n = np.concatenate([[0], np.cumsum(np.bincount(inv))])
+    cum_e = np.concatenate([[0.0], np.cumsum(np.bincount(inv, weights=events))])
+    # Início da janela: mesmo grupo, ``window`` dias antes (offset garante >= 0)
+    start = np.searchsorted(uniq, uniq - window, side='left')
+    here = np.arange(len(uniq))
+    n = (cum_n[here] - cum_n[start])[inv]
+    e = (cum_e[here] - cum_e[start])[inv]
+    rate = np.divide(e, n, out=np.zeros(len(n)), where=n > 0)
+    return n, rate
+
+
+def slot_counts(*keys: np.ndarray) -> np.ndarray:
+    """Quantidade de linhas que compartilham a mesma combinação de chaves."""
+    key = np.zeros(len(keys[0]), dtype=np.int64)
+    for k in keys:
+        k = np.asarray(k, dtype=np.int64)
+        key = key * (int(k.max()) + 1) + k
+    codes = pd.factorize(key)[0]
+    return np.bincount(codes)[codes]
+
+
+def calendar_features(df: pd.DataFrame, windows: Sequence[int] = DEFAULT_WINDOWS, target: str = 'IS_DELAYED',
+                      threshold: int = 15, holidays=None, events: Optional[np.ndarray] = None) -> pd.DataFrame:
+    """
+    Features de horário/calendário calculadas de forma vetorizada.
+
+    - hora/minuto da partida e codificação cíclica (sin/cos);
+    - dia do ano (sin/cos) e distância a feriados federais dos EUA;
+    - taxa de atraso por aeroporto de origem e companhia nos N dias anteriores;
+    - congestionamento: voos da origem e da rota no mesmo dia e hora.
+
+    ``events`` é o alvo (0/1) por linha; sem ele usa a coluna ``target`` ou
+    ``ARRIVAL_DELAY > threshold``. Retorna só as novas colunas (float32), com
+    o mesmo índice de ``df``.
+    """
+    hhmm = df['SCHEDULED_DEPARTURE'].to_numpy(dtype=np.int64)
+    hour = departure_hour(hhmm)
+    minute = hhmm % 100
+    days = epoch_days(df['YEAR'].to_numpy(), df['MONTH'].to_numpy(), df['DAY'].to_numpy())
+    year_start = (np.asarray(df['YEAR'], dtype=np.int64) - 1970).astype('datetime64[Y]').astype('datetime64[D]').astype(np.int64)
+    doy = days - year_start + 1
+    day_angle = 2 * np.pi * (hour * 60 + minute) / 1440
+    year_angle = 2 * np.pi * (doy - 1) / 365.25
+    to_holiday, from_holiday = holiday_distance(days, holidays)
+
+    out = {
+        'DEP_HOUR': hour, 'DEP_MINUTE': minute,
+        'DEP_TIME_SIN': np.sin(day_angle), 'DEP_TIME_COS': np.cos(day_angle),
+        'DAY_OF_YEAR': doy, 'DOY_SIN': np.sin(year_angle), 'DOY_COS': np.cos(year_angle),
+        'DAYS_TO_HOLIDAY': to_holiday, 'DAYS_FROM_HOLIDAY': from_holiday,
+    }
+
+    if events is not None:
+        events = np.asarray(events, dtype=np.float64)
+    elif target in df.columns:
+        events = df[target].to_numpy(dtype=np.float64)
+    else:
+        events = (df['ARRIVAL_DELAY'].to_numpy(dtype=np.float64) > threshold).astype(np.float64)
+    for prefix, col in ROLLING_KEYS.items():
+        groups = _codes(df[col])
+        for w in windows:
+            n, rate = rolling_rate(groups, days, events, w)
+            out[f'{prefix}_DELAY_RATE_{w}D'] = rate
+            out[f'{prefix}_FLIGHTS_{w}D'] = n
+
+    origin = _codes(df['ORIGIN_AIRPORT'])
+    dest = _codes(df['DESTINATION_AIRPORT'])
+    day_codes = days - days.min()
+    out['ORIGIN_SLOT_FLIGHTS'] = slot_counts(origin, day_codes, hour)
+    out['ROUTE_SLOT_FLIGHTS'] = slot_counts(origin, dest, day_codes, hour)
+
+    return pd.DataFrame({k: np.asarray(v, dtype=np.float32) for k, v in out.items()}, index=df.index)
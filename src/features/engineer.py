@@ -1,36 +1,96 @@
 import pandas as pd
-from typing import Tuple
-from sklearn.preprocessing import LabelEncoder
+from typing import Dict, List, Optional, Tuple
+from src.features.aggregation import ProfileAggregator
+from src.features.calendar import DEFAULT_WINDOWS, calendar_features
+from src.features.transformer import FeatureTransformer
 from src.utils.mlflow_client import active_run, log_param
+from src.utils.profiling import profiled, self_rows
+
+# Features usadas pelos modelos supervisionados (compartilhadas com o backend SQL)
+SUPERVISED_FEATURES = ['MONTH', 'DAY_OF_WEEK', 'AIRLINE', 'DISTANCE', 'SCHEDULED_DEPARTURE']
+# Códigos de aeroporto (opcionais; usados como categóricas nativas no boosting)
+AIRPORT_FEATURES = ['ORIGIN_AIRPORT', 'DESTINATION_AIRPORT']
+# Colunas codificadas pelo vocabulário (as demais são numéricas)
+CATEGORICAL_FEATURES = ['AIRLINE'] + AIRPORT_FEATURES
+# Aeroportos com poucos voos são descartados do perfil não supervisionado
+MIN_AIRPORT_FLIGHTS = 50
 
 
 class FeatureEngineer:
     """
     Responsável por transformar dados brutos em features para ML.
+
+    Não copia nem altera o DataFrame recebido: o alvo e as features novas
+    ficam em objetos separados e o encoding é feito por um ``FeatureTransformer``.
     """
     def __init__(self, df: pd.DataFrame):
-        self.df = df.copy()
-        self.label_encoders = {}
+        self.df = df
+        self.target: Optional[pd.Series] = None
+        # Transformer ajustado (salvo com o modelo e reaproveitado no scoring)
+        self.transformer: Optional[FeatureTransformer] = None
+        # Features adicionais (ex.: calendário) incluídas em prepare_features_supervised
+        self.extra: Optional[pd.DataFrame] = None
+        self.extra_features = []
 
-    def create_target_classification(self, threshold: int = 15) -> pd.DataFrame:
+    @profiled('FeatureEngineer.create_target_classification', rows_in=self_rows('df'))
+    def create_target_classification(self, threshold: int = 15) -> pd.Series:
         """Cria a variável alvo binária: 1 se atrasou > threshold, 0 caso contrário."""
-        # Garante que ARRIVAL_DELAY seja numérico antes da comparação
-        self.df['ARRIVAL_DELAY'] = pd.to_numeric(self.df['ARRIVAL_DELAY'], errors='coerce').fillna(0)
-        self.df['IS_DELAYED'] = (self.df['ARRIVAL_DELAY'] > threshold).astype(int)
+        # ARRIVAL_DELAY já chega numérico (loader/silver); nulo conta como pontual
+        self.target = (self.df['ARRIVAL_DELAY'] > threshold).astype(int).rename('IS_DELAYED')
         print(f"🎯 Target criado: 'IS_DELAYED' (> {threshold} min).")
-        return self.df
+        return self.target
+
+    @profiled('FeatureEngineer.add_calendar_features', rows_in=self_rows('df'), rows_out=None)
+    def add_calendar_features(self, windows=DEFAULT_WINDOWS) -> List[str]:
+        """Adiciona as features de horário/calendário (ver ``src.features.calendar``).
+
+        Deve ser chamado depois de ``create_target_classification``: as taxas
+        móveis de atraso usam o mesmo alvo IS_DELAYED.
+        """
+        events = self.target.to_numpy() if self.target is not None else None
+        self.extra = calendar_features(self.df, windows=windows, events=events)
+        self._add_features(self.extra.columns)
+        print(f"🗓️ {len(self.extra.columns)} features de calendário adicionadas.")
+        return list(self.extra.columns)
+
+    def add_airport_features(self) -> List[str]:
+        """Inclui ORIGIN/DESTINATION_AIRPORT como features categóricas."""
+        self._add_features(AIRPORT_FEATURES)
+        return list(AIRPORT_FEATURES)
+
+    def _add_features(self, columns):
+        for col in columns:
+            if col not in SUPERVISED_FEATURES and col not in self.extra_features:
+                self.extra_features.append(col)
+
+    def _columns(self, features: List[str]) -> Dict[str, pd.Series]:
+        """Colunas de entrada do transformer (sem montar um novo DataFrame)."""
+        extra = self.extra if self.extra is not None else ()
+        return {c: (extra[c] if c in extra else self.df[c]) for c in features}
 
-    def prepare_features_supervised(self) -> Tuple[pd.DataFrame, pd.Series]:
-        """Prepara X e y para modelos supervisionados."""
+    @profiled('FeatureEngineer.prepare_features_supervised', rows_in=self_rows('df'))
+    def prepare_features_supervised(self, categories: Optional[Dict[str, List[str]]] = None,
+                                    transformer: Optional[FeatureTransformer] = None,
+                                    encoding: str = 'ordinal') -> Tuple[pd.DataFrame, pd.Series]:
+        """Prepara X e y para modelos supervisionados.
+
+        ``categories`` fixa o vocabulário do encoder (ex.: todas as companhias
+        já presentes na silver), mantendo os códigos estáveis quando só uma
+        parte dos dados é processada (cargas incrementais). Um ``transformer``
+        já ajustado é reaproveitado sem novo fit. Com ``encoding='onehot'``, X
+        é uma matriz esparsa (CSR) para modelos lineares.
+        """
         # Seleção de Features
-        features = ['MONTH', 'DAY_OF_WEEK', 'AIRLINE', 'DISTANCE', 'SCHEDULED_DEPARTURE']
-        
-        # Encoding de Categóricas (Label Encoding para simplicidade de Tree-models)
-        # Em produção, OneHotEncoding seria melhor para Regressão Logística
-        if 'AIRLINE' in features:
-            le = LabelEncoder()
-            self.df['AIRLINE'] = le.fit_transform(self.df['AIRLINE'].astype(str))
-            self.label_encoders['AIRLINE'] = le
+        features = list(SUPERVISED_FEATURES) + self.extra_features
+        columns = self._columns(features)
+
+        # Encoding de Categóricas: códigos do vocabulário ordenado (iguais aos do
+        # LabelEncoder) para árvores; one-hot/target encoding para modelos lineares
+        if transformer is None:
+            categorical = tuple(c for c in CATEGORICAL_FEATURES if c in features)
+            transformer = FeatureTransformer(features=features, categorical=categorical, encoding=encoding)
+            transformer.fit(columns, self.target, categories=categories)
+        self.transformer = transformer
             
         # Registrar as features selecionadas no MLflow (só se houver run ativo)
         print("📝 Registrando features no MLflow...")
@@ -41,11 +101,12 @@ class FeatureEngineer:
             # Em ambientes sem MLflow configurado, seguir sem erro
             pass
         
-        X = self.df[features].fillna(0)
-        y = self.df['IS_DELAYED']
+        X = transformer.transform(columns)
+        y = self.target
         
         return X, y
 
+    @profiled('FeatureEngineer.prepare_data_unsupervised', rows_in=self_rows('df'))
     def prepare_data_unsupervised(self) -> pd.DataFrame:
         """
         Agrega dados por Aeroporto de Origem para clusterização.
@@ -67,7 +128,7 @@ class FeatureEngineer:
         if count_col:
             agg_dict[count_col] = 'count'
         
-        airport_profile = self.df.groupby('ORIGIN_AIRPORT').agg(agg_dict)
+        airport_profile = self.df.groupby('ORIGIN_AIRPORT', observed=True).agg(agg_dict)
         
         # Normaliza nome da coluna de total de voos
         if count_col and count_col != 'FLIGHT_NUMBER':
@@ -77,6 +138,17 @@ class FeatureEngineer:
         
         # Filtra aeroportos muito pequenos para evitar ruído
         if 'TOTAL_FLIGHTS' in airport_profile.columns:
-            airport_profile = airport_profile[airport_profile['TOTAL_FLIGHTS'] > 50]
+            airport_profile = airport_profile[airport_profile['TOTAL_FLIGHTS'] > MIN_AIRPORT_FLIGHTS]
         
         return airport_profile
+
+    @profiled('FeatureEngineer.prepare_profiles', rows_in=self_rows('df'), rows_out=None)
+    def prepare_profiles(self, profiles=None, min_count: int = MIN_AIRPORT_FLIGHTS, **kwargs) -> Dict[str, pd.DataFrame]:
+        """
+        Perfis agregados para clusterização (aeroporto, rota, companhia x
+        aeroporto, hora da partida...) calculados em uma única passada.
+        Para dados em lotes use ``build_profiles(loader.iter_chunks())``.
+        """
+        agg = ProfileAggregator(profiles, **kwargs).update(self.df)
+        print(f"🔄 Perfis agregados: {', '.join(agg.profiles)}.")
+        return agg.results(min_count)
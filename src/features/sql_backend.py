@@ -0,0 +1,157 @@
+from sqlalchemy import inspect, text
+from typing import List, Optional, Tuple
+from src.features.engineer import CATEGORICAL_FEATURES, SUPERVISED_FEATURES, MIN_AIRPORT_FLIGHTS
+from src.utils.mlflow_client import active_run, log_param
+from src.utils.profiling import current_span, profiled
+from src.utils.storage import table_exists
+
+
+def _q(col: str) -> str:
+    return '"' + col.replace('"', '""') + '"'
+
+
+class SQLFeatureEngineer:
+    """
+    Backend "in-database" do FeatureEngineer.
+
+    Compila os mesmos passos do caminho pandas em SQL e os executa como
+    ``CREATE TABLE AS`` / ``INSERT ... SELECT`` dentro do banco, sem trazer
+    as linhas para o worker:
+
+    - target: ``CASE WHEN COALESCE(ARRIVAL_DELAY, 0) > threshold``;
+    - AIRLINE (e aeroportos, se pedidos): posição no vocabulário ordenado
+      (equivalente ao LabelEncoder);
+    - perfil de aeroportos: ``GROUP BY ORIGIN_AIRPORT`` com ``HAVING``.
+    """
+    def __init__(self, engine, source_table: str, where: Optional[str] = None, params: Optional[dict] = None,
+                 features: Optional[List[str]] = None):
+        self.engine = engine
+        self.source_table = source_table
+        self.features = list(features or SUPERVISED_FEATURES)
+        # Filtro opcional das linhas processadas (ex.: intervalo incremental).
+        # Os vocabulários das categóricas são sempre calculados sobre a tabela inteira.
+        self.where = where
+        self.params = dict(params or {})
+        self.threshold = None
+        self.source_columns = [c['name'] for c in inspect(engine).get_columns(source_table)]
+
+    def _collate(self) -> str:
+        # LabelEncoder ordena por code point, igual à collation binária
+        return ' COLLATE "C"' if self.engine.dialect.name == 'postgresql' else ''
+
+    def _where_sql(self) -> str:
+        return f" WHERE {self.where}" if self.where else ''
+
+    def create_target_classification(self, threshold: int = 15) -> str:
+        """Registra o limiar e devolve a expressão SQL do alvo IS_DELAYED."""
+        self.threshold = threshold
+        print(f"🎯 Target (SQL) definido: 'IS_DELAYED' (> {threshold} min).")
+        return self._target_sql()
+
+    def _target_sql(self) -> str:
+        if self.threshold is None:
+            raise ValueError("Chame create_target_classification antes de preparar as features.")
+        return f'CASE WHEN COALESCE(s.{_q("ARRIVAL_DELAY")}, 0) > :threshold THEN 1 ELSE 0 END'
+
+    def compile_supervised(self, extra_columns: Optional[List[str]] = None) -> Tuple[str, List[str], dict]:
+        """Gera o SELECT das features supervisionadas.
+
+        Retorna (sql, colunas de saída, parâmetros).
+        """
+        collate = self._collate()
+        categorical = [c for c in self.features if c in CATEGORICAL_FEATURES]
+        select = []
+        for feat in self.features:
+            if feat in categorical:
+                select.append(f'v{categorical.index(feat)}.code AS {_q(feat)}')
+            else:
+                # Equivalente ao fillna(0) do caminho pandas
+                select.append(f'COALESCE(s.{_q(feat)}, 0) AS {_q(feat)}')
+        select.append(f'{self._target_sql()} AS {_q("IS_DELAYED")}')
+        columns = self.features + ['IS_DELAYED']
+        for col in extra_columns or []:
+            select.append(f's.{_q(col)}')
+            columns.append(col)
+
+        # Um vocabulário (CTE) por categórica; LabelEncoder trata nulos como a string 'nan'
+        ctes, joins = [], []
+        for i, col in enumerate(categorical):
+            key = "COALESCE(CAST({alias}" + _q(col) + " AS TEXT), 'nan')"
+            ctes.append(
+                f"vocab{i} AS ("
+                f"SELECT k, ROW_NUMBER() OVER (ORDER BY k{collate}) - 1 AS code "
+                f"FROM (SELECT DISTINCT {key.format(alias='')} AS k FROM {self.source_table}) d"
+                f")"
+            )
+            joins.append(f" JOIN vocab{i} v{i} ON v{i}.k = {key.format(alias='s.')}")
+        sql = (
+            (f"WITH {', '.join(ctes)} " if ctes else '')
+            + f"SELECT {', '.join(select)} FROM {self.source_table} s"
+            + ''.join(joins)
+            + self._where_sql()
+        )
+        params = dict(self.params, threshold=self.threshold)
+        return sql, columns, params
+
+    @profiled('SQLFeatureEngineer.prepare_features_supervised', rows_out=None)
+    def prepare_features_supervised(self, target_table: str = 'gold_features', if_exists: str = 'replace',
+                                    extra_columns: Optional[List[str]] = None) -> List[str]:
+        """Materializa X + IS_DELAYED em ``target_table`` dentro do banco."""
+        sql, columns, params = self.compile_supervised(extra_columns)
+        self._materialize(sql, columns, params, target_table, if_exists)
+
+        print("📝 Registrando features no MLflow...")
+        try:
+            if active_run() is not None:
+                log_param("selected_features", list(self.features))
+        except Exception:
+            pass
+        return columns
+
+    def compile_unsupervised(self) -> Tuple[str, List[str], dict]:
+        """Gera o GROUP BY por ORIGIN_AIRPORT equivalente ao caminho pandas."""
+        select = [f'{_q("ORIGIN_AIRPORT")}']
+        columns = ['ORIGIN_AIRPORT']
+        for col in ('ARRIVAL_DELAY', 'DEPARTURE_DELAY', 'DISTANCE'):
+            if col in self.source_columns:
+                select.append(f'AVG(CAST({_q(col)} AS DOUBLE PRECISION)) AS {_q(col)}')
+                columns.append(col)
+        if 'AIRLINE' in self.source_columns:
+            select.append(f'COUNT(DISTINCT {_q("AIRLINE")}) AS {_q("AIRLINE")}')
+            columns.append('AIRLINE')
+        count_col = 'FLIGHT_NUMBER' if 'FLIGHT_NUMBER' in self.source_columns else self.source_columns[0]
+        count_sql = f'COUNT({_q(count_col)})'
+        select.append(f'{count_sql} AS {_q("TOTAL_FLIGHTS")}')
+        columns.append('TOTAL_FLIGHTS')
+
+        sql = (
+            f"SELECT {', '.join(select)} FROM {self.source_table}{self._where_sql()} "
+            f"GROUP BY {_q('ORIGIN_AIRPORT')} HAVING {count_sql} > :min_flights"
+        )
+        return sql, columns, dict(self.params, min_flights=MIN_AIRPORT_FLIGHTS)
+
+    @profiled('SQLFeatureEngineer.prepare_data_unsupervised', rows_out=None)
+    def prepare_data_unsupervised(self, target_table: str = 'gold_airport_profile', if_exists: str = 'replace') -> List[str]:
+        """Materializa o perfil agregado por aeroporto em ``target_table``."""
+        print("🔄 Agregando dados por Aeroporto (SQL)...")
+        sql, columns, params = self.compile_unsupervised()
+        self._materialize(sql, columns, params, target_table, if_exists)
+        return columns
+
+    def _materialize(self, sql: str, columns: List[str], params: dict, target_table: str, if_exists: str):
+        exists = table_exists(self.engine, target_table)
+        if exists and if_exists == 'fail':
+            raise ValueError(f"Tabela '{target_table}' já existe.")
+        with self.engine.begin() as conn:
+            if exists and if_exists == 'replace':
+                conn.execute(text(f"DROP TABLE {target_table}"))
+                exists = False
+            if exists:
+                cols = ', '.join(_q(c) for c in columns)
+                result = conn.execute(text(f"INSERT INTO {target_table} ({cols}) {sql}"), params)
+            else:
+                result = conn.execute(text(f"CREATE TABLE {target_table} AS {sql}"), params)
+            s = current_span()
+            if s is not None and result.rowcount is not None and result.rowcount >= 0:
+                s.rows_out = result.rowcount
+        print(f"✅ Tabela '{target_table}' materializada no banco.")
@@ -0,0 +1,230 @@
+import re
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Mapping, Optional, Sequence
+from sklearn.base import BaseEstimator, TransformerMixin
+
+# Valor usado para categorias fora do vocabulário do treino
+UNKNOWN_CODE = -1
+# Artefato (log_dict) com o transformer ajustado, salvo junto ao modelo
+TRANSFORMER_ARTIFACT = 'encoders/transformer.json'
+# LabelEncoder/astype(str) transformam nulos na string 'nan'
+NULL_KEY = 'nan'
+
+_INTEGRAL_TEXT = re.compile(r'^-?\d+\.0+$')
+
+
+def category_key(value) -> str:
+    """Texto canônico de uma categoria: números inteiros sem '.0'.
+
+    A mesma categoria pode chegar como int (1), float (1.0) ou texto ('1.0')
+    conforme o caminho dos dados; todas viram '1'.
+    """
+    if isinstance(value, (float, np.floating)) and np.isfinite(value) and float(value).is_integer():
+        return str(int(value))
+    text = str(value)
+    return text.split('.', 1)[0] if _INTEGRAL_TEXT.match(text) else text
+
+
+class VocabularyEncoder:
+    """
+    Encoding O(1) por linha a partir de um vocabulário ordenado.
+
+    Para colunas categóricas monta uma tabela de lookup (categoria de entrada
+    -> código do treino) uma única vez por conjunto de categorias e depois só
+    indexa ``lookup[codes]``. Valores desconhecidos viram ``unknown`` em vez de
+    levantar erro como o ``LabelEncoder.transform``.
+    """
+    def __init__(self, classes: Sequence[str], unknown: int = UNKNOWN_CODE):
+        self.classes = np.asarray(sorted(str(c) for c in classes), dtype=object)
+        self.unknown = unknown
+        self._lookups: Dict[tuple, np.ndarray] = {}
+        # Códigos pela ordem de ``classes``; a busca usa a forma canônica (1, 1.0 e '1.0' -> '1')
+        self._codes = {category_key(c): i for i, c in enumerate(self.classes)}
+        self._null_code = self._codes.get(NULL_KEY, unknown)
+
+    @classmethod
+    def from_label_encoder(cls, encoder, unknown: int = UNKNOWN_CODE) -> 'VocabularyEncoder':
+        return cls(encoder.classes_, unknown=unknown)
+
+    def _lookup(self, categories: pd.Index) -> np.ndarray:
+        # Com o dtype na chave, (1, 2) int e (1.0, 2.0) float não dividem a mesma entrada
+        key = (str(categories.dtype), tuple(categories))
+        lookup = self._lookups.get(key)
+        if lookup is None:
+            codes = [self._codes.get(category_key(c), self.unknown) for c in categories]
+            # Última posição reservada para nulos (código -1 do pandas)
+            lookup = np.asarray(codes + [self._null_code], dtype=np.int32)
+            self._lookups[key] = lookup
+        return lookup
+
+    def transform(self, values) -> np.ndarray:
+        values = pd.Series(values, copy=False)
+        if not isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype('category')
+        return self._lookup(values.cat.categories)[values.cat.codes.to_numpy()]
+
+
+def _column(source, col: str) -> pd.Series:
+    return source[col]
+
+
+def _index(source) -> pd.Index:
+    index = getattr(source, 'index', None)
+    if isinstance(index, pd.Index):
+        return index
+    return next(iter(source.values())).index
+
+
+class FeatureTransformer(BaseEstimator, TransformerMixin):
+    """
+    Transformer de features ajustado uma vez e reaproveitado no scoring.
+
+    Guarda o vocabulário ordenado de cada coluna categórica (códigos iguais
+    aos do ``LabelEncoder``) e, no modo ``target``, a média suavizada do alvo
+    por categoria. ``transform`` lê só as colunas de ``features`` (aceita um
+    DataFrame ou um dicionário coluna -> Series), sem copiar o frame inteiro:
+
+    - ``ordinal``: código inteiro por categoria (modelos de árvore);
+    - ``onehot``: matriz CSR esparsa (numéricas + one-hot), para modelos lineares;
+    - ``target``: média do alvo por categoria (float32).
+
+    É serializável em JSON (``to_dict``/``from_dict``) para ser logado no
+    MLflow junto ao modelo, e funciona dentro de um ``Pipeline`` do sklearn.
+    """
+    def __init__(self, features: Optional[List[str]] = None, categorical: Sequence[str] = ('AIRLINE',),
+                 encoding: str = 'ordinal', smoothing: float = 20.0):
+        self.features = features
+        self.categorical = categorical
+        self.encoding = encoding
+        self.smoothing = smoothing
+
+    # ---------- ajuste ----------
+
+    def fit(self, X, y=None, categories: Optional[Mapping[str, Sequence]] = None):
+        """Ajusta vocabulários (e médias do alvo). ``categories`` fixa o vocabulário."""
+        if self.encoding not in ('ordinal', 'onehot', 'target'):
+            raise ValueError(f"encoding inválido: {self.encoding}")
+        self.__dict__.pop('_encoders', None)
+        self.features_ = list(self.features or list(X.keys()))
+        self.categorical_ = [c for c in self.categorical if c in self.features_]
+        self.classes_ = {}
+        for col in self.categorical_:
+            if categories and col in categories:
+                self.classes_[col] = sorted({category_key(c) for c in categories[col]})
+            else:
+                values = _column(X, col)
+                uniques = pd.unique(values.dropna()) if not isinstance(values.dtype, pd.CategoricalDtype) \
+                    else values.cat.categories[np.unique(values.cat.codes[values.cat.codes >= 0])]
+                classes = {category_key(v) for v in uniques}
+                if values.isna().any():
+                    classes.add(NULL_KEY)
+                self.classes_[col] = sorted(classes)
+
+        self.target_means_ = {}
+        if self.encoding == 'target':
+            if y is None:
+                raise ValueError("encoding='target' exige y no fit.")
+            y = np.asarray(y, dtype=np.float64)
+            self.prior_ = float(y.mean()) if len(y) else 0.0
+            for col in self.categorical_:
+                codes = self._encoder(col).transform(_column(X, col))
+                k = len(self.classes_[col])
+                known = codes >= 0
+                n = np.bincount(codes[known], minlength=k)
+                s = np.bincount(codes[known], weights=y[known], minlength=k)
+                self.target_means_[col] = ((s + self.smoothing * self.prior_) / (n + self.smoothing)).tolist()
+        return self
+
+    @classmethod
+    def from_vocabulary(cls, vocabulary: Mapping[str, Sequence[str]], features: Optional[List[str]] = None,
+                        **kwargs) -> 'FeatureTransformer':
+        """Transformer ordinal a partir de um vocabulário já conhecido (ex.: meta da gold)."""
+        from src.features.engineer import SUPERVISED_FEATURES
+        transformer = cls(features=list(features or SUPERVISED_FEATURES), categorical=tuple(vocabulary), **kwargs)
+        transformer.features_ = list(transformer.features)
+        transformer.categorical_ = [c for c in vocabulary if c in transformer.features_]
+        transformer.classes_ = {c: sorted({category_key(v) for v in vocabulary[c]}) for c in transformer.categorical_}
+        transformer.target_means_ = {}
+        return transformer
+
+    def _encoder(self, col: str) -> VocabularyEncoder:
+        cache = self.__dict__.setdefault('_encoders', {})
+        if col not in cache:
+            cache[col] = VocabularyEncoder(self.classes_[col])
+        return cache[col]
+
+    # ---------- transformação ----------
+
+    def _numeric(self, source, col: str) -> np.ndarray:
+        values = _column(source, col)
+        if values.hasnans:
+            values = values.fillna(0)
+        return values.to_numpy()
+
+    def transform(self, X):
+        if self.encoding == 'onehot':
+            return self._transform_sparse(X)
+        out = {}
+        for col in self.features_:
+            if col not in self.categorical_:
+                out[col] = self._numeric(X, col)
+            elif self.encoding == 'target':
+                codes = self._encoder(col).transform(_column(X, col))
+                means = np.append(np.asarray(self.target_means_[col], dtype=np.float32), np.float32(self.prior_))
+                out[col] = means[codes]
+            else:
+                out[col] = self._encoder(col).transform(_column(X, col))
+        return pd.DataFrame(out, index=_index(X), copy=False)
+
+    def _transform_sparse(self, X):
+        from scipy import sparse
+        n = len(_index(X))
+        numeric = [c for c in self.features_ if c not in self.categorical_]
+        blocks = []
+        if numeric:
+            dense = np.empty((n, len(numeric)), dtype=np.float32)
+            for j, col in enumerate(numeric):
+                dense[:, j] = self._numeric(X, col)
+            blocks.append(sparse.csr_matrix(dense))
+        rows = np.arange(n)
+        for col in self.categorical_:
+            codes = self._encoder(col).transform(_column(X, col))
+            known = codes >= 0
+            # Categoria desconhecida: linha toda zerada no bloco
+            blocks.append(sparse.csr_matrix(
+                (np.ones(int(known.sum()), dtype=np.float32), (rows[known], codes[known])),
+                shape=(n, len(self.classes_[col]))))
+        return sparse.hstack(blocks, format='csr')
+
+    def get_feature_names_out(self, input_features=None) -> np.ndarray:
+        if self.encoding != 'onehot':
+            return np.asarray(self.features_, dtype=object)
+        names = [c for c in self.features_ if c not in self.categorical_]
+        for col in self.categorical_:
+            names += [f"{col}_{v}" for v in self.classes_[col]]
+        return np.asarray(names, dtype=object)
+
+    # ---------- serialização ----------
+
+    def to_dict(self) -> dict:
+        data = {
+            'features': self.features_, 'categorical': self.categorical_, 'encoding': self.encoding,
+            'smoothing': self.smoothing, 'classes': self.classes_,
+        }
+        if self.encoding == 'target':
+            data['target_means'] = self.target_means_
+            data['prior'] = self.prior_
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'FeatureTransformer':
+        transformer = cls(features=data['features'], categorical=tuple(data['categorical']),
+                          encoding=data['encoding'], smoothing=data['smoothing'])
+        transformer.features_ = list(data['features'])
+        transformer.categorical_ = list(data['categorical'])
+        transformer.classes_ = {c: list(v) for c, v in data['classes'].items()}
+        transformer.target_means_ = data.get('target_means', {})
+        if 'prior' in data:
+            transformer.prior_ = data['prior']
+        return transformer
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+MANIFEST = 'manifest.json'
+PARTITION_COLS = ['YEAR', 'MONTH']
+
+
+def file_digest(path: str, block_size: int = 8 * 1024 * 1024) -> str:
+    """Hash (blake2b) do conteúdo do arquivo, lido em blocos."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ParquetCache:
+    """
+    Cache colunar (Parquet particionado por YEAR/MONTH) do dataset limpo.
+
+    A chave é (tamanho, mtime, hash) do arquivo de origem. Tamanho e mtime são
+    checados primeiro; o hash só é recalculado quando eles mudam, então um
+    'touch' no CSV não invalida o cache, mas uma edição real invalida.
+    """
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.data_dir = os.path.join(cache_dir, 'data')
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.cache_dir, MANIFEST)
+
+    def _read_manifest(self) -> Optional[dict]:
+        try:
+            with open(self._manifest_path()) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_manifest(self, manifest: dict):
+        tmp = self._manifest_path() + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, self._manifest_path())
+
+    @staticmethod
+    def _stat(source_path: str) -> dict:
+        st = os.stat(source_path)
+        return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+    def is_valid(self, source_path: str) -> bool:
+        """Indica se o cache corresponde ao arquivo de origem atual."""
+        manifest = self._read_manifest()
+        if manifest is None or not os.path.isdir(self.data_dir):
+            return False
+        stat = self._stat(source_path)
+        if manifest['size'] != stat['size']:
+            return False
+        if manifest['mtime_ns'] == stat['mtime_ns']:
+            return True
+        # mtime mudou com o mesmo tamanho: confirma pelo conteúdo
+        if file_digest(source_path) != manifest['hash']:
+            return False
+        manifest.update(stat)
+        self._write_manifest(manifest)
+        return True
+
+    def write(self, df: pd.DataFrame, source_path: str):
+        """Grava o DataFrame particionado por YEAR/MONTH e atualiza o manifesto.
+
+        A escrita vai para um diretório temporário e só então substitui o cache
+        anterior, evitando que um leitor veja partições pela metade.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_dir = self.data_dir + '.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        pq.write_to_dataset(table, root_path=tmp_dir, partition_cols=PARTITION_COLS)
+
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+        os.replace(tmp_dir, self.data_dir)
+
+        manifest = self._stat(source_path)
+        manifest['hash'] = file_digest(source_path)
+        manifest['source'] = os.path.abspath(source_path)
+        manifest['rows'] = int(len(df))
+        self._write_manifest(manifest)
+
+    def read(
+        self,
+        columns: Optional[List[str]] = None,
+        years: Optional[Iterable[int]] = None,
+        months: Optional[Iterable[int]] = None,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """Lê apenas as colunas e partições pedidas, com memory-map dos arquivos.
+
+        ``since`` (YYYYMMDD, exclusivo) traz só os dias posteriores à data e
+        ``until`` (inclusivo) os dias até ela, podando as partições YEAR/MONTH
+        fora do intervalo sem abri-las.
+        """
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+
+        partitioning = ds.partitioning(
+            pa.schema([('YEAR', pa.int16()), ('MONTH', pa.int8())]), flavor='hive'
+        )
+        filters = None
+        if years is not None:
+            filters = ds.field('YEAR').isin(list(years))
+        if months is not None:
+            month_filter = ds.field('MONTH').isin(list(months))
+            filters = month_filter if filters is None else filters & month_filter
+        if since is not None:
+            y, m, d = since // 10000, since // 100 % 100, since % 100
+            year, month, day = ds.field('YEAR'), ds.field('MONTH'), ds.field('DAY')
+            since_filter = (
+                (year > y)
+                | ((year == y) & (month > m))
+                | ((year == y) & (month == m) & (day > d))
+            )
+            filters = since_filter if filters is None else filters & since_filter
+        if until is not None:
+            y, m, d = until // 10000, until // 100 % 100, until % 100
+            year, month, day = ds.field('YEAR'), ds.field('MONTH'), ds.field('DAY')
+            until_filter = (
+                (year < y)
+                | ((year == y) & (month < m))
+                | ((year == y) & (month == m) & (day <= d))
+            )
+            filters = until_filter if filters is None else filters & until_filter
+
+        table = pq.read_table(
+            self.data_dir, columns=columns, filters=filters,
+            partitioning=partitioning, memory_map=True,
+        )
+        df = table.to_pandas(self_destruct=True, split_blocks=True)
+        return df[columns] if columns else df
+
+    def partitions(self) -> Dict[Tuple[int, int], int]:
+        """Linhas por partição (YEAR, MONTH), lidas dos rodapés Parquet."""
+        import pyarrow.parquet as pq
+
+        counts = {}
+        for year_dir in sorted(os.listdir(self.data_dir)):
+            if not year_dir.startswith('YEAR='):
+                continue
+            for month_dir in sorted(os.listdir(os.path.join(self.data_dir, year_dir))):
+                if not month_dir.startswith('MONTH='):
+                    continue
+                path = os.path.join(self.data_dir, year_dir, month_dir)
+                rows = sum(pq.ParquetFile(os.path.join(path, f)).metadata.num_rows
+                           for f in os.listdir(path) if f.endswith('.parquet'))
+                counts[(int(year_dir[5:]), int(month_dir[6:]))] = rows
+        return counts
@@ -1,28 +1,101 @@
+import os
 import pandas as pd
-from sqlalchemy import create_engine
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from src.ingest.cache import ParquetCache
+from src.utils.profiling import add_bytes, profiled, self_rows
+from src.utils.storage import get_engine, save_df
+from src.utils.watermark import date_key
+
+# Colunas essenciais lidas do CSV
+COLUMNS = [
+    'YEAR', 'MONTH', 'DAY', 'DAY_OF_WEEK', 'AIRLINE',
+    'ORIGIN_AIRPORT', 'DESTINATION_AIRPORT', 'DISTANCE',
+    'SCHEDULED_DEPARTURE', 'DEPARTURE_DELAY', 'ARRIVAL_DELAY',
+    'CANCELLED', 'DIVERTED', 'FLIGHT_NUMBER'
+]
+
+# Tipos compactos para o modo streaming: inteiros estreitos para datas/flags,
+# float32 para atrasos (que podem vir NaN) e categóricas para os códigos.
+DTYPES = {
+    'YEAR': 'int16',
+    'MONTH': 'int8',
+    'DAY': 'int8',
+    'DAY_OF_WEEK': 'int8',
+    'AIRLINE': 'category',
+    'ORIGIN_AIRPORT': 'category',
+    'DESTINATION_AIRPORT': 'category',
+    'DISTANCE': 'int16',
+    'SCHEDULED_DEPARTURE': 'int16',
+    'DEPARTURE_DELAY': 'float32',
+    'ARRIVAL_DELAY': 'float32',
+    'CANCELLED': 'int8',
+    'DIVERTED': 'int8',
+    'FLIGHT_NUMBER': 'int16',
+}
+
+DEFAULT_CHUNKSIZE = 500_000
+
+
+def concat_chunks(chunks) -> pd.DataFrame:
+    """Concatena chunks compactos preservando as colunas categóricas.
+
+    Cada chunk infere suas próprias categorias; sem unificá-las o pandas
+    converteria as colunas para object na concatenação.
+    """
+    chunks = list(chunks)
+    if not chunks:
+        return pd.DataFrame(columns=COLUMNS).astype(DTYPES)
+    cat_cols = [c for c in chunks[0].columns if isinstance(chunks[0][c].dtype, pd.CategoricalDtype)]
+    for col in cat_cols:
+        union = pd.api.types.union_categoricals([c[col] for c in chunks], sort_categories=True)
+        dtype = pd.CategoricalDtype(union.categories)
+        for chunk in chunks:
+            chunk[col] = chunk[col].cat.set_categories(dtype.categories)
+    return pd.concat(chunks, ignore_index=True)
+
 
 class FlightDataLoader:
     """
     Responsável por carregar e limpar os dados brutos.
     Princípio: Single Responsibility (S do SOLID).
     """
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, cache_dir: Optional[str] = None):
         self.file_path = file_path
+        # Cache Parquet ao lado do CSV por padrão
+        self.cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(file_path)), '.flights_cache')
         self.df = None
+        self.rows_read = 0
 
-    def load_data(self, sample_size: int = None) -> pd.DataFrame:
-        """Carrega o CSV. Opcionalmente faz amostragem para performance."""
+    def iter_chunks(self, chunksize: int = DEFAULT_CHUNKSIZE) -> Iterator[pd.DataFrame]:
+        """Lê o CSV em blocos com tipos compactos, já limpos.
+
+        Cancelados/desviados são descartados em cada bloco (uma única máscara,
+        sem cópias intermediárias), então o pico de memória fica limitado ao
+        tamanho do bloco mais o que o consumidor acumular.
+        """
+        self.rows_read = 0
+        reader = pd.read_csv(self.file_path, usecols=COLUMNS, dtype=DTYPES, chunksize=chunksize)
+        for chunk in reader:
+            self.rows_read += len(chunk)
+            chunk['ARRIVAL_DELAY'] = chunk['ARRIVAL_DELAY'].fillna(0)
+            chunk['DEPARTURE_DELAY'] = chunk['DEPARTURE_DELAY'].fillna(0)
+            mask = (chunk['CANCELLED'].to_numpy() == 0) & (chunk['DIVERTED'].to_numpy() == 0)
+            yield chunk[mask]
+
+    @profiled('FlightDataLoader.load_data')
+    def load_data(self, sample_size: int = None, chunksize: Optional[int] = None) -> pd.DataFrame:
+        """Carrega o CSV. Opcionalmente faz amostragem para performance.
+
+        Com ``chunksize`` usa o modo streaming (``iter_chunks``) e devolve um
+        único DataFrame compacto.
+        """
         print(f"🔄 Carregando dados de {self.file_path}...")
-        # Lendo colunas essenciais para economizar memória
-        cols = [
-            'YEAR', 'MONTH', 'DAY', 'DAY_OF_WEEK', 'AIRLINE', 
-            'ORIGIN_AIRPORT', 'DESTINATION_AIRPORT', 'DISTANCE', 
-            'SCHEDULED_DEPARTURE', 'DEPARTURE_DELAY', 'ARRIVAL_DELAY', 
-            'CANCELLED', 'DIVERTED', 'FLIGHT_NUMBER'
-        ]
-        
+        if chunksize:
+            return self._load_streaming(sample_size, chunksize)
+
         try:
-            self.df = pd.read_csv(self.file_path, usecols=cols)
+            self.df = pd.read_csv(self.file_path, usecols=COLUMNS)
+            add_bytes(os.path.getsize(self.file_path))
             print(f"📊 Quantidade original de linhas no arquivo: {self.df.shape[0]}")
             
             # Filtros iniciais de consistência
@@ -46,44 +119,95 @@ class FlightDataLoader:
             print("❌ Arquivo não encontrado.")
             return pd.DataFrame()
 
+    def _load_streaming(self, sample_size: Optional[int], chunksize: int) -> pd.DataFrame:
+        try:
+            self.df = concat_chunks(self.iter_chunks(chunksize=chunksize))
+            add_bytes(os.path.getsize(self.file_path))
+        except FileNotFoundError:
+            print("❌ Arquivo não encontrado.")
+            return pd.DataFrame()
+        print(f"📊 Quantidade original de linhas no arquivo: {self.rows_read}")
+
+        if sample_size:
+            self.df = self.df.sample(n=sample_size, random_state=42)
+            print(f"⚠️ Amostragem aplicada: {sample_size} linhas.")
+
+        mem_mb = self.df.memory_usage(deep=True).sum() / 1024 ** 2
+        print(f"✅ Dados carregados (streaming). Shape: {self.df.shape} | {mem_mb:.1f} MB")
+        return self.df
+
+    @profiled('FlightDataLoader.load_cached')
+    def load_cached(
+        self,
+        columns: Optional[List[str]] = None,
+        years: Optional[Iterable[int]] = None,
+        months: Optional[Iterable[int]] = None,
+        sample_size: int = None,
+        chunksize: int = DEFAULT_CHUNKSIZE,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """Carrega o dataset limpo a partir do cache Parquet particionado.
+
+        Se o CSV mudou (tamanho/mtime/hash) ou o cache não existe, faz uma
+        leitura streaming completa e regrava o cache. Leituras seguintes trazem
+        só as colunas e partições (YEAR/MONTH) pedidas. ``since`` (YYYYMMDD,
+        exclusivo) e ``until`` (inclusivo) restringem o intervalo de dias, para
+        cargas incrementais e shards mensais.
+        """
+        if not os.path.exists(self.file_path):
+            print("❌ Arquivo não encontrado.")
+            return pd.DataFrame()
+
+        cache = ParquetCache(self.cache_dir)
+        try:
+            self._ensure_cache(cache, chunksize)
+            self.df = cache.read(columns=columns, years=years, months=months, since=since, until=until)
+        except ImportError:
+            print("⚠️ pyarrow não disponível, lendo direto do CSV.")
+            self.df = self._load_streaming(None, chunksize)
+            if years is not None:
+                self.df = self.df[self.df['YEAR'].isin(list(years))]
+            if months is not None:
+                self.df = self.df[self.df['MONTH'].isin(list(months))]
+            if since is not None:
+                self.df = self.df[date_key(self.df) > since]
+            if until is not None:
+                self.df = self.df[date_key(self.df) <= until]
+            if columns:
+                self.df = self.df[columns]
+
+        if sample_size:
+            self.df = self.df.sample(n=sample_size, random_state=42)
+            print(f"⚠️ Amostragem aplicada: {sample_size} linhas.")
+
+        print(f"✅ Dados carregados do cache. Shape: {self.df.shape}")
+        return self.df
+
+    def _ensure_cache(self, cache: ParquetCache, chunksize: int = DEFAULT_CHUNKSIZE):
+        if not cache.is_valid(self.file_path):
+            print(f"🗃️ Cache ausente ou desatualizado, reconstruindo em {self.cache_dir}...")
+            full = self._load_streaming(None, chunksize)
+            cache.write(full, self.file_path)
+            del full
+
+    def partitions(self, chunksize: int = DEFAULT_CHUNKSIZE) -> Dict[Tuple[int, int], int]:
+        """Linhas por partição (YEAR, MONTH) do cache, reconstruindo-o se preciso.
+
+        Usado para planejar os shards mensais antes de lê-los em paralelo.
+        """
+        cache = ParquetCache(self.cache_dir)
+        self._ensure_cache(cache, chunksize)
+        return cache.partitions()
+
+    @profiled('FlightDataLoader.save_to_db', rows_in=self_rows('df'), rows_out=None)
     def save_to_db(self, table_name: str, db_url: str):
-        """Salva o dataframe atual no banco de dados."""
+        """Salva o dataframe atual no banco de dados.
+
+        As colunas são criadas com tipos derivados dos dtypes (não mais TEXT)
+        e os dados vão via COPY em blocos de tamanho limitado.
+        """
         if self.df is not None and not self.df.empty:
             print(f"💾 Salvando dados na tabela '{table_name}'...")
-            engine = create_engine(db_url)
-            # Pandas aceita um DBAPI connection (com .cursor) ou um SQLAlchemy
-            # connectable. Dependendo da versão, Connection/Engine podem não
-            # expor .cursor(), então tentamos raw_connection() (DBAPI) primeiro
-            # e, em fallback, usamos o engine diretamente.
-            # Implementação robusta para Postgres: criar tabela simples e usar COPY
-            # via DBAPI para carregar os dados em blocos (mais estável que passar
-            # objetos Connection/Engine inconsistentes para pandas em alguns ambientes).
-            try:
-                raw_conn = engine.raw_connection()
-                cur = raw_conn.cursor()
-                try:
-                    # Drop + create table como TEXT para garantir escrita simples
-                    cur.execute(f"DROP TABLE IF EXISTS {table_name};")
-                    cols_ddl = ', '.join([f'"{c}" TEXT' for c in self.df.columns])
-                    cur.execute(f"CREATE TABLE {table_name} ({cols_ddl});")
-
-                    # Usar COPY para inserção rápida
-                    from io import StringIO
-                    csv_buffer = StringIO()
-                    self.df.to_csv(csv_buffer, index=False, header=False)
-                    csv_buffer.seek(0)
-                    cur.copy_expert(f"COPY {table_name} ({', '.join([f'\"{c}\"' for c in self.df.columns])}) FROM STDIN WITH CSV", csv_buffer)
-                    raw_conn.commit()
-                finally:
-                    try:
-                        cur.close()
-                    except Exception:
-                        pass
-                    try:
-                        raw_conn.close()
-                    except Exception:
-                        pass
-            except Exception:
-                # Fallback: usar pandas.to_sql com engine (pior caso)
-                self.df.to_sql(table_name, con=engine, if_exists='replace', index=False, method='multi')
+            save_df(get_engine(db_url), self.df, table_name, if_exists='replace')
             print("✅ Dados salvos com sucesso no banco.")
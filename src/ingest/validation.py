@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+from collections import Counter
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+from src.ingest.loader import DTYPES
+from src.utils.watermark import DATE_KEY
+
+# Esquema declarado da silver: as colunas do CSV (mesmos dtypes compactos do
+# loader) mais a chave diária. Colunas extras da raw não passam.
+SILVER_SCHEMA = dict(DTYPES, **{DATE_KEY: 'int32'})
+# Únicas colunas que aceitam nulo; nas demais o nulo reprova pela regra 'schema'
+NULLABLE = ('DEPARTURE_DELAY',)
+
+# Faixas válidas (inclusivas); nulos das colunas anuláveis passam
+RANGES = {
+    # Milhas: o voo doméstico mais longo dos EUA tem ~4.980
+    'distance': {'DISTANCE': (1, 5000)},
+    # Minutos: de 3 h adiantado a 48 h atrasado
+    'delay': {'DEPARTURE_DELAY': (-180, 2880), 'ARRIVAL_DELAY': (-180, 2880)},
+}
+
+# Chave de um voo: data, companhia, número do voo e origem
+DEDUP_KEY = [DATE_KEY, 'AIRLINE', 'FLIGHT_NUMBER', 'ORIGIN_AIRPORT']
+
+# Regras na ordem de avaliação; a linha vai para a quarentena pela primeira que falhar
+RULES = ('schema', 'distance', 'delay', 'scheduled_departure', 'duplicate')
+
+QUARANTINE_TABLE = 'silver_quarantine'
+# Coluna da quarentena com a regra que reprovou a linha
+REJECT_COLUMN = 'REJECT_RULE'
+
+
+def _coerce(series: pd.Series, dtype: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Converte uma coluna fora do dtype declarado para float64.
+
+    Retorna os valores (NaN onde não é número) e a máscara dos que não cabem
+    em ``dtype`` (inteiros com fração ou fora da faixa do tipo).
+    """
+    if not pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        series = pd.to_numeric(series, errors='coerce')
+    values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    if np.dtype(dtype).kind not in 'iu':
+        return values, np.zeros(len(values), dtype=bool)
+    info = np.iinfo(dtype)
+    with np.errstate(invalid='ignore'):
+        bad = (values != np.floor(values)) | (values < info.min) | (values > info.max)
+    return values, bad & ~np.isnan(values)
+
+
+class SilverValidator:
+    """
+    Validação e limpeza da camada silver, bloco a bloco.
+
+    Cada bloco da raw passa uma única vez por máscaras vetorizadas (esquema,
+    faixas, horário HHMM e duplicatas) e sai dividido em linhas válidas, já
+    nos dtypes de ``SILVER_SCHEMA``, e linhas rejeitadas com a regra em
+    ``REJECT_RULE``. As duplicatas são detectadas por um índice de hashes
+    (uint64, ordenado) da chave ``DEDUP_KEY``, acumulado entre os blocos:
+    fica a primeira ocorrência.
+    """
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self.rows_in = 0
+        self.rows_out = 0
+        self._seen = np.empty(0, dtype=np.uint64)
+
+    def validate(self, chunk: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Separa um bloco em (válidas, rejeitadas)."""
+        missing = [c for c in SILVER_SCHEMA if c not in chunk.columns]
+        if missing:
+            raise ValueError(f"Colunas ausentes para a silver: {', '.join(missing)}")
+
+        n = len(chunk)
+        rule = np.zeros(n, dtype=np.int8)  # 0 = válida; i + 1 = RULES[i]
+
+        def reject(name: str, mask: np.ndarray):
+            rule[(rule == 0) & mask] = RULES.index(name) + 1
+
+        typed = chunk[list(SILVER_SCHEMA)].copy(deep=False)
+        values: Dict[str, np.ndarray] = {}
+        bad = np.zeros(n, dtype=bool)
+        for col, dtype in SILVER_SCHEMA.items():
+            series = chunk[col]
+            if dtype == 'category':
+                null = series.isna().to_numpy()
+            elif series.dtype == np.dtype(dtype):
+                # Já no dtype declarado (raw gravada pelo loader): sem nova conversão
+                values[col] = series.to_numpy()
+                null = np.isnan(values[col]) if values[col].dtype.kind == 'f' else None
+            else:
+                values[col], invalid = _coerce(series, dtype)
+                typed[col] = values[col]
+                null = np.isnan(values[col])
+                bad |= invalid
+            if null is not None and col not in NULLABLE:
+                bad |= null
+        reject('schema', bad)
+
+        with np.errstate(invalid='ignore'):
+            for name, bounds in RANGES.items():
+                for col, (lo, hi) in bounds.items():
+                    reject(name, (values[col] < lo) | (values[col] > hi))
+            hhmm = values['SCHEDULED_DEPARTURE']
+            reject('scheduled_departure', ~((hhmm >= 0) & (hhmm <= 2359) & (hhmm % 100 < 60)))
+
+        valid = rule == 0
+        silver = typed[valid].astype(SILVER_SCHEMA)
+        if len(silver):
+            # Hash com os dtypes já declarados: o mesmo voo tem o mesmo hash em qualquer bloco
+            hashes = pd.util.hash_pandas_object(silver[DEDUP_KEY], index=False).to_numpy()
+            dup = np.ones(len(hashes), dtype=bool)
+            dup[np.unique(hashes, return_index=True)[1]] = False
+            if len(self._seen):
+                pos = np.minimum(np.searchsorted(self._seen, hashes), len(self._seen) - 1)
+                dup |= self._seen[pos] == hashes
+            self._seen = np.union1d(self._seen, hashes[~dup])
+            if dup.any():
+                rows = np.flatnonzero(valid)[dup]
+                rule[rows] = RULES.index('duplicate') + 1
+                valid[rows] = False
+                silver = silver[~dup]
+
+        rejected = chunk[~valid].copy()
+        # Inteiros anuláveis: a tabela da quarentena não ganha NOT NULL
+        for col, dtype in rejected.dtypes.items():
+            if pd.api.types.is_integer_dtype(dtype) and not pd.api.types.is_extension_array_dtype(dtype):
+                rejected[col] = rejected[col].astype(dtype.name.capitalize())
+        rejected[REJECT_COLUMN] = np.asarray(RULES, dtype=object)[rule[~valid] - 1]
+
+        self.rows_in += n
+        self.rows_out += len(silver)
+        self.counts.update(rejected[REJECT_COLUMN].value_counts().to_dict())
+        return silver, rejected
+
+    def iter_clean(self, chunks: Iterable[pd.DataFrame],
+                   on_reject: Optional[Callable[[pd.DataFrame], None]] = None) -> Iterator[pd.DataFrame]:
+        """Valida um fluxo de blocos; as rejeitadas vão para ``on_reject`` (ex.: gravar na quarentena)."""
+        for chunk in chunks:
+            silver, rejected = self.validate(chunk)
+            if len(rejected) and on_reject is not None:
+                on_reject(rejected)
+            yield silver
+
+    def summary(self) -> Dict[str, int]:
+        """Linhas lidas, válidas e rejeitadas por regra."""
+        out = {'rows_in': self.rows_in, 'rows_out': self.rows_out, 'rejected': self.rows_in - self.rows_out}
+        out.update({f"rejected_{name}": int(self.counts.get(name, 0)) for name in RULES})
+        return out
+
+    def report(self) -> Dict[str, int]:
+        summary = self.summary()
+        detail = ', '.join(f"{name}: {self.counts[name]}" for name in RULES if self.counts.get(name))
+        print(f"🧪 Silver: {summary['rows_out']}/{summary['rows_in']} linhas válidas, "
+              f"{summary['rejected']} na quarentena" + (f" ({detail})" if detail else "") + ".")
+        return summary
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.pipeline import make_pipeline
+from typing import Optional, Sequence
+from src.features.engineer import CATEGORICAL_FEATURES
+
+# Limite de categorias por feature do HistGradientBoosting (max_bins)
+MAX_CATEGORIES = 255
+
+
+class CategoryCapper(BaseEstimator, TransformerMixin):
+    """
+    Prepara colunas de códigos (saída do FeatureTransformer) como categóricas
+    nativas do HistGradientBoosting.
+
+    Cada coluna vira ``pd.Categorical`` com categorias 0..k-1, onde k é no
+    máximo ``max_categories - 1``: as categorias mais frequentes no treino
+    ganham um índice próprio e as raras/desconhecidas (ex.: -1) viram nulo,
+    que o boosting trata como um valor ausente. Aceita DataFrame ou array
+    (no array, as colunas são localizadas por ``feature_names_in_``).
+    """
+    def __init__(self, columns: Sequence[str] = tuple(CATEGORICAL_FEATURES), max_categories: int = MAX_CATEGORIES):
+        self.columns = columns
+        self.max_categories = max_categories
+
+    def _frame(self, X) -> pd.DataFrame:
+        if isinstance(X, pd.DataFrame):
+            return X
+        return pd.DataFrame(X, columns=self.feature_names_in_, copy=False)
+
+    def fit(self, X, y=None):
+        if not isinstance(X, pd.DataFrame):
+            raise TypeError("CategoryCapper precisa de um DataFrame no fit (nomes das colunas).")
+        self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        self.lookups_ = {}
+        for col in self.columns:
+            if col not in X.columns:
+                continue
+            codes = np.asarray(X[col], dtype=np.int64)
+            codes = codes[codes >= 0]
+            counts = np.bincount(codes) if len(codes) else np.zeros(0, dtype=np.int64)
+            present = np.flatnonzero(counts)
+            # Mais frequentes primeiro; empate resolvido pelo código
+            top = present[np.lexsort((present, -counts[present]))][:self.max_categories - 1]
+            lookup = np.full(len(counts), -1, dtype=np.int64)
+            lookup[np.sort(top)] = np.arange(len(top))
+            self.lookups_[col] = lookup
+        return self
+
+    def transform(self, X) -> pd.DataFrame:
+        X = self._frame(X)
+        out = X.copy(deep=False)
+        for col, lookup in self.lookups_.items():
+            codes = np.asarray(X[col], dtype=np.int64)
+            valid = (codes >= 0) & (codes < len(lookup))
+            mapped = np.full(len(codes), -1, dtype=np.int64)
+            mapped[valid] = lookup[codes[valid]]
+            n_categories = int(lookup.max()) + 1 if len(lookup) else 0
+            out[col] = pd.Categorical.from_codes(mapped, categories=np.arange(max(n_categories, 1)))
+        return out
+
+    def get_feature_names_out(self, input_features=None) -> np.ndarray:
+        return self.feature_names_in_
+
+
+def hist_gbm(columns: Optional[Sequence[str]] = None, **params):
+    """HistGradientBoosting com categóricas nativas e early stopping.
+
+    O early stopping usa uma fração de validação estratificada separada do
+    treino (``validation_fraction``); ``params`` sobrescrevem os padrões.
+    """
+    defaults = dict(
+        max_iter=500, learning_rate=0.1, max_leaf_nodes=31, early_stopping=True,
+        validation_fraction=0.1, n_iter_no_change=10, categorical_features='from_dtype', random_state=42,
+    )
+    defaults.update(params)
+    return make_pipeline(
+        CategoryCapper(columns=tuple(columns or CATEGORICAL_FEATURES)),
+        HistGradientBoostingClassifier(**defaults),
+    )
@@ -0,0 +1,292 @@
+import os
+import tempfile
+import zipfile
+import numpy as np
+from typing import Dict, Optional
+
+# Diretório dos artefatos compactos no run (ao lado do modelo pickle)
+COMPACT_ARTIFACT_DIR = 'compact_model'
+FORMAT_VERSION = 1
+# Amostras avaliadas por vez: n_árvores x lote posições descem juntas (lotes
+# menores mantêm os índices ativos no cache)
+BATCH_ROWS = 4096
+
+# Formato compacto de um ensemble de árvores (structure-of-arrays).
+#
+# Só os nós internos ocupam espaço: ``feature``/``threshold``/``children``
+# (esquerda, direita)/``missing_left`` são contíguos entre todas as árvores e
+# ``roots`` aponta a raiz de cada uma. Um filho >= 0 é outro nó interno; um filho < 0
+# é uma folha e ``~filho`` indexa ``values``, a tabela de probabilidades das
+# folhas sem repetições (em florestas profundas quase todas as folhas são
+# puras e compartilham a mesma linha).
+#
+# Predições idênticas bit a bit às do sklearn:
+# - o sklearn converte X para float32 e compara ``x <= limiar`` (float64);
+#   o limiar é gravado como o maior float32 <= limiar, que dá o mesmo
+#   resultado para qualquer x float32;
+# - as probabilidades das folhas continuam float64 e são somadas na ordem
+#   das árvores antes da divisão pelo número de árvores, como no
+#   ``predict_proba`` da floresta.
+
+
+def _floor_float32(values: np.ndarray) -> np.ndarray:
+    """Maior float32 <= cada valor float64."""
+    rounded = values.astype(np.float32)
+    above = rounded.astype(np.float64) > values
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+
+def _index_dtype(n: int):
+    return np.int16 if n <= np.iinfo(np.int16).max else np.int32
+
+
+def _estimators(model):
+    """Árvores sklearn (``tree_``) do modelo, na ordem usada pelo ``predict_proba``."""
+    from sklearn.base import is_classifier
+    from sklearn.pipeline import Pipeline
+
+    if isinstance(model, Pipeline):
+        raise ValueError("Exportação compacta não suporta Pipeline (ex.: hist_gbm com CategoryCapper).")
+    if not is_classifier(model):
+        raise ValueError(f"Exportação compacta só suporta classificadores ({type(model).__name__}).")
+    estimators = [model] if hasattr(model, 'tree_') else list(getattr(model, 'estimators_', []))
+    if not estimators or not all(hasattr(e, 'tree_') for e in estimators):
+        raise ValueError(f"Exportação compacta não suporta {type(model).__name__} (só árvores/florestas do sklearn).")
+    if getattr(model, 'n_outputs_', 1) != 1:
+        raise ValueError("Exportação compacta não suporta múltiplas saídas.")
+    return estimators
+
+
+def _npz_memmap(path: str) -> Dict[str, np.ndarray]:
+    """Abre os arrays de um .npz sem compressão como memmap (somente leitura).
+
+    O ``np.load`` ignora ``mmap_mode`` em arquivos .npz; aqui cada membro é
+    localizado no zip e mapeado direto do arquivo.
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as fh:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path}: membro comprimido ({info.filename}), sem memmap.")
+            # Cabeçalho local do zip: 30 bytes + nome + campo extra
+            fh.seek(info.header_offset + 26)
+            name_len, extra_len = np.frombuffer(fh.read(4), dtype='<u2')
+            fh.seek(info.header_offset + 30 + int(name_len) + int(extra_len))
+            version = np.lib.format.read_magic(fh)
+            read_header = (np.lib.format.read_array_header_1_0 if version == (1, 0)
+                           else np.lib.format.read_array_header_2_0)
+            shape, fortran, dtype = read_header(fh)
+            if dtype.hasobject:
+                raise ValueError(f"{path}: array de objetos ({info.filename}).")
+            key = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if not shape or not int(np.prod(shape)):
+                # Escalares e arrays vazios são lidos direto
+                count = int(np.prod(shape))
+                arrays[key] = np.frombuffer(fh.read(count * dtype.itemsize), dtype=dtype, count=count).reshape(shape)
+                continue
+            arrays[key] = np.memmap(path, dtype=dtype, mode='r', offset=fh.tell(), shape=shape,
+                                    order='F' if fortran else 'C')
+    return arrays
+
+
+class CompactForest:
+    """
+    Ensemble de árvores em arrays contíguos, com predição vetorizada em NumPy.
+
+    Criado a partir de uma floresta treinada (``from_estimator``), gravado
+    como .npz sem compressão (``save``) e reaberto como memmap (``load``):
+    a carga não desserializa objetos e os processos que abrem o mesmo
+    arquivo compartilham as páginas. Expõe ``predict_proba``/``predict``,
+    ``classes_`` e ``feature_names_in_`` como o estimador original.
+    """
+    def __init__(self, arrays: Dict[str, np.ndarray], path: Optional[str] = None):
+        self.arrays = arrays
+        self.path = path
+        self.roots = np.asarray(arrays['roots'])
+        self.feature = np.asarray(arrays['feature'])
+        self.threshold = np.asarray(arrays['threshold'])
+        self.children = np.asarray(arrays['children']).reshape(-1)
+        self.missing_left = np.asarray(arrays['missing_left'])
+        self.values = np.asarray(arrays['values'])
+        self.classes_ = np.asarray(arrays['classes'])
+        self.n_features_in_ = int(arrays['n_features'])
+        if 'feature_names' in arrays:
+            self.feature_names_in_ = np.asarray(arrays['feature_names'], dtype=object)
+
+    @classmethod
+    def from_estimator(cls, model) -> 'CompactForest':
+        """Converte uma árvore/floresta de classificação do sklearn."""
+        estimators = _estimators(model)
+        n_classes = len(model.classes_)
+        trees = [e.tree_ for e in estimators]
+        n_internal = [int((t.children_left >= 0).sum()) for t in trees]
+        offsets = np.concatenate([[0], np.cumsum(n_internal)]).astype(np.int64)
+        total = int(offsets[-1])
+        if total >= np.iinfo(np.int32).max:
+            raise ValueError("Ensemble grande demais para índices int32.")
+
+        feature = np.empty(total, dtype=_index_dtype(model.n_features_in_))
+        threshold = np.empty(total, dtype=np.float32)
+        children = np.empty((total, 2), dtype=np.int32)
+        missing_left = np.empty(total, dtype=np.uint8)
+        roots = np.empty(len(trees), dtype=np.int32)
+        leaf_values = []
+        leaf_start = 0
+        for i, tree in enumerate(trees):
+            is_leaf = tree.children_left < 0
+            internal = np.flatnonzero(~is_leaf)
+            leaves = np.flatnonzero(is_leaf)
+            # Referência de cada nó da árvore original no formato compacto
+            ref = np.empty(tree.node_count, dtype=np.int64)
+            ref[internal] = offsets[i] + np.arange(len(internal))
+            ref[leaves] = ~(leaf_start + np.arange(len(leaves)))
+            leaf_start += len(leaves)
+            # Probabilidades das folhas como o DecisionTreeClassifier.predict_proba devolve
+            leaf_values.append(tree.value[leaves, 0, :n_classes])
+
+            span = slice(offsets[i], offsets[i + 1])
+            feature[span] = tree.feature[internal]
+            threshold[span] = _floor_float32(tree.threshold[internal])
+            children[span, 0] = ref[tree.children_left[internal]]
+            children[span, 1] = ref[tree.children_right[internal]]
+            missing_left[span] = tree.missing_go_to_left[internal]
+            roots[i] = ref[0]
+
+        # Folhas com as mesmas probabilidades passam a apontar para uma única linha
+        values, inverse = np.unique(np.concatenate(leaf_values).astype(np.float64), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1).astype(np.int32)
+        for refs in (children, roots):
+            leaf = refs < 0
+            refs[leaf] = ~inverse[~refs[leaf]]
+
+        arrays = {
+            'format_version': np.asarray(FORMAT_VERSION),
+            'roots': roots, 'feature': feature, 'threshold': threshold,
+            'children': children, 'missing_left': missing_left,
+            'values': np.ascontiguousarray(values),
+            'classes': np.asarray(model.classes_),
+            'n_features': np.asarray(model.n_features_in_),
+        }
+        if hasattr(model, 'feature_names_in_'):
+            arrays['feature_names'] = np.asarray(model.feature_names_in_, dtype=str)
+        return cls(arrays)
+
+    def save(self, path: str) -> str:
+        """Grava o .npz (sem compressão, para permitir memmap)."""
+        with open(path, 'wb') as fh:
+            np.savez(fh, **{k: np.asarray(v) for k, v in self.arrays.items()})
+        return path
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'CompactForest':
+        """Abre um .npz gravado por ``save`` (memmap por padrão)."""
+        if mmap:
+            arrays = _npz_memmap(path)
+        else:
+            with np.load(path, allow_pickle=False) as data:
+                arrays = {k: data[k] for k in data.files}
+        version = int(arrays['format_version'])
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{path}: versão do formato compacto {version} (esperada {FORMAT_VERSION}).")
+        return cls(arrays, path=path if mmap else None)
+
+    def __getstate__(self):
+        # Com memmap basta o caminho: cada processo remapeia o mesmo arquivo
+        return {'path': self.path} if self.path else {'arrays': {k: np.asarray(v) for k, v in self.arrays.items()}}
+
+    def __setstate__(self, state):
+        if 'path' in state:
+            other = CompactForest.load(state['path'])
+            self.__dict__.update(other.__dict__)
+        else:
+            self.__init__(state['arrays'])
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(np.asarray(v).nbytes for v in self.arrays.values())
+
+    def _matrix(self, X) -> np.ndarray:
+        if hasattr(X, 'columns') and hasattr(self, 'feature_names_in_'):
+            X = X[list(self.feature_names_in_)]
+        # Mesma conversão do sklearn (_validate_X_predict -> float32)
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X com {X.shape[-1]} features; o modelo espera {self.n_features_in_}.")
+        return X
+
+    def apply(self, X) -> np.ndarray:
+        """Linha de ``values`` alcançada por cada amostra em cada árvore (n_árvores x n)."""
+        X = self._matrix(X)
+        n, n_features = X.shape
+        flat_X = X.reshape(-1)
+        has_missing = bool(np.isnan(flat_X).any())
+        out = np.empty((self.n_trees, n), dtype=np.int32)
+        flat_out = out.reshape(-1)
+        node = np.repeat(self.roots, n)
+        position = np.arange(self.n_trees * n, dtype=np.int64)
+        # Início da linha de cada posição em ``flat_X``
+        offset = np.tile(np.arange(n, dtype=np.int64) * n_features, self.n_trees)
+        # Todas as árvores descem juntas, um nível por iteração; quem chega
+        # a uma folha sai do conjunto ativo
+        while True:
+            leaf = node < 0
+            n_leaves = int(np.count_nonzero(leaf))
+            if n_leaves:
+                flat_out[position[leaf]] = ~node[leaf]
+                if n_leaves == len(node):
+                    return out
+                active = ~leaf
+                node, position, offset = node[active], position[active], offset[active]
+            x = flat_X.take(offset + self.feature.take(node))
+            # Filho da esquerda em 2*nó, da direita em 2*nó + 1
+            go_right = ~(x <= self.threshold.take(node))
+            if has_missing:
+                missing = np.isnan(x)
+                go_right[missing] = self.missing_left.take(node[missing]) == 0
+            node = self.children.take(2 * node + go_right)
+
+    def predict_proba(self, X, batch_rows: int = BATCH_ROWS) -> np.ndarray:
+        X = self._matrix(X)
+        proba = np.zeros((len(X), len(self.classes_)), dtype=np.float64)
+        for start in range(0, len(X), batch_rows):
+            block = proba[start:start + batch_rows]
+            for rows in self.apply(X[start:start + batch_rows]):
+                block += self.values[rows]
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+
+def log_compact_model(model, artifact_path: str) -> Optional[str]:
+    """Exporta o modelo no formato compacto e loga ``compact_model/<artifact_path>.npz``.
+
+    Modelos sem suporte (ex.: pipeline do hist_gbm) são ignorados; retorna o
+    caminho local do arquivo ou None.
+    """
+    from src.utils.mlflow_client import log_artifact
+
+    try:
+        compact = CompactForest.from_estimator(model)
+    except ValueError as exc:
+        print(f"⚠️ Modelo compacto não exportado: {exc}")
+        return None
+    path = os.path.join(tempfile.mkdtemp(prefix='compact_'), f"{artifact_path}.npz")
+    compact.save(path)
+    print(f"🗜️ Modelo compacto: {compact.n_trees} árvore(s), {os.path.getsize(path) / 1e6:.2f} MB")
+    log_artifact(path, artifact_path=COMPACT_ARTIFACT_DIR)
+    return path
+
+
+def load_compact_model(model_uri: str) -> CompactForest:
+    """Baixa e abre o modelo compacto logado junto a ``model_uri`` (ex.: runs:/<id>/random_forest_model)."""
+    from src.utils.mlflow_client import download_artifacts
+
+    run_root, name = model_uri.rstrip('/').rsplit('/', 1)
+    return CompactForest.load(download_artifacts(f"{run_root}/{COMPACT_ARTIFACT_DIR}/{name}.npz"))
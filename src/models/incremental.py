@@ -0,0 +1,176 @@
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from src.features.engineer import FeatureEngineer, SUPERVISED_FEATURES
+from src.features.transformer import FeatureTransformer
+
+# Resolução do split por hash (test_size é arredondado para múltiplos de 1/10000)
+HASH_BUCKETS = 10_000
+
+
+def hash_split(df: pd.DataFrame, test_size: float = 0.3, key_columns: Optional[List[str]] = None,
+               seed: int = 42, target: Optional[str] = 'IS_DELAYED') -> np.ndarray:
+    """Máscara booleana determinística (True = teste) a partir do hash da linha.
+
+    A mesma linha cai sempre no mesmo lado, independente de como os dados
+    foram divididos em lotes. O hash usa ``key_columns`` ou, sem elas, todas
+    as colunas exceto o rótulo ``target``: como não depende do rótulo, a
+    proporção de classes no teste acompanha a do conjunto (estratificação
+    aproximada).
+    """
+    if key_columns:
+        keys = df[key_columns]
+    else:
+        keys = df.drop(columns=[target], errors='ignore') if target else df
+    hashes = pd.util.hash_pandas_object(keys, index=False, hash_key=f"{seed:016d}").to_numpy()
+    return (hashes % HASH_BUCKETS) < int(round(test_size * HASH_BUCKETS))
+
+
+def report_from_confusion(cm: np.ndarray, labels: Sequence) -> Dict[str, dict]:
+    """Métricas por classe (precision/recall/f1/support) a partir da matriz de confusão."""
+    tp = np.diag(cm).astype(float)
+    support = cm.sum(axis=1)
+    predicted = cm.sum(axis=0)
+    precision = np.divide(tp, predicted, out=np.zeros_like(tp), where=predicted > 0)
+    recall = np.divide(tp, support, out=np.zeros_like(tp), where=support > 0)
+    denom = precision + recall
+    f1 = np.divide(2 * precision * recall, denom, out=np.zeros_like(tp), where=denom > 0)
+
+    report = {}
+    for i, label in enumerate(labels):
+        report[str(label)] = {'precision': precision[i], 'recall': recall[i], 'f1-score': f1[i], 'support': int(support[i])}
+    total = int(support.sum())
+    report['accuracy'] = tp.sum() / total if total else 0.0
+    report['macro avg'] = {'precision': precision.mean(), 'recall': recall.mean(), 'f1-score': f1.mean(), 'support': total}
+    weights = support / total if total else np.zeros_like(tp)
+    report['weighted avg'] = {
+        'precision': float(precision @ weights), 'recall': float(recall @ weights),
+        'f1-score': float(f1 @ weights), 'support': total,
+    }
+    return report
+
+
+def format_report(report: Dict[str, dict], digits: int = 2) -> str:
+    """Formata o relatório no mesmo layout do ``classification_report`` do sklearn."""
+    names = [k for k in report if k not in ('accuracy', 'macro avg', 'weighted avg')]
+    width = max(len(n) for n in names + ['weighted avg'])
+    row = f"{{:>{width}s}} " + f" {{:>9.{digits}f}}" * 3 + " {:>9}\n"
+    out = f"{{:>{width}s}} ".format('') + " {:>9}" * 4 + "\n\n"
+    out = out.format('precision', 'recall', 'f1-score', 'support')
+    for n in names:
+        r = report[n]
+        out += row.format(n, r['precision'], r['recall'], r['f1-score'], r['support'])
+    total = report['weighted avg']['support']
+    out += '\n' + (f"{{:>{width}s}} " + " {:>9}" * 2 + f" {{:>9.{digits}f}}" + " {:>9}\n").format(
+        'accuracy', '', '', report['accuracy'], total)
+    for n in ('macro avg', 'weighted avg'):
+        r = report[n]
+        out += row.format(n, r['precision'], r['recall'], r['f1-score'], r['support'])
+    return out
+
+
+def gold_batches(engine, table_name: str = 'gold_features', chunksize: int = 200_000) -> Callable[[], Iterator[pd.DataFrame]]:
+    """Fonte de lotes a partir da tabela gold (cursor do lado do servidor)."""
+    from src.utils.storage import iter_table
+    return lambda: iter_table(engine, table_name, chunksize=chunksize)
+
+
+def loader_batches(loader, airlines: Sequence[str], threshold: int = 15,
+                   chunksize: int = 500_000) -> Callable[[], Iterator[pd.DataFrame]]:
+    """Fonte de lotes direto do CSV: cada chunk passa pelo FeatureEngineer.
+
+    ``airlines`` fixa o vocabulário do encoder; o mesmo transformer (ajustado
+    uma vez) codifica todos os lotes.
+    """
+    transformer = FeatureTransformer.from_vocabulary({'AIRLINE': list(airlines)})
+
+    def batches():
+        for chunk in loader.iter_chunks(chunksize=chunksize):
+            engineer = FeatureEngineer(chunk)
+            engineer.create_target_classification(threshold=threshold)
+            X, y = engineer.prepare_features_supervised(transformer=transformer)
+            yield pd.concat([X, y], axis=1)
+    return batches
+
+
+class IncrementalModeler:
+    """
+    Treinamento out-of-core para estimadores com ``partial_fit``
+    (SGDClassifier, *NB, Perceptron, MLPClassifier...).
+
+    Os lotes vêm de uma função que devolve um iterador novo a cada chamada
+    (ex.: ``gold_batches`` ou ``loader_batches``), de modo que a memória fica
+    limitada ao tamanho do lote. O split treino/teste é feito por hash de cada
+    linha e o relatório de classificação é acumulado em uma matriz de confusão.
+    """
+    def __init__(self, batch_source: Callable[[], Iterable[pd.DataFrame]], target: str = 'IS_DELAYED',
+                 features: Optional[List[str]] = None, classes: Sequence = (0, 1),
+                 test_size: float = 0.3, key_columns: Optional[List[str]] = None, scale: bool = True):
+        self.batch_source = batch_source
+        self.target = target
+        self.features = list(features or SUPERVISED_FEATURES)
+        self.classes = np.asarray(classes)
+        self.test_size = test_size
+        self.key_columns = key_columns
+        self.scaler = StandardScaler() if scale else None
+        self.models = {}
+        self.reports = {}
+
+    def _split_batches(self, want_test: bool) -> Iterator[tuple]:
+        for batch in self.batch_source():
+            if batch.empty:
+                continue
+            mask = hash_split(batch, self.test_size, self.key_columns, target=self.target)
+            part = batch[mask] if want_test else batch[~mask]
+            if part.empty:
+                continue
+            X = part[self.features].to_numpy(dtype=np.float64)
+            y = part[self.target].to_numpy()
+            yield X, y
+
+    def _fit_scaler(self):
+        if self.scaler is None or hasattr(self.scaler, 'mean_'):
+            return
+        print("📏 Calculando estatísticas de escala (1 passada)...")
+        for X, _ in self._split_batches(want_test=False):
+            self.scaler.partial_fit(X)
+
+    def _transform(self, X: np.ndarray) -> np.ndarray:
+        return self.scaler.transform(X) if self.scaler is not None else X
+
+    def train_evaluate(self, model_name: str, model_instance, epochs: int = 1):
+        """Treina lote a lote com ``partial_fit`` e avalia no split de teste.
+
+        Retorna o modelo já encadeado com o scaler (quando houver), pronto
+        para ``predict`` em dados brutos ou para ser logado no MLflow.
+        """
+        if not hasattr(model_instance, 'partial_fit'):
+            raise TypeError(f"{type(model_instance).__name__} não suporta partial_fit.")
+        print(f"\n🚀 Treinando {model_name} (incremental, {epochs} época(s))...")
+        self._fit_scaler()
+
+        n_train = 0
+        for epoch in range(epochs):
+            for X, y in self._split_batches(want_test=False):
+                model_instance.partial_fit(self._transform(X), y, classes=self.classes)
+                if epoch == 0:
+                    n_train += len(y)
+
+        k = len(self.classes)
+        cm = np.zeros((k, k), dtype=np.int64)
+        for X, y in self._split_batches(want_test=True):
+            preds = model_instance.predict(self._transform(X))
+            true_idx = np.searchsorted(self.classes, y)
+            pred_idx = np.searchsorted(self.classes, preds)
+            cm += np.bincount(true_idx * k + pred_idx, minlength=k * k).reshape(k, k)
+
+        report = report_from_confusion(cm, self.classes)
+        print(f"📊 Relatório para {model_name} ({n_train} linhas de treino, {int(cm.sum())} de teste):")
+        print(format_report(report))
+
+        model = make_pipeline(self.scaler, model_instance) if self.scaler is not None else model_instance
+        self.models[model_name] = model
+        self.reports[model_name] = report
+        return model
@@ -0,0 +1,154 @@
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+from src.features.engineer import SUPERVISED_FEATURES
+from src.features.transformer import TRANSFORMER_ARTIFACT, FeatureTransformer
+
+# Artefato (log_dict) com os vocabulários usados no encoding
+VOCAB_ARTIFACT = 'encoders/vocabulary.json'
+
+# Scorers já carregados neste processo (modelo fica "quente" entre chamadas)
+_SCORERS: Dict[str, 'DelayScorer'] = {}
+
+
+class DelayScorer:
+    """
+    Pontuação em lote de atraso de voos com um modelo treinado.
+
+    Carrega modelo e ``FeatureTransformer`` (o mesmo ajustado no treino) uma
+    vez e pontua DataFrames inteiros de forma vetorizada (uma chamada de
+    ``predict_proba`` por lote). Suporta leitura de Parquet e de consultas na
+    silver em streaming, e backfills em vários processos.
+    """
+    def __init__(self, model, transformer: FeatureTransformer):
+        self.model = model
+        self.transformer = transformer
+        self.features = list(transformer.features_)
+
+    @classmethod
+    def from_engineer(cls, model, engineer) -> 'DelayScorer':
+        """Cria o scorer com o transformer ajustado por um ``FeatureEngineer``."""
+        return cls(model, engineer.transformer)
+
+    @classmethod
+    def from_mlflow(cls, model_uri: str, vocabulary: Optional[Dict[str, List[str]]] = None,
+                    compact: bool = False) -> 'DelayScorer':
+        """Carrega (uma vez por processo) o modelo logado e seu transformer.
+
+        Lê o artefato ``encoders/transformer.json`` gravado junto ao modelo
+        pelo treino; runs antigos só têm ``encoders/vocabulary.json``. Um
+        ``vocabulary`` explícito tem precedência. Com ``compact`` usa o
+        ``compact_model/<nome>.npz`` do mesmo run (memmap, sem unpickle).
+        """
+        key = f"{model_uri}#compact" if compact else model_uri
+        if key in _SCORERS:
+            return _SCORERS[key]
+        from src.utils.mlflow_client import load_dict, load_model
+        if compact:
+            from src.models.compact import load_compact_model
+            model = load_compact_model(model_uri)
+        else:
+            model = load_model(model_uri)
+        run_root = model_uri.rsplit('/', 1)[0]
+        features = list(getattr(model, 'feature_names_in_', SUPERVISED_FEATURES))
+        if vocabulary is not None:
+            transformer = FeatureTransformer.from_vocabulary(vocabulary, features)
+        else:
+            try:
+                transformer = FeatureTransformer.from_dict(load_dict(f"{run_root}/{TRANSFORMER_ARTIFACT}"))
+            except Exception:
+                transformer = FeatureTransformer.from_vocabulary(load_dict(f"{run_root}/{VOCAB_ARTIFACT}"), features)
+        scorer = cls(model, transformer)
+        _SCORERS[key] = scorer
+        return scorer
+
+    def transform(self, df: pd.DataFrame):
+        """Monta a matriz de features com o transformer do treino (sem copiar ``df``)."""
+        return self.transformer.transform(df)
+
+    def score_frame(self, df: pd.DataFrame, keep: Optional[List[str]] = None) -> pd.DataFrame:
+        """Pontua um DataFrame: probabilidade de atraso e classe prevista."""
+        X = self.transform(df)
+        proba = self.model.predict_proba(X)[:, 1]
+        out = df[keep].copy() if keep else pd.DataFrame(index=df.index)
+        out['DELAY_PROBA'] = proba.astype(np.float32)
+        out['IS_DELAYED_PRED'] = (proba >= 0.5).astype(np.int8)
+        return out
+
+    def iter_scores(self, chunks: Iterable[pd.DataFrame], keep: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """Pontua um fluxo de lotes, devolvendo um lote pontuado por vez."""
+        for chunk in chunks:
+            if len(chunk):
+                yield self.score_frame(chunk, keep=keep)
+
+    def iter_parquet(self, path: str, batch_size: int = 500_000, keep: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """Pontua um arquivo/diretório Parquet em lotes, lendo só as colunas necessárias."""
+        columns = list(dict.fromkeys(self.features + (keep or [])))
+        dataset = _parquet_dataset(path)
+        batches = (b.to_pandas() for b in dataset.to_batches(columns=columns, batch_size=batch_size))
+        return self.iter_scores(batches, keep=keep)
+
+    def iter_query(self, engine, table_name: str = 'silver_flights', where: Optional[str] = None,
+                   params: Optional[dict] = None, chunksize: int = 200_000,
+                   keep: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """Pontua linhas de uma tabela (ex.: silver_flights) via cursor do servidor."""
+        from src.utils.storage import iter_table
+        columns = list(dict.fromkeys(self.features + (keep or [])))
+        chunks = iter_table(engine, table_name, columns=columns, where=where, params=params, chunksize=chunksize)
+        return self.iter_scores(chunks, keep=keep)
+
+    def backfill(self, paths: Sequence[str], output_dir: str, n_jobs: Optional[int] = None,
+                 keep: Optional[List[str]] = None) -> List[str]:
+        """Pontua vários arquivos Parquet (shards) em paralelo, um processo por shard.
+
+        O scorer é enviado a cada worker uma única vez (initializer); cada
+        shard é gravado em ``output_dir`` com o mesmo nome do arquivo de origem.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        jobs = [(p, os.path.join(output_dir, os.path.basename(p.rstrip('/')) + '.scored.parquet'), keep) for p in paths]
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(self,)) as pool:
+            return list(pool.map(_score_shard, jobs))
+
+
+def _parquet_dataset(path: str):
+    """Abre um dataset Parquet hive, mesmo quando ``path`` é uma única partição.
+
+    Para ``.../YEAR=2015/MONTH=1`` a raiz é detectada subindo os diretórios
+    ``chave=valor``, de modo que YEAR/MONTH continuam disponíveis como colunas.
+    """
+    import glob
+    import pyarrow.dataset as ds
+    base = path.rstrip('/')
+    while '=' in os.path.basename(base):
+        base = os.path.dirname(base)
+    if base == path.rstrip('/') or not os.path.isdir(path):
+        return ds.dataset(path, format='parquet', partitioning='hive')
+    files = sorted(glob.glob(os.path.join(path, '**', '*.parquet'), recursive=True))
+    return ds.dataset(files, format='parquet', partitioning='hive', partition_base_dir=base)
+
+
+_WORKER_SCORER: Optional[DelayScorer] = None
+
+
+def _init_worker(scorer: DelayScorer):
+    global _WORKER_SCORER
+    _WORKER_SCORER = scorer
+
+
+def _score_shard(job) -> str:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    src_path, out_path, keep = job
+    writer = None
+    try:
+        for scored in _WORKER_SCORER.iter_parquet(src_path, keep=keep):
+            table = pa.Table.from_pandas(scored, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(out_path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return out_path
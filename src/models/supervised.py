@@ -1,8 +1,72 @@
+import os
+import pickle
+import shutil
+import tempfile
+import time
 import numpy as np
-from sklearn.model_selection import train_test_split
+import pandas as pd
+from joblib import Parallel, delayed, dump, load
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import ParameterGrid, train_test_split
 from sklearn.metrics import classification_report
-from typing import List
-import matplotlib.pyplot as plt 
+from typing import Dict, List, Optional
+from src.utils.profiling import profiled, self_rows
+
+# Tipos de modelo configuráveis (ex.: Variable MODEL_TYPE do DAG)
+MODEL_TYPES = ('random_forest', 'hist_gbm', 'logistic_regression')
+
+
+def build_model(model_type: str = 'random_forest', **params):
+    """Estimador padrão de cada tipo de modelo; ``params`` sobrescrevem os padrões."""
+    if model_type == 'random_forest':
+        return RandomForestClassifier(**dict(dict(n_estimators=50, random_state=42), **params))
+    if model_type == 'hist_gbm':
+        from src.models.boosting import hist_gbm
+        return hist_gbm(**params)
+    if model_type == 'logistic_regression':
+        return LogisticRegression(**dict(dict(max_iter=1000), **params))
+    raise ValueError(f"model_type inválido: {model_type} (opções: {', '.join(MODEL_TYPES)})")
+
+
+def _share_frame(df: pd.DataFrame, directory: str, prefix: str) -> Dict[str, object]:
+    """Grava cada coluna em disco e a reabre como memmap, no dtype original.
+
+    Colunas numéricas viram arrays memmap (sem conversão para float64: os
+    int8/int16 compactos continuam com o mesmo tamanho); as demais (ex.:
+    categóricas do pandas) são serializadas inteiras.
+    """
+    columns = {}
+    for i, (col, series) in enumerate(df.items()):
+        path = os.path.join(directory, f"{prefix}_{i}.joblib")
+        if isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biuf':
+            dump(np.ascontiguousarray(series.to_numpy()), path)
+            columns[col] = load(path, mmap_mode='r')
+        else:
+            dump(series.reset_index(drop=True), path)
+            columns[col] = load(path)
+    return columns
+
+
+def _fit_score(name: str, estimator, X_train, y_train, X_test, y_test):
+    """Executado no worker: treina e avalia um estimador sobre colunas memmap."""
+    # DataFrame sobre os memmaps (sem cópia), com nomes e dtypes das features
+    X_train = pd.DataFrame(X_train, copy=False)
+    X_test = pd.DataFrame(X_test, copy=False)
+
+    start = time.perf_counter()
+    estimator.fit(X_train, y_train)
+    fit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    preds = estimator.predict(X_test)
+    predict_time = time.perf_counter() - start
+
+    report = classification_report(y_test, preds, output_dict=True, zero_division=0)
+    text = classification_report(y_test, preds, zero_division=0)
+    size = len(pickle.dumps(estimator, protocol=pickle.HIGHEST_PROTOCOL))
+    return name, estimator, fit_time, predict_time, size, report, text
 
 
 class SupervisedModeler:
@@ -16,6 +80,7 @@ class SupervisedModeler:
         )
         self.models = {}
 
+    @profiled('SupervisedModeler.train_evaluate', rows_in=self_rows('X_train'), rows_out=None)
     def train_evaluate(self, model_name: str, model_instance):
         """Treina e avalia um modelo específico."""
         print(f"\n🚀 Treinando {model_name}...")
@@ -28,16 +93,101 @@ class SupervisedModeler:
         self.models[model_name] = model_instance
         return model_instance
 
+    @profiled('SupervisedModeler.train_many', rows_in=self_rows('X_train'), rows_out=None)
+    def train_many(self, models: Optional[Dict[str, object]] = None, estimator=None,
+                   param_grid: Optional[dict] = None, n_jobs: int = -1) -> pd.DataFrame:
+        """Treina e compara vários modelos em paralelo (pool de processos).
+
+        Aceita um dicionário nome -> estimador e/ou um estimador base com uma
+        grade de parâmetros (expandida com ``ParameterGrid``). Os arrays de
+        treino/teste são gravados uma única vez em disco e abertos como memmap
+        pelos workers, em vez de serem serializados para cada processo.
+        Retorna uma tabela comparativa ordenada por F1 macro.
+        """
+        candidates = dict(models or {})
+        if estimator is not None:
+            for params in ParameterGrid(param_grid or {}):
+                label = ', '.join(f"{k}={v}" for k, v in sorted(params.items()))
+                candidates[f"{type(estimator).__name__}({label})"] = clone(estimator).set_params(**params)
+        if not candidates:
+            raise ValueError("Informe 'models' ou 'estimator' para comparar.")
+
+        print(f"\n🚀 Treinando {len(candidates)} modelos em paralelo (n_jobs={n_jobs})...")
+        tmp_dir = tempfile.mkdtemp(prefix='train_many_')
+        try:
+            arrays = {key: _share_frame(value, tmp_dir, key)
+                      for key, value in (('X_train', self.X_train), ('X_test', self.X_test))}
+            for key, value in (('y_train', self.y_train), ('y_test', self.y_test)):
+                path = os.path.join(tmp_dir, f"{key}.joblib")
+                dump(np.ascontiguousarray(np.asarray(value)), path)
+                arrays[key] = load(path, mmap_mode='r')
+
+            results = Parallel(n_jobs=n_jobs, backend='loky')(
+                delayed(_fit_score)(name, est, arrays['X_train'], arrays['y_train'],
+                                    arrays['X_test'], arrays['y_test'])
+                for name, est in candidates.items()
+            )
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        rows = []
+        for name, fitted, fit_time, predict_time, size, report, text in results:
+            print(f"📊 Relatório para {name}:")
+            print(text)
+            self.models[name] = fitted
+            rows.append({
+                'model': name,
+                'fit_time_s': fit_time,
+                'predict_time_s': predict_time,
+                'predict_us_per_row': predict_time / max(len(self.y_test), 1) * 1e6,
+                'model_size_mb': size / 1e6,
+                'accuracy': report['accuracy'],
+                'precision_macro': report['macro avg']['precision'],
+                'recall_macro': report['macro avg']['recall'],
+                'f1_macro': report['macro avg']['f1-score'],
+            })
+
+        comparison = pd.DataFrame(rows).sort_values('f1_macro', ascending=False).reset_index(drop=True)
+        print("🏁 Comparação de modelos:")
+        print(comparison.to_string(index=False))
+        return comparison
+
+    @profiled('SupervisedModeler.tune', rows_in=self_rows('X_train'), rows_out=None)
+    def tune(self, space: str = 'random_forest', estimator=None, param_distributions: Optional[dict] = None,
+             model_name: Optional[str] = None, **search_kwargs):
+        """Busca de hiperparâmetros com successive halving (ver ``src.models.tuning``).
+
+        Usa um dos espaços de ``SEARCH_SPACES`` (ou ``estimator`` +
+        ``param_distributions``) sobre o split de treino, avalia o melhor
+        candidato no teste e o guarda em ``self.models``.
+        """
+        from src.models.tuning import SEARCH_SPACES, halving_search
+        if estimator is None:
+            estimator, param_distributions = SEARCH_SPACES[space]
+        model_name = model_name or f"{type(estimator).__name__} (tuned)"
+        search = halving_search(self.X_train, self.y_train, estimator, param_distributions,
+                                name=model_name, **search_kwargs)
+        preds = search.best_estimator_.predict(self.X_test)
+        print(f"📊 Relatório para {model_name}:")
+        print(classification_report(self.y_test, preds, zero_division=0))
+        self.models[model_name] = search.best_estimator_
+        return search
+
     def plot_feature_importance(self, model_name: str, feature_names: List[str]):
         """Plota importância das features (apenas para modelos baseados em árvore)."""
-        model = self.models.get(model_name)
-        if hasattr(model, 'feature_importances_'):
-            importances = model.feature_importances_
-            indices = np.argsort(importances)[::-1]
-            
-            plt.figure(figsize=(10, 5))
-            plt.title(f"Feature Importance - {model_name}")
-            plt.bar(range(len(indices)), importances[indices], align="center")
-            plt.xticks(range(len(indices)), [feature_names[i] for i in indices], rotation=45)
-            plt.tight_layout()
-            plt.show()
+        plot_feature_importance(self.models.get(model_name), model_name, feature_names)
+
+
+def plot_feature_importance(model, model_name: str, feature_names: List[str]):
+    """Plota a importância das features de um modelo já treinado (ex.: vindo do cache)."""
+    if hasattr(model, 'feature_importances_'):
+        import matplotlib.pyplot as plt
+        importances = model.feature_importances_
+        indices = np.argsort(importances)[::-1]
+
+        plt.figure(figsize=(10, 5))
+        plt.title(f"Feature Importance - {model_name}")
+        plt.bar(range(len(indices)), importances[indices], align="center")
+        plt.xticks(range(len(indices)), [feature_names[i] for i in indices], rotation=45)
+        plt.tight_layout()
+        plt.show()
@@ -0,0 +1,156 @@
+import time
+import numpy as np
+import pandas as pd
+from scipy.stats import loguniform, randint
+from sklearn.base import BaseEstimator, ClassifierMixin, clone
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import HalvingRandomSearchCV, StratifiedKFold
+from sklearn.utils import resample
+from typing import Dict, Optional, Tuple
+from src.models.boosting import hist_gbm
+from src.utils.mlflow_client import active_run, log_metrics, log_param, log_params, start_run
+
+# Espaços de busca padrão: nome -> (estimador base, distribuições de parâmetros)
+SEARCH_SPACES: Dict[str, Tuple[object, dict]] = {
+    'random_forest': (
+        RandomForestClassifier(random_state=42),
+        {
+            'n_estimators': randint(20, 300),
+            'max_depth': [None, 8, 12, 16, 24],
+            'min_samples_leaf': randint(1, 50),
+            'max_features': ['sqrt', 0.5, 1.0],
+        },
+    ),
+    'hist_gbm': (
+        hist_gbm(),
+        {
+            'histgradientboostingclassifier__learning_rate': loguniform(0.02, 0.3),
+            'histgradientboostingclassifier__max_leaf_nodes': randint(15, 127),
+            'histgradientboostingclassifier__min_samples_leaf': randint(10, 200),
+            'histgradientboostingclassifier__l2_regularization': loguniform(1e-3, 10),
+        },
+    ),
+    'logistic_regression': (
+        LogisticRegression(max_iter=1000),
+        {'C': loguniform(1e-3, 1e2), 'class_weight': [None, 'balanced']},
+    ),
+}
+
+
+# Prefixo dos parâmetros do estimador dentro de ``StratifiedRows``
+_INNER = 'estimator__'
+
+
+class StratifiedRows(ClassifierMixin, BaseEstimator):
+    """Recurso do successive halving: treina numa amostra estratificada das linhas.
+
+    Com ``resource='n_samples'`` o sklearn subamostra cada fold sem
+    estratificar, e as primeiras rodadas (poucas linhas) podem sair com a
+    classe minoritária distorcida. Aqui ``n_rows`` (de ``total_rows``) vira
+    a fração de cada fold de treino sorteada com ``stratify=y``; o fold de
+    teste é avaliado inteiro.
+    """
+    def __init__(self, estimator=None, n_rows=None, total_rows=None, random_state=None):
+        self.estimator = estimator
+        self.n_rows = n_rows
+        self.total_rows = total_rows
+        self.random_state = random_state
+
+    def fit(self, X, y):
+        n = len(y)
+        if self.n_rows and self.total_rows and self.n_rows < self.total_rows:
+            size = max(int(round(n * self.n_rows / self.total_rows)), 1)
+            if size < n:
+                X, y = resample(X, y, replace=False, n_samples=size, stratify=y, random_state=self.random_state)
+        self.estimator_ = clone(self.estimator).fit(X, y)
+        self.classes_ = self.estimator_.classes_
+        return self
+
+    def predict(self, X):
+        return self.estimator_.predict(X)
+
+    def predict_proba(self, X):
+        return self.estimator_.predict_proba(X)
+
+
+def _inner_params(params: dict) -> dict:
+    """Parâmetros de um candidato sem o prefixo do wrapper e sem o recurso."""
+    return {k[len(_INNER):]: v for k, v in params.items() if k.startswith(_INNER)}
+
+
+def _param_value(value):
+    return value if isinstance(value, (int, float, str, bool)) or value is None else repr(value)
+
+
+def log_trials(search, name: str):
+    """Loga cada tentativa (candidato x rodada) como um run aninhado no MLflow."""
+    if active_run() is None:
+        return
+    results = search.cv_results_
+    for i, params in enumerate(results['params']):
+        with start_run(run_name=f"{name}-trial-{i}", nested=True):
+            log_params({k: _param_value(v) for k, v in params.items()})
+            log_params({'iter': int(results['iter'][i]), 'n_resources': int(results['n_resources'][i])})
+            log_metrics({
+                'mean_test_score': float(np.nan_to_num(results['mean_test_score'][i])),
+                'std_test_score': float(np.nan_to_num(results['std_test_score'][i])),
+                'mean_fit_time_s': float(results['mean_fit_time'][i]),
+                'mean_score_time_s': float(results['mean_score_time'][i]),
+            })
+
+
+def halving_search(X, y, estimator, param_distributions: dict, n_candidates: int = 27, factor: int = 3,
+                   min_resources='exhaust', scoring: str = 'f1_macro', cv: int = 3, n_jobs: int = -1,
+                   random_state: int = 42, name: Optional[str] = None) -> HalvingRandomSearchCV:
+    """Busca aleatória com successive halving.
+
+    Os ``n_candidates`` começam com uma amostra estratificada pequena das
+    linhas (ver ``StratifiedRows``); a cada rodada só o melhor 1/``factor``
+    segue, com ``factor`` vezes mais linhas, até a última rodada usar o
+    conjunto inteiro (``min_resources='exhaust'``). Os folds de cada rodada
+    rodam em paralelo (``n_jobs``) e cada tentativa é logada no MLflow quando
+    há um run ativo. ``best_params_``, ``cv_results_['params']`` e
+    ``best_estimator_`` (o melhor candidato retreinado em todas as linhas)
+    ficam no formato do estimador original, sem o wrapper.
+    """
+    name = name or type(estimator).__name__
+    search = HalvingRandomSearchCV(
+        StratifiedRows(clone(estimator), total_rows=len(y), random_state=random_state),
+        {_INNER + k: v for k, v in param_distributions.items()},
+        n_candidates=n_candidates, factor=factor, resource='n_rows',
+        min_resources=min_resources, max_resources=len(y), scoring=scoring,
+        cv=StratifiedKFold(cv, shuffle=True, random_state=random_state),
+        refit=False, n_jobs=n_jobs, random_state=random_state,
+    )
+    print(f"\n🔬 Successive halving para {name} (factor={factor}, scoring={scoring}, n_jobs={n_jobs})...")
+    start = time.perf_counter()
+    search.fit(X, y)
+    # Refit manual: o refit do sklearn treinaria o wrapper com o recurso da última rodada
+    search.cv_results_['params'] = [_inner_params(p) for p in search.cv_results_['params']]
+    search.best_params_ = search.cv_results_['params'][search.best_index_]
+    search.best_estimator_ = clone(estimator).set_params(**search.best_params_).fit(X, y)
+    elapsed = time.perf_counter() - start
+
+    for it, (n_cand, n_res) in enumerate(zip(search.n_candidates_, search.n_resources_)):
+        print(f"   rodada {it}: {n_cand} candidatos x {n_res} linhas")
+    print(f"🏆 Melhor {scoring}: {search.best_score_:.4f} em {elapsed:.1f}s | {search.best_params_}")
+
+    log_trials(search, name)
+    if active_run() is not None:
+        log_params({f"best_{k}": _param_value(v) for k, v in search.best_params_.items()})
+        log_param('search_candidates', int(search.n_candidates_[0]))
+        log_metrics({'search_best_score': float(search.best_score_), 'search_time_s': elapsed})
+    return search
+
+
+def trials_frame(search) -> pd.DataFrame:
+    """Tabela das tentativas (rodada, linhas, parâmetros, score, tempo)."""
+    results = search.cv_results_
+    frame = pd.DataFrame({
+        'iter': results['iter'], 'n_resources': results['n_resources'],
+        'params': [str(p) for p in results['params']],
+        'mean_test_score': results['mean_test_score'], 'mean_fit_time_s': results['mean_fit_time'],
+    })
+    return frame.sort_values(['iter', 'mean_test_score'], ascending=[True, False]).reset_index(drop=True)
@@ -1,42 +1,162 @@
+import time
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+from joblib import Parallel, delayed
 from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from sklearn.metrics import silhouette_score
+from typing import Optional
+from src.utils.profiling import profiled, self_rows
+
+# Acima deste número de linhas o ajuste usa MiniBatchKMeans
+MINIBATCH_THRESHOLD = 100_000
+# Tamanho da amostra (estratificada por cluster) usada no silhouette
+SILHOUETTE_SAMPLE = 10_000
+# Amostra usada para semear os centróides em cadeia (k-1 -> k)
+SEED_SAMPLE = 20_000
+
+
+def stratified_sample(labels: np.ndarray, size: int, random_state: int = 42) -> np.ndarray:
+    """Índices de uma amostra com a mesma proporção de cada cluster.
+
+    Cada cluster contribui com pelo menos 2 pontos (quando tem), para que o
+    silhouette continue definido para clusters pequenos.
+    """
+    n = len(labels)
+    if n <= size:
+        return np.arange(n)
+    rng = np.random.default_rng(random_state)
+    idx = []
+    for label in np.unique(labels):
+        members = np.flatnonzero(labels == label)
+        take = min(len(members), max(2, int(round(size * len(members) / n))))
+        idx.append(rng.choice(members, take, replace=False))
+    return np.sort(np.concatenate(idx))
+
+
+def _fit_k(k: int, X: np.ndarray, init: np.ndarray, minibatch: bool, silhouette_size: int, random_state: int):
+    """Executado no worker: ajusta um k a partir dos centróides semeados."""
+    start = time.perf_counter()
+    if minibatch:
+        model = MiniBatchKMeans(n_clusters=k, init=init, n_init=1, batch_size=4096, random_state=random_state)
+    else:
+        model = KMeans(n_clusters=k, init=init, n_init=1, random_state=random_state)
+    labels = model.fit_predict(X)
+    fit_time = time.perf_counter() - start
+
+    score = np.nan
+    if 1 < k < len(X):
+        idx = stratified_sample(labels, silhouette_size, random_state)
+        if len(np.unique(labels[idx])) > 1:
+            score = silhouette_score(X[idx], labels[idx])
+    # Os rótulos são recalculados com predict só para o k escolhido
+    if hasattr(model, 'labels_'):
+        del model.labels_
+    return k, model, model.inertia_, score, fit_time
 
 
 class UnsupervisedModeler:
     """
     Gerencia a clusterização (K-Means).
+
+    Funciona tanto para o perfil de ~300 aeroportos quanto para tabelas de
+    rotas/voos com milhões de linhas: acima de ``minibatch_threshold`` linhas
+    usa MiniBatchKMeans e o silhouette é sempre estimado em amostra.
     """
-    def __init__(self, df_aggregated: pd.DataFrame):
+    def __init__(self, df_aggregated: pd.DataFrame, minibatch_threshold: int = MINIBATCH_THRESHOLD,
+                 silhouette_sample: int = SILHOUETTE_SAMPLE, random_state: int = 42):
         self.raw_df = df_aggregated
         self.scaler = StandardScaler()
         self.X_scaled = self.scaler.fit_transform(self.raw_df)
-        
-    def find_optimal_k(self, max_k: int = 10):
-        """Método do Cotovelo (Elbow Method)."""
-        inertias = []
-        for k in range(1, max_k + 1):
-            kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
-            kmeans.fit(self.X_scaled)
-            inertias.append(kmeans.inertia_)
-            
-        plt.figure(figsize=(8, 4))
-        plt.plot(range(1, max_k + 1), inertias, marker='o')
-        plt.title('Método do Cotovelo (Elbow Method)')
-        plt.xlabel('Número de Clusters (K)')
-        plt.ylabel('Inércia')
-        plt.show()
+        self.minibatch = len(self.X_scaled) >= minibatch_threshold
+        self.silhouette_sample = silhouette_sample
+        self.random_state = random_state
+        # Modelos ajustados na varredura, por k (reaproveitados em train_clustering)
+        self.models = {}
+        self.sweep = None
 
+    def _warm_inits(self, max_k: int) -> dict:
+        """Centróides iniciais para k=1..max_k, cada k partindo do k-1.
+
+        Em uma amostra, o k-ésimo centro é sorteado com peso proporcional à
+        distância² aos centros atuais (passo do k-means++) e o conjunto é
+        refinado com poucas iterações de Lloyd antes de seguir para k+1.
+        """
+        rng = np.random.default_rng(self.random_state)
+        X = self.X_scaled
+        if len(X) > SEED_SAMPLE:
+            X = X[rng.choice(len(X), SEED_SAMPLE, replace=False)]
+        centers = X.mean(axis=0, keepdims=True)
+        inits = {1: centers}
+        for k in range(2, min(max_k, len(X)) + 1):
+            d2 = ((X[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2).min(axis=1)
+            p = d2 / d2.sum() if d2.sum() > 0 else None
+            centers = np.vstack([centers, X[rng.choice(len(X), p=p)]])
+            centers = KMeans(n_clusters=k, init=centers, n_init=1, max_iter=50,
+                             random_state=self.random_state).fit(X).cluster_centers_
+            inits[k] = centers
+        return inits
+
+    @profiled('UnsupervisedModeler.find_optimal_k', rows_in=self_rows('X_scaled'), rows_out=None)
+    def find_optimal_k(self, max_k: int = 10, n_jobs: int = -1, plot: bool = True) -> pd.DataFrame:
+        """Método do Cotovelo (Elbow Method) + silhouette, com os k em paralelo.
+
+        Retorna uma tabela com inércia, silhouette (amostrado) e tempo por k.
+        Os modelos ficam em ``self.models`` para ``train_clustering``.
+        """
+        inits = self._warm_inits(max_k)
+        mode = 'MiniBatchKMeans' if self.minibatch else 'KMeans'
+        print(f"🔎 Varredura de K=1..{max(inits)} ({mode}, {len(self.X_scaled)} linhas, n_jobs={n_jobs})...")
+        results = Parallel(n_jobs=n_jobs, backend='loky')(
+            delayed(_fit_k)(k, self.X_scaled, init, self.minibatch, self.silhouette_sample, self.random_state)
+            for k, init in inits.items()
+        )
+
+        rows = []
+        for k, model, inertia, score, fit_time in results:
+            self.models[k] = (model, score)
+            rows.append({'k': k, 'inertia': inertia, 'silhouette': score, 'fit_time_s': fit_time})
+        self.sweep = pd.DataFrame(rows).sort_values('k').reset_index(drop=True)
+        print(self.sweep.to_string(index=False))
+
+        if plot:
+            import matplotlib.pyplot as plt
+            fig, ax = plt.subplots(figsize=(8, 4))
+            ax.plot(self.sweep['k'], self.sweep['inertia'], marker='o')
+            ax.set_title('Método do Cotovelo (Elbow Method)')
+            ax.set_xlabel('Número de Clusters (K)')
+            ax.set_ylabel('Inércia')
+            ax2 = ax.twinx()
+            ax2.plot(self.sweep['k'], self.sweep['silhouette'], marker='s', color='tab:orange')
+            ax2.set_ylabel('Silhouette (amostra)')
+            plt.show()
+        return self.sweep
+
+    def best_k(self) -> Optional[int]:
+        """K com maior silhouette na última varredura."""
+        if self.sweep is None or self.sweep['silhouette'].isna().all():
+            return None
+        return int(self.sweep.loc[self.sweep['silhouette'].idxmax(), 'k'])
+
+    @profiled('UnsupervisedModeler.train_clustering', rows_in=self_rows('X_scaled'))
     def train_clustering(self, k: int):
-        """Treina o K-Means com o K escolhido."""
-        kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
-        clusters = kmeans.fit_predict(self.X_scaled)
-        
+        """Treina o K-Means com o K escolhido (ou reaproveita o da varredura)."""
+        if k in self.models:
+            model, score = self.models[k]
+            clusters = model.predict(self.X_scaled)
+        else:
+            if self.minibatch:
+                model = MiniBatchKMeans(n_clusters=k, batch_size=4096, random_state=self.random_state, n_init=3)
+            else:
+                model = KMeans(n_clusters=k, random_state=self.random_state, n_init=10)
+            clusters = model.fit_predict(self.X_scaled)
+            idx = stratified_sample(clusters, self.silhouette_sample, self.random_state)
+            score = silhouette_score(self.X_scaled[idx], clusters[idx])
+            self.models[k] = (model, score)
+        self.model = model
+
         # Adiciona o cluster ao dataframe original para interpretação
         self.raw_df['CLUSTER'] = clusters
-        score = silhouette_score(self.X_scaled, clusters)
-        
+
         print(f"✅ Clusterização concluída com K={k}. Silhouette Score: {score:.3f}")
         return self.raw_df
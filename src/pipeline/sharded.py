@@ -0,0 +1,140 @@
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import pandas as pd
+from joblib import Parallel, delayed
+from src.utils.profiling import profiled
+from src.utils.watermark import DATE_KEY, date_key
+
+# Shards do pipeline: um por mês (YEAR/MONTH), a mesma partição do cache
+# Parquet e um intervalo contíguo da chave diária FLIGHT_DATE. Meses são
+# independentes até a engenharia de features, que só precisa de alguns dias
+# anteriores como contexto (taxas móveis) e do vocabulário global.
+
+# Sufixo das tabelas de trabalho de cada shard (ex.: raw_flights__201501)
+SHARD_SEPARATOR = '__'
+
+
+def month_shards(partitions: Iterable[Tuple[int, int]], since: Optional[int] = None) -> List[dict]:
+    """Um shard por partição (YEAR, MONTH) com dias posteriores a ``since``.
+
+    ``lo`` é exclusivo e ``hi`` inclusivo (YYYYMMDD), como nas marcas d'água:
+    com ``since`` no meio do mês o shard começa depois dele.
+    """
+    shards = []
+    for year, month in sorted(set(partitions)):
+        lo, hi = year * 10000 + month * 100, year * 10000 + month * 100 + 31
+        if since is not None:
+            if hi <= since:
+                continue
+            lo = max(lo, since)
+        shards.append({'id': f"{year:04d}{month:02d}", 'lo': int(lo), 'hi': int(hi)})
+    return shards
+
+
+def date_months(keys: Iterable[int]) -> List[Tuple[int, int]]:
+    """Meses (YEAR, MONTH) presentes em uma lista de chaves YYYYMMDD."""
+    return sorted({(int(k) // 10000, int(k) // 100 % 100) for k in keys if k is not None})
+
+
+def shard_table(table_name: str, shard: dict) -> str:
+    return f"{table_name}{SHARD_SEPARATOR}{shard['id']}"
+
+
+def shard_filter(shard: dict, context_days: int = 0) -> Tuple[str, dict]:
+    """Filtro SQL do intervalo do shard (``context_days`` antes de ``lo`` inclusos)."""
+    lo = shard['lo']
+    if context_days:
+        from src.features.calendar import shift_date_key
+        lo = shift_date_key(lo, -context_days)
+    return f'"{DATE_KEY}" > :lo AND "{DATE_KEY}" <= :hi', {'lo': lo, 'hi': shard['hi']}
+
+
+@profiled('sharded.merge_shards', rows_out=None)
+def merge_shards(engine, table_name: str, shards: Sequence[dict], replace: bool = False) -> int:
+    """Reduce: move as tabelas dos shards para ``table_name`` dentro do banco.
+
+    Cada shard substitui o seu intervalo na tabela final (idempotente em
+    reexecuções); com ``replace`` a tabela é recriada. Shards sem tabela
+    (sem linhas) são ignorados.
+    """
+    from src.utils.storage import drop_table, move_rows, table_exists
+
+    if replace:
+        drop_table(engine, table_name)
+    rows = 0
+    for shard in shards:
+        source = shard_table(table_name, shard)
+        if not table_exists(engine, source):
+            continue
+        where, params = shard_filter(shard)
+        rows += move_rows(engine, source, table_name, where=where, params=params)
+    print(f"🧩 {len(shards)} shard(s) consolidados em '{table_name}' ({rows} linhas).")
+    return rows
+
+
+def shard_features(df: pd.DataFrame, shard: dict, threshold: int = 15,
+                   categories: Optional[Dict[str, List[str]]] = None, windows: Sequence[int] = (),
+                   airports: bool = False) -> Tuple[pd.DataFrame, pd.Series, pd.Series]:
+    """Features supervisionadas de um shard.
+
+    ``df`` pode trazer dias anteriores a ``lo`` como contexto das taxas
+    móveis; eles entram no cálculo mas saem do resultado. Com o vocabulário
+    global em ``categories`` os códigos são os mesmos do caminho sem shards.
+    Retorna X, y e a chave diária das linhas do shard.
+    """
+    from src.features.engineer import FeatureEngineer
+
+    engineer = FeatureEngineer(df)
+    engineer.create_target_classification(threshold=threshold)
+    if windows:
+        engineer.add_calendar_features(windows=windows)
+    if airports:
+        engineer.add_airport_features()
+    X, y = engineer.prepare_features_supervised(categories=categories)
+    keys = df[DATE_KEY] if DATE_KEY in df.columns else date_key(df)
+    keep = (keys > shard['lo']).to_numpy()
+    return X[keep], y[keep], keys[keep]
+
+
+def _local_shard(file_path: str, cache_dir: Optional[str], shard: dict, threshold: int,
+                 categories: Dict[str, List[str]], windows: Sequence[int], airports: bool):
+    from src.features.calendar import shift_date_key
+    from src.ingest.loader import FlightDataLoader
+
+    since = shift_date_key(shard['lo'], -max(windows)) if windows else shard['lo']
+    df = FlightDataLoader(file_path, cache_dir=cache_dir).load_cached(since=since, until=shard['hi'])
+    X, y, _ = shard_features(df, shard, threshold=threshold, categories=categories, windows=windows,
+                             airports=airports)
+    return X, y
+
+
+@profiled('sharded.build_features', rows_out=None)
+def build_features(file_path: str, threshold: int = 15, windows: Sequence[int] = (), airports: bool = False,
+                   n_jobs: int = -1, cache_dir: Optional[str] = None) -> Tuple[pd.DataFrame, pd.Series]:
+    """Caminho local do pipeline em shards: carga + features por mês em um pool de processos.
+
+    Cada processo lê só o seu mês (e os dias de contexto) do cache Parquet;
+    o processo principal calcula apenas o vocabulário e concatena os shards.
+    """
+    from src.features.engineer import CATEGORICAL_FEATURES
+    from src.features.transformer import FeatureTransformer
+    from src.ingest.loader import FlightDataLoader
+
+    loader = FlightDataLoader(file_path, cache_dir=cache_dir)
+    shards = month_shards(loader.partitions())
+    if not shards:
+        return pd.DataFrame(), pd.Series(dtype=int, name='IS_DELAYED')
+    columns = [c for c in CATEGORICAL_FEATURES if airports or c == 'AIRLINE']
+    # Vocabulário global (o mesmo que o fit sobre o dataset inteiro produziria)
+    categories = FeatureTransformer(features=columns, categorical=columns).fit(
+        loader.load_cached(columns=columns)).classes_
+
+    n_jobs = min(len(shards), os.cpu_count() or 1) if n_jobs == -1 else n_jobs
+    print(f"🧩 Features em {len(shards)} shard(s) mensais com {n_jobs} processo(s)...")
+    parts = Parallel(n_jobs=n_jobs, backend='loky')(
+        delayed(_local_shard)(file_path, loader.cache_dir, shard, threshold, categories, tuple(windows), airports)
+        for shard in shards
+    )
+    X = pd.concat([p[0] for p in parts], ignore_index=True)
+    y = pd.concat([p[1] for p in parts], ignore_index=True)
+    return X, y
@@ -0,0 +1,241 @@
+import argparse
+import asyncio
+import json
+import time
+import warnings
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from src.features.engineer import AIRPORT_FEATURES, SUPERVISED_FEATURES
+from src.features.transformer import category_key
+
+# O modelo foi treinado com DataFrame; aqui passamos arrays NumPy de propósito
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+UNKNOWN_CODE = -1
+# Features lidas direto da requisição; as de calendário (taxas móveis,
+# congestionamento) dependem do histórico e não têm versão online
+ONLINE_FEATURES = SUPERVISED_FEATURES + AIRPORT_FEATURES
+
+
+class OnlineFeaturizer:
+    """
+    Versão NumPy "pré-compilada" do ``prepare_features_supervised``.
+
+    A ordem das colunas e os vocabulários das categóricas (AIRLINE, aeroportos)
+    são resolvidos uma vez; cada requisição só preenche uma linha de uma
+    matriz float32 (campos ausentes viram 0, como o ``fillna(0)``; categorias
+    desconhecidas, -1). ``vocabulary`` é um dicionário coluna -> valores ou,
+    por compatibilidade, só a lista de companhias. Registros que não são
+    objetos ou com campos numéricos inválidos levantam ``ValueError``, assim
+    como ``features`` fora de ``ONLINE_FEATURES`` (seriam servidas como 0).
+    """
+    def __init__(self, vocabulary, features: Optional[List[str]] = None):
+        self.features = list(features or SUPERVISED_FEATURES)
+        unsupported = [c for c in self.features if c not in ONLINE_FEATURES]
+        if unsupported:
+            raise ValueError(f"Features sem versão online: {', '.join(unsupported)}")
+        if not isinstance(vocabulary, dict):
+            vocabulary = {'AIRLINE': vocabulary}
+        self.vocabulary = {
+            col: {category_key(v): i for i, v in enumerate(sorted(str(v) for v in values))}
+            for col, values in vocabulary.items() if col in self.features
+        }
+
+    def transform_one(self, record: dict) -> np.ndarray:
+        if not isinstance(record, dict):
+            raise ValueError(f"Registro deve ser um objeto JSON, não {type(record).__name__}")
+        row = np.zeros(len(self.features), dtype=np.float32)
+        for j, col in enumerate(self.features):
+            value = record.get(col)
+            if col in self.vocabulary:
+                row[j] = self.vocabulary[col].get(category_key(value), UNKNOWN_CODE)
+            elif value is not None:
+                try:
+                    row[j] = float(value)
+                except (TypeError, ValueError):
+                    raise ValueError(f"Campo {col} não numérico: {value!r}") from None
+        return row
+
+    def transform(self, records: List[dict]) -> np.ndarray:
+        X = np.zeros((len(records), len(self.features)), dtype=np.float32)
+        for i, rec in enumerate(records):
+            X[i] = self.transform_one(rec)
+        return X
+
+
+class RollingPercentiles:
+    """Janela circular de valores (ex.: latência em ms) para p50/p99 sem crescer a memória."""
+    def __init__(self, size: int = 10_000):
+        self._values = np.zeros(size, dtype=np.float64)
+        self._size = size
+        self.count = 0
+
+    def add(self, ms: float):
+        self._values[self.count % self._size] = ms
+        self.count += 1
+
+    def snapshot(self) -> dict:
+        n = min(self.count, self._size)
+        if n == 0:
+            return {'count': 0, 'p50': None, 'p99': None}
+        window = self._values[:n]
+        p50, p99 = np.percentile(window, [50, 99])
+        return {'count': self.count, 'p50': round(float(p50), 3), 'p99': round(float(p99), 3)}
+
+
+class PredictionService:
+    """
+    Serviço de predição online com micro-batching.
+
+    Requisições concorrentes entram numa fila; um coletor junta até
+    ``max_batch`` itens (ou espera no máximo ``max_wait_ms`` após o primeiro)
+    e faz uma única chamada de ``predict_proba`` para o lote, executada numa
+    thread dedicada para não bloquear o event loop. Cada registro é
+    featurizado (e validado) antes de entrar na fila, então um registro
+    inválido falha só a própria requisição.
+    """
+    def __init__(self, model, vocabulary, features: Optional[List[str]] = None,
+                 max_batch: int = 64, max_wait_ms: float = 2.0, threshold: float = 0.5):
+        self.model = model
+        self.featurizer = OnlineFeaturizer(vocabulary, features or list(getattr(model, 'feature_names_in_', SUPERVISED_FEATURES)))
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.threshold = threshold
+        self.latency = RollingPercentiles()
+        self.batch_sizes = RollingPercentiles()
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._collector = None
+
+    @classmethod
+    def from_mlflow(cls, model_uri: str, compact: bool = False, **kwargs) -> 'PredictionService':
+        from src.models.scoring import DelayScorer
+        scorer = DelayScorer.from_mlflow(model_uri, compact=compact)
+        return cls(scorer.model, scorer.transformer.classes_, scorer.features, **kwargs)
+
+    def _ensure_started(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._collector = asyncio.get_running_loop().create_task(self._collect())
+
+    async def predict(self, record: dict) -> dict:
+        """Prediz um voo; a chamada é agrupada com outras concorrentes."""
+        self._ensure_started()
+        start = time.perf_counter()
+        row = self.featurizer.transform_one(record)
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future))
+        proba = await future
+        self.latency.add((time.perf_counter() - start) * 1000)
+        return {'delay_proba': proba, 'is_delayed': int(proba >= self.threshold)}
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            rows = [row for row, _ in batch]
+            try:
+                probas = await loop.run_in_executor(self._executor, self._predict_batch, rows)
+                for (_, fut), p in zip(batch, probas):
+                    if not fut.done():
+                        fut.set_result(float(p))
+            except Exception as exc:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(exc)
+            self.batch_sizes.add(len(batch))
+
+    def _predict_batch(self, rows: List[np.ndarray]) -> np.ndarray:
+        return self.model.predict_proba(np.vstack(rows))[:, 1]
+
+    def metrics(self) -> dict:
+        return {
+            'latency_ms': self.latency.snapshot(),
+            'batch_size': self.batch_sizes.snapshot(),
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+        }
+
+    # ---------- HTTP mínimo (asyncio streams) ----------
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                lines = head.decode('latin-1').split('\r\n')
+                method, path, _ = lines[0].split(' ', 2)
+                headers = {k.strip().lower(): v.strip() for k, v in (l.split(':', 1) for l in lines[1:] if ':' in l)}
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                status, payload = 200, None
+                if method == 'POST' and path == '/predict':
+                    try:
+                        data = json.loads(body)
+                    except ValueError:
+                        status, payload = 400, {'error': 'JSON inválido'}
+                    else:
+                        try:
+                            if isinstance(data, list):
+                                payload = await asyncio.gather(*(self.predict(r) for r in data))
+                            else:
+                                payload = await self.predict(data)
+                        except ValueError as exc:
+                            status, payload = 400, {'error': str(exc)}
+                        except Exception as exc:
+                            status, payload = 500, {'error': f"{type(exc).__name__}: {exc}"}
+                elif method == 'GET' and path == '/metrics':
+                    payload = self.metrics()
+                elif method == 'GET' and path == '/health':
+                    payload = {'status': 'ok'}
+                else:
+                    status, payload = 404, {'error': 'not found'}
+
+                out = json.dumps(payload).encode()
+                reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error'}[status]
+                writer.write(
+                    f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(out)}\r\n\r\n".encode() + out
+                )
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = '0.0.0.0', port: int = 8000):
+        self._ensure_started()
+        server = await asyncio.start_server(self._handle, host, port)
+        print(f"🛰️ Serviço de predição ouvindo em http://{host}:{port} (POST /predict, GET /metrics)")
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serviço online de predição de atrasos")
+    parser.add_argument('--model-uri', required=True, help="ex.: runs:/<run_id>/random_forest_model")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=2.0)
+    parser.add_argument('--compact', action='store_true',
+                        help="Usa o modelo compacto (compact_model/<nome>.npz) logado pelo treino")
+    args = parser.parse_args()
+
+    service = PredictionService.from_mlflow(args.model_uri, compact=args.compact, max_batch=args.max_batch,
+                                            max_wait_ms=args.max_wait_ms)
+    asyncio.run(service.serve(args.host, args.port))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import json
+import time
+import numpy as np
+from typing import List, Tuple
+from urllib.parse import urlparse
+
+
+async def _send(reader, writer, host: str, path: str, payload: bytes, method: str = 'POST') -> dict:
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload
+    )
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    length = 0
+    for line in head.decode('latin-1').split('\r\n'):
+        if line.lower().startswith('content-length:'):
+            length = int(line.split(':', 1)[1])
+    return json.loads(await reader.readexactly(length))
+
+
+async def _worker(queue: asyncio.Queue, host: str, port: int, latencies: List[float], errors: List[str]):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            start = time.perf_counter()
+            try:
+                await _send(reader, writer, host, '/predict', item)
+                latencies.append((time.perf_counter() - start) * 1000)
+            except Exception as exc:
+                errors.append(repr(exc))
+    finally:
+        writer.close()
+
+
+async def replay(path: str, url: str, concurrency: int = 16, rate: float = 0.0) -> Tuple[dict, dict]:
+    """Reenvia as requisições de um JSONL (uma por linha) ao serviço.
+
+    ``concurrency`` conexões keep-alive em paralelo; ``rate`` > 0 limita a
+    taxa (req/s). Retorna o resumo do lado do cliente e as métricas do serviço.
+    """
+    parsed = urlparse(url)
+    host, port = parsed.hostname, parsed.port or 80
+    with open(path, 'rb') as f:
+        payloads = [line.strip() for line in f if line.strip()]
+
+    queue: asyncio.Queue = asyncio.Queue()
+    latencies: List[float] = []
+    errors: List[str] = []
+    workers = [asyncio.create_task(_worker(queue, host, port, latencies, errors)) for _ in range(concurrency)]
+
+    start = time.perf_counter()
+    for i, payload in enumerate(payloads):
+        if rate > 0:
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await queue.put(payload)
+    for _ in workers:
+        await queue.put(None)
+    await asyncio.gather(*workers)
+    elapsed = time.perf_counter() - start
+
+    summary = {'requests': len(payloads), 'errors': len(errors), 'elapsed_s': round(elapsed, 3),
+               'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None}
+    if latencies:
+        p50, p99 = np.percentile(latencies, [50, 99])
+        summary.update({'p50_ms': round(float(p50), 3), 'p99_ms': round(float(p99), 3)})
+
+    reader, writer = await asyncio.open_connection(host, port)
+    server_metrics = await _send(reader, writer, host, '/metrics', b'', method='GET')
+    writer.close()
+    return summary, server_metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay de requisições JSONL contra o serviço de predição")
+    parser.add_argument('requests', help="arquivo JSONL, um voo (JSON) por linha")
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--rate', type=float, default=0.0, help="req/s (0 = sem limite)")
+    args = parser.parse_args()
+
+    summary, server_metrics = asyncio.run(replay(args.requests, args.url, args.concurrency, args.rate))
+    print("📈 Cliente:", json.dumps(summary))
+    print("🛰️ Serviço:", json.dumps(server_metrics))
+
+
+if __name__ == '__main__':
+    main()
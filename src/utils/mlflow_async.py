@@ -0,0 +1,345 @@
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from typing import Dict, List, Optional, Tuple
+
+# Intervalo (s) entre flushes automáticos do buffer
+FLUSH_INTERVAL = 2.0
+# Limites do log_batch do MLflow por requisição
+MAX_BATCH_METRICS = 1000
+MAX_BATCH_PARAMS = 100
+# Espera entre tentativas de replay do spool (dobra a cada falha até o máximo)
+REPLAY_BACKOFF = (1.0, 60.0)
+# Operações guardadas no spool; acima disso novas falhas são descartadas
+MAX_SPOOL_OPS = 10_000
+# Erros do MLflow que não melhoram com nova tentativa (a escrita é descartada)
+PERMANENT_ERRORS = {
+    'INVALID_PARAMETER_VALUE', 'RESOURCE_DOES_NOT_EXIST', 'RESOURCE_ALREADY_EXISTS',
+    'BAD_REQUEST', 'MALFORMED_REQUEST', 'PERMISSION_DENIED', 'INVALID_STATE',
+}
+DEFAULT_SPOOL_DIR = os.path.join(tempfile.gettempdir(), 'mlflow_spool')
+
+
+def is_transient(exc: Exception, tracking_uri: str = '') -> bool:
+    """Falha de rede/servidor (vale tentar de novo) x erro de validação (descartar).
+
+    Com store local (arquivo/banco) uma ``MlflowException`` é sempre validação
+    (o file store reporta até param duplicado como INTERNAL_ERROR); só falhas
+    de E/S e de conexão valem nova tentativa.
+    """
+    code = getattr(exc, 'error_code', None)
+    if code in PERMANENT_ERRORS:
+        return False
+    if code is not None and not tracking_uri.startswith(('http://', 'https://', 'databricks')):
+        return False
+    return True
+
+
+class AsyncLogger:
+    """
+    Cliente MLflow assíncrono e em lotes.
+
+    Params e métricas ficam num buffer em memória e uma thread os envia com
+    ``log_batch`` (respeitando os limites por requisição) a cada
+    ``flush_interval`` segundos. Artefatos, textos e modelos são copiados
+    para ``spool_dir`` no momento da chamada (o arquivo original pode mudar
+    depois) e enviados pela mesma thread.
+
+    Se o servidor estiver fora do ar, a operação é gravada em
+    ``spool_dir/queue`` e reenviada depois (também por outro processo, com
+    ``replay``). Erros permanentes contam como escritas descartadas e ficam
+    em ``errors``/``stats``.
+    """
+    def __init__(self, spool_dir: str = DEFAULT_SPOOL_DIR, flush_interval: float = FLUSH_INTERVAL):
+        self.spool_dir = spool_dir
+        self.queue_dir = os.path.join(spool_dir, 'queue')
+        self.staged_dir = os.path.join(spool_dir, 'staged')
+        os.makedirs(self.queue_dir, exist_ok=True)
+        os.makedirs(self.staged_dir, exist_ok=True)
+        self.flush_interval = flush_interval
+        self.stats: Counter = Counter()
+        self.errors: deque = deque(maxlen=20)
+
+        self._lock = threading.Condition()
+        self._params: Dict[Tuple[str, str], Dict[str, str]] = {}
+        self._metrics: Dict[Tuple[str, str], List[tuple]] = {}
+        self._ops: deque = deque()
+        self._busy = False
+        self._clients = {}
+        self._backoff = REPLAY_BACKOFF[0]
+        self._next_replay = 0.0
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='mlflow-async', daemon=True)
+        self._thread.start()
+
+    # ---------- enfileiramento (thread do chamador) ----------
+
+    def log_params(self, tracking_uri: str, run_id: str, params: dict):
+        with self._lock:
+            buf = self._params.setdefault((tracking_uri, run_id), {})
+            conflicts = []
+            for k, v in params.items():
+                k, v = str(k), str(v)
+                if buf.get(k, v) != v:
+                    # Params são imutáveis no MLflow: mantém o primeiro valor, como o servidor faria
+                    conflicts.append(k)
+                    continue
+                buf[k] = v
+            self.stats['params'] += len(params)
+            self.stats['dropped'] += len(conflicts)
+            full = len(buf) >= MAX_BATCH_PARAMS
+        for k in conflicts:
+            print(f"⚠️ Escrita no MLflow descartada (param): '{k}' já tem outro valor neste run")
+        if full:
+            self._wake.set()
+
+    def log_metrics(self, tracking_uri: str, run_id: str, metrics: dict, step: Optional[int] = None,
+                    timestamp: Optional[int] = None):
+        ts = timestamp or int(time.time() * 1000)
+        with self._lock:
+            buf = self._metrics.setdefault((tracking_uri, run_id), [])
+            buf.extend((str(k), float(v), ts, int(step or 0)) for k, v in metrics.items())
+            self.stats['metrics'] += len(metrics)
+            full = len(buf) >= MAX_BATCH_METRICS
+        if full:
+            self._wake.set()
+
+    def _stage(self) -> str:
+        path = os.path.join(self.staged_dir, uuid.uuid4().hex)
+        os.makedirs(path)
+        return path
+
+    def _submit(self, op: dict):
+        with self._lock:
+            self._ops.append(op)
+            self.stats['artifacts'] += 1
+        self._wake.set()
+
+    def log_artifact(self, tracking_uri: str, run_id: str, local_path: str, artifact_path: Optional[str] = None):
+        staged = self._stage()
+        name = os.path.basename(local_path.rstrip(os.sep))
+        target = os.path.join(staged, name)
+        if os.path.isdir(local_path):
+            # Como o mlflow.log_artifact: o diretório entra com o próprio nome
+            shutil.copytree(local_path, target)
+            artifact_path = '/'.join(p for p in (artifact_path, name) if p)
+        else:
+            shutil.copy2(local_path, target)
+        self._submit({'type': 'artifact', 'tracking_uri': tracking_uri, 'run_id': run_id,
+                      'path': target, 'artifact_path': artifact_path, 'staged': staged})
+
+    def log_text(self, tracking_uri: str, run_id: str, text: str, artifact_file: str):
+        staged = self._stage()
+        target = os.path.join(staged, os.path.basename(artifact_file))
+        with open(target, 'w', encoding='utf-8') as fh:
+            fh.write(text)
+        self._submit({'type': 'artifact', 'tracking_uri': tracking_uri, 'run_id': run_id, 'path': target,
+                      'artifact_path': os.path.dirname(artifact_file) or None, 'staged': staged})
+
+    def log_dict(self, tracking_uri: str, run_id: str, dictionary: dict, artifact_file: str):
+        self.log_text(tracking_uri, run_id, json.dumps(dictionary, indent=2, default=str), artifact_file)
+
+    def log_model(self, tracking_uri: str, run_id: str, model, artifact_path: str):
+        # Snapshot do modelo agora; o save_model (e a inferência dos requirements) roda na thread
+        staged = self._stage()
+        path = os.path.join(staged, 'model.pkl')
+        with open(path, 'wb') as fh:
+            pickle.dump(model, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        self._submit({'type': 'model', 'tracking_uri': tracking_uri, 'run_id': run_id, 'path': path,
+                      'artifact_path': artifact_path, 'staged': staged})
+
+    # ---------- envio (thread de background) ----------
+
+    def _client(self, tracking_uri: str):
+        client = self._clients.get(tracking_uri)
+        if client is None:
+            from mlflow.tracking import MlflowClient
+            client = self._clients[tracking_uri] = MlflowClient(tracking_uri=tracking_uri)
+        return client
+
+    def _execute(self, op: dict):
+        client = self._client(op['tracking_uri'])
+        if op['type'] == 'batch':
+            from mlflow.entities import Metric, Param
+            client.log_batch(op['run_id'], metrics=[Metric(*m) for m in op['metrics']],
+                             params=[Param(k, v) for k, v in op['params']])
+        elif op['type'] == 'artifact':
+            if os.path.isdir(op['path']):
+                client.log_artifacts(op['run_id'], op['path'], op['artifact_path'])
+            else:
+                client.log_artifact(op['run_id'], op['path'], op['artifact_path'])
+        elif op['type'] == 'model':
+            import mlflow.sklearn
+            with open(op['path'], 'rb') as fh:
+                model = pickle.load(fh)
+            local = os.path.join(op['staged'], 'model')
+            shutil.rmtree(local, ignore_errors=True)
+            mlflow.sklearn.save_model(model, local)
+            client.log_artifacts(op['run_id'], local, op['artifact_path'])
+        if op.get('staged'):
+            shutil.rmtree(op['staged'], ignore_errors=True)
+
+    def _batches(self) -> List[dict]:
+        with self._lock:
+            params, metrics = self._params, self._metrics
+            self._params, self._metrics = {}, {}
+        ops = []
+        for key in set(params) | set(metrics):
+            uri, run_id = key
+            p = list(params.get(key, {}).items())
+            m = metrics.get(key, [])
+            while p or m:
+                ops.append({'type': 'batch', 'tracking_uri': uri, 'run_id': run_id,
+                            'params': p[:MAX_BATCH_PARAMS], 'metrics': m[:MAX_BATCH_METRICS]})
+                p, m = p[MAX_BATCH_PARAMS:], m[MAX_BATCH_METRICS:]
+        return ops
+
+    def _record_error(self, op: dict, exc: Exception):
+        self.errors.append(f"{op['type']} run={op['run_id']}: {type(exc).__name__}: {str(exc)[:200]}")
+
+    def _drop(self, op: dict, exc: Exception):
+        self.stats['dropped'] += 1
+        self._record_error(op, exc)
+        if op.get('staged'):
+            shutil.rmtree(op['staged'], ignore_errors=True)
+        print(f"⚠️ Escrita no MLflow descartada ({op['type']}): {type(exc).__name__}: {str(exc)[:200]}")
+
+    def _spill(self, op: dict, exc: Optional[Exception] = None):
+        """Grava a operação na fila local para reenvio posterior."""
+        if len(os.listdir(self.queue_dir)) >= MAX_SPOOL_OPS:
+            self._drop(op, exc or RuntimeError('spool local cheio'))
+            return
+        if exc is not None:
+            self._record_error(op, exc)
+        name = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.json"
+        tmp = os.path.join(self.queue_dir, '.' + name)
+        with open(tmp, 'w') as fh:
+            json.dump(op, fh)
+        os.replace(tmp, os.path.join(self.queue_dir, name))
+        self.stats['spilled'] += 1
+
+    def _send(self, op: dict) -> bool:
+        try:
+            self._execute(op)
+            self.stats['sent'] += 1
+            return True
+        except Exception as exc:
+            if not is_transient(exc, op['tracking_uri']):
+                if op['type'] == 'batch' and len(op['params']) + len(op['metrics']) > 1:
+                    # Um param inválido não derruba o lote: reenvia item a item
+                    singles = [dict(op, params=[p], metrics=[]) for p in op['params']]
+                    singles += [dict(op, params=[], metrics=[m]) for m in op['metrics']]
+                    for single in singles:
+                        self._send(single)
+                    return True
+                self._drop(op, exc)
+                return True
+            # Servidor fora: a fila local será reenviada após o backoff
+            self._spill(op, exc)
+            self._next_replay = time.monotonic() + self._backoff
+            return False
+
+    def pending_spool(self) -> List[str]:
+        return sorted(f for f in os.listdir(self.queue_dir) if f.endswith('.json') and not f.startswith('.'))
+
+    def replay(self) -> int:
+        """Reenvia a fila local em ordem; para na primeira falha transitória."""
+        sent = 0
+        for name in self.pending_spool():
+            path = os.path.join(self.queue_dir, name)
+            try:
+                with open(path) as fh:
+                    op = json.load(fh)
+            except (OSError, ValueError):
+                continue
+            try:
+                self._execute(op)
+            except Exception as exc:
+                if is_transient(exc, op['tracking_uri']):
+                    self._record_error(op, exc)
+                    self._next_replay = time.monotonic() + self._backoff
+                    self._backoff = min(self._backoff * 2, REPLAY_BACKOFF[1])
+                    return sent
+                self._drop(op, exc)
+            else:
+                sent += 1
+                self.stats['replayed'] += 1
+            os.remove(path)
+        self._backoff = REPLAY_BACKOFF[0]
+        return sent
+
+    def _drain(self):
+        with self._lock:
+            self._busy = True
+        try:
+            # Spool primeiro: preserva a ordem das escritas de um mesmo run
+            if self.pending_spool() and time.monotonic() >= self._next_replay:
+                self.replay()
+            behind = bool(self.pending_spool())
+            ops = self._batches()
+            with self._lock:
+                while self._ops:
+                    ops.append(self._ops.popleft())
+            for op in ops:
+                if behind:
+                    # Mantém a ordem: nada passa na frente do que está no spool
+                    self._spill(op)
+                else:
+                    behind = not self._send(op)
+        finally:
+            with self._lock:
+                self._busy = False
+                self._lock.notify_all()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._drain()
+
+    def _empty(self) -> bool:
+        return not (self._busy or self._params or self._metrics or self._ops)
+
+    def flush(self, timeout: Optional[float] = 30.0) -> bool:
+        """Envia tudo que está no buffer; True se terminou dentro do ``timeout``.
+
+        O que não pôde ser enviado fica no spool local (não bloqueia).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self._wake.set()
+        with self._lock:
+            while not self._empty():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._lock.wait(remaining if remaining is None else min(remaining, 0.1))
+                self._wake.set()
+        return True
+
+    def close(self, timeout: Optional[float] = 30.0):
+        self.flush(timeout)
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self.report()
+
+    def snapshot(self) -> dict:
+        return dict(self.stats, spool_pending=len(self.pending_spool()))
+
+    def report(self) -> dict:
+        """Avisa sobre escritas descartadas ou pendentes no spool."""
+        stats = self.snapshot()
+        if stats.get('dropped'):
+            print(f"⚠️ MLflow: {stats['dropped']} escrita(s) descartada(s). Últimos erros:")
+            for err in list(self.errors)[-5:]:
+                print(f"   - {err}")
+        if stats['spool_pending']:
+            print(f"🗃️ MLflow: {stats['spool_pending']} operação(ões) no spool local ({self.queue_dir}) para reenvio.")
+        return stats
@@ -1,25 +1,112 @@
-import mlflow
-import mlflow.sklearn
+import atexit
+import os
+import sys
+from collections import Counter
 from typing import Optional
+from src.utils.mlflow_async import DEFAULT_SPOOL_DIR, AsyncLogger
+
+# Modo do cliente: 'sync' (uma requisição por chamada) ou 'async' (buffer +
+# log_batch em background, com spool local quando o servidor está fora)
+CLIENT_MODE = os.getenv('MLFLOW_CLIENT_MODE', 'sync').lower()
+SPOOL_DIR = os.getenv('MLFLOW_SPOOL_DIR', DEFAULT_SPOOL_DIR)
+
+_async_logger: Optional[AsyncLogger] = None
+# Escritas que falharam no modo síncrono (antes eram engolidas em silêncio)
+_sync_failures: Counter = Counter()
+
+
+def _mlflow():
+    """Importa o mlflow só no primeiro uso (o import leva segundos e pesa no parse do DAG)."""
+    import mlflow
+    return mlflow
+
+
+def _sklearn():
+    import mlflow.sklearn
+    return mlflow.sklearn
+
+
+def set_client_mode(mode: str, spool_dir: Optional[str] = None):
+    """Troca entre 'sync' e 'async'; ao sair do async, esvazia o buffer."""
+    global CLIENT_MODE, SPOOL_DIR, _async_logger
+    mode = mode.lower()
+    if mode not in ('sync', 'async'):
+        raise ValueError(f"Modo do cliente MLflow inválido: {mode}")
+    if spool_dir:
+        SPOOL_DIR = spool_dir
+    if mode == 'sync' and _async_logger is not None:
+        _async_logger.close()
+        _async_logger = None
+    CLIENT_MODE = mode
+
+
+def _logger() -> Optional[AsyncLogger]:
+    global _async_logger
+    if CLIENT_MODE != 'async':
+        return None
+    if _async_logger is None:
+        _async_logger = AsyncLogger(SPOOL_DIR)
+        atexit.register(_async_logger.close)
+    return _async_logger
+
+
+def _target(run_id: Optional[str]):
+    """(logger, tracking_uri, run_id) para o modo async, ou None para enviar na hora."""
+    logger = _logger()
+    if logger is None:
+        return None
+    if run_id is None:
+        run = active_run()
+        if run is None:
+            # Sem run ativo o mlflow criaria um implicitamente: fica no caminho síncrono
+            return None
+        run_id = run.info.run_id
+    return logger, _mlflow().get_tracking_uri(), run_id
+
+
+def _failed(op: str, exc: Exception):
+    _sync_failures[op] += 1
+    print(f"⚠️ Falha ao logar no MLflow ({op}): {type(exc).__name__}: {str(exc)[:200]}")
+
+
+def flush(timeout: Optional[float] = 30.0) -> bool:
+    """Envia o que estiver no buffer do modo async (no-op no modo sync).
+
+    Avisa se houve escritas descartadas ou se algo ficou no spool local.
+    """
+    if _async_logger is None:
+        return True
+    done = _async_logger.flush(timeout)
+    _async_logger.report()
+    return done
+
+
+def stats() -> dict:
+    """Contadores de escrita: enviadas, em spool, reenviadas e descartadas."""
+    data = _async_logger.snapshot() if _async_logger is not None else {}
+    if _sync_failures:
+        data['dropped'] = data.get('dropped', 0) + sum(_sync_failures.values())
+        data['sync_failures'] = dict(_sync_failures)
+    return data
 
 
 def set_tracking_uri(uri: str):
     try:
-        mlflow.set_tracking_uri(uri)
+        _mlflow().set_tracking_uri(uri)
     except Exception:
         pass
 
 
 def set_experiment(name: str):
     try:
-        mlflow.set_experiment(name)
+        _mlflow().set_experiment(name)
     except Exception:
         pass
 
 
 def start_run(**kwargs):
     try:
-        return mlflow.start_run(**kwargs)
+        return _mlflow().start_run(**kwargs)
     except Exception:
         # Retorna um context manager vazio para não quebrar 'with start_run()' quando mlflow não estiver disponível
         try:
@@ -30,31 +117,119 @@ def start_run(**kwargs):
 
 
 def active_run():
+    # Sem mlflow importado não há run ativo: evita o import só para perguntar
+    mlflow = sys.modules.get('mlflow')
+    if mlflow is None:
+        return None
     try:
         return mlflow.active_run()
     except Exception:
         return None
 
 
-def log_param(key: str, value):
+def last_active_run():
+    """Último run ativo (ou encerrado) neste processo."""
+    mlflow = sys.modules.get('mlflow')
+    if mlflow is None:
+        return None
     try:
-        mlflow.log_param(key, value)
+        return mlflow.last_active_run()
     except Exception:
-        pass
+        return None
 
 
-def log_artifact(path: str, artifact_path: Optional[str] = None):
+def log_param(key: str, value):
+    log_params({key: value})
+
+
+def log_params(params: dict, run_id: Optional[str] = None):
+    target = _target(run_id)
+    if target is not None:
+        logger, uri, rid = target
+        logger.log_params(uri, rid, params)
+        return
     try:
-        if artifact_path:
-            mlflow.log_artifact(path, artifact_path=artifact_path)
-        else:
-            mlflow.log_artifact(path)
-    except Exception:
-        pass
+        _mlflow().log_params(params, run_id=run_id)
+    except Exception as exc:
+        _failed('log_params', exc)
+
+
+def log_metric(key: str, value: float, step: Optional[int] = None):
+    log_metrics({key: value}, step=step)
+
+
+def log_metrics(metrics: dict, step: Optional[int] = None, run_id: Optional[str] = None):
+    target = _target(run_id)
+    if target is not None:
+        logger, uri, rid = target
+        logger.log_metrics(uri, rid, metrics, step=step)
+        return
+    try:
+        _mlflow().log_metrics(metrics, step=step, run_id=run_id)
+    except Exception as exc:
+        _failed('log_metrics', exc)
+
+
+def log_artifact(path: str, artifact_path: Optional[str] = None, run_id: Optional[str] = None):
+    try:
+        target = _target(run_id)
+        if target is not None:
+            logger, uri, rid = target
+            logger.log_artifact(uri, rid, path, artifact_path)
+            return
+        _mlflow().log_artifact(path, artifact_path=artifact_path or None, run_id=run_id)
+    except Exception as exc:
+        _failed('log_artifact', exc)
 
 
 def log_model(model, artifact_path: str):
     try:
-        mlflow.sklearn.log_model(model, artifact_path)
-    except Exception:
-        pass
+        target = _target(None)
+        if target is not None:
+            logger, uri, rid = target
+            logger.log_model(uri, rid, model, artifact_path)
+            return
+        _sklearn().log_model(model, artifact_path)
+    except Exception as exc:
+        _failed('log_model', exc)
+
+
+def log_dict(dictionary: dict, artifact_file: str, run_id: Optional[str] = None):
+    try:
+        target = _target(run_id)
+        if target is not None:
+            logger, uri, rid = target
+            logger.log_dict(uri, rid, dictionary, artifact_file)
+            return
+        _mlflow().log_dict(dictionary, artifact_file, run_id=run_id)
+    except Exception as exc:
+        _failed('log_dict', exc)
+
+
+def log_text(text: str, artifact_file: str, run_id: Optional[str] = None):
+    try:
+        target = _target(run_id)
+        if target is not None:
+            logger, uri, rid = target
+            logger.log_text(uri, rid, text, artifact_file)
+            return
+        _mlflow().log_text(text, artifact_file, run_id=run_id)
+    except Exception as exc:
+        _failed('log_text', exc)
+
+
+def load_model(model_uri: str):
+    """Carrega um modelo sklearn logado (ex.: 'runs:/<run_id>/random_forest_model')."""
+    return _sklearn().load_model(model_uri)
+
+
+def load_dict(artifact_uri: str) -> dict:
+    """Carrega um artefato JSON/YAML logado com ``log_dict``."""
+    from mlflow.artifacts import load_dict as _load_dict
+    return _load_dict(artifact_uri)
+
+
+def download_artifacts(artifact_uri: str) -> str:
+    """Baixa um artefato logado (ex.: 'runs:/<run_id>/compact_model/x.npz'); retorna o caminho local."""
+    from mlflow.artifacts import download_artifacts as _download
+    return _download(artifact_uri=artifact_uri)
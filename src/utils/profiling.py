@@ -0,0 +1,418 @@
+import functools
+import os
+import resource
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+# Intervalo (s) entre leituras do RSS pelo amostrador de pico de memória
+RSS_INTERVAL = 0.01
+# Intervalo (s) do profiler por amostragem de pilhas (opt-in)
+STACK_INTERVAL = 0.005
+# Artefatos do perfil logados no run do MLflow
+PROFILE_ARTIFACT = 'profile/spans.json'
+STACKS_ARTIFACT = 'profile/stacks.folded'
+# Prefixo das métricas de performance no MLflow
+METRIC_PREFIX = 'perf'
+# Spans raiz guardados em memória (os mais antigos são descartados)
+MAX_ROOTS = 1000
+
+# PIPELINE_PROFILING=false desliga os spans; PIPELINE_PROFILE_SAMPLING=true liga o profiler de pilhas
+ENABLED = os.getenv('PIPELINE_PROFILING', 'true').lower() != 'false'
+SAMPLING = os.getenv('PIPELINE_PROFILE_SAMPLING', 'false').lower() == 'true'
+
+try:
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def current_rss() -> int:
+    """Memória residente (bytes) do processo atual.
+
+    No Linux lê ``/proc/self/statm``; nos demais sistemas cai para o pico do
+    ``getrusage`` (que só cresce, mas é o melhor disponível sem psutil).
+    """
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return max_rss()
+
+
+def max_rss() -> int:
+    """Pico de memória residente (bytes) do processo desde o início."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reporta em bytes, Linux em KiB
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class PeakMemory:
+    """
+    Pico de RSS durante um bloco ``with``.
+
+    Uma thread lê o RSS a cada ``interval`` segundos; ``peak`` é o maior valor
+    visto e ``delta`` quanto ele ficou acima do RSS na entrada do bloco.
+    Memória de processos filhos (ex.: workers do joblib) não entra na conta.
+    """
+    def __init__(self, interval: float = RSS_INTERVAL):
+        self.interval = interval
+        self.start: int = 0
+        self.peak: int = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self) -> 'PeakMemory':
+        self.start = self.peak = current_rss()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, name='peak-memory', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+        return False
+
+    @property
+    def delta(self) -> int:
+        return max(self.peak - self.start, 0)
+
+
+# ---------- spans ----------
+
+class Span:
+    """Medição de um estágio: tempo de parede/CPU, pico de RSS, linhas e bytes."""
+    __slots__ = ('name', 'parent', 'children', 'attrs', 'rows_in', 'rows_out', 'bytes',
+                 'wall_s', 'cpu_s', 'rss_start', 'peak_rss', '_start', '_cpu')
+
+    def __init__(self, name: str, parent: Optional['Span'] = None, rows_in: Optional[int] = None, **attrs):
+        self.name = name
+        self.parent = parent
+        self.children: List[Span] = []
+        self.attrs = attrs
+        self.rows_in = rows_in
+        self.rows_out: Optional[int] = None
+        self.bytes = 0
+        self.wall_s = self.cpu_s = 0.0
+        self.rss_start = self.peak_rss = current_rss()
+        self._start = time.perf_counter()
+        self._cpu = time.process_time()
+
+    @property
+    def path(self) -> str:
+        return self.name if self.parent is None else f"{self.parent.path}/{self.name}"
+
+    def add_bytes(self, n: int):
+        self.bytes += int(n)
+
+    def _finish(self):
+        self.wall_s = time.perf_counter() - self._start
+        self.cpu_s = time.process_time() - self._cpu
+        self.peak_rss = max(self.peak_rss, current_rss())
+        if self.parent is not None:
+            self.parent.peak_rss = max(self.parent.peak_rss, self.peak_rss)
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name, 'wall_s': round(self.wall_s, 6), 'cpu_s': round(self.cpu_s, 6),
+            'peak_rss_mb': round(self.peak_rss / 1024 ** 2, 1),
+            'rss_delta_mb': round(max(self.peak_rss - self.rss_start, 0) / 1024 ** 2, 1),
+            'rows_in': self.rows_in, 'rows_out': self.rows_out, 'bytes': self.bytes,
+            **({'attrs': self.attrs} if self.attrs else {}),
+            'children': [c.to_dict() for c in self.children],
+        }
+
+
+class _Recorder:
+    """Pilha de spans por thread, spans raiz concluídos e o monitor de RSS."""
+    def __init__(self):
+        self.local = threading.local()
+        self.roots = deque(maxlen=MAX_ROOTS)
+        self.open: set = set()
+        self.cond = threading.Condition()
+        self.monitor: Optional[threading.Thread] = None
+
+    def stack(self) -> List[Span]:
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def _watch(self):
+        # Atualiza o pico de todos os spans abertos; dorme quando não há nenhum
+        while True:
+            with self.cond:
+                while not self.open:
+                    self.cond.wait()
+                spans = list(self.open)
+            rss = current_rss()
+            for s in spans:
+                if rss > s.peak_rss:
+                    s.peak_rss = rss
+            time.sleep(RSS_INTERVAL)
+
+    def push(self, span: Span):
+        self.stack().append(span)
+        with self.cond:
+            self.open.add(span)
+            if self.monitor is None:
+                self.monitor = threading.Thread(target=self._watch, name='span-rss', daemon=True)
+                self.monitor.start()
+            self.cond.notify()
+
+    def pop(self, span: Span):
+        span._finish()
+        stack = self.stack()
+        if stack and stack[-1] is span:
+            stack.pop()
+        with self.cond:
+            self.open.discard(span)
+        if span.parent is None:
+            self.roots.append(span)
+
+
+_RECORDER = _Recorder()
+
+
+def current_span() -> Optional[Span]:
+    stack = _RECORDER.stack()
+    return stack[-1] if stack else None
+
+
+def add_bytes(n: int):
+    """Soma ``n`` bytes movidos (arquivo, COPY, rede) ao span atual, se houver."""
+    s = current_span()
+    if s is not None:
+        s.add_bytes(n)
+
+
+def add_rows_in(n: int):
+    """Soma ``n`` linhas de entrada ao span atual (ex.: blocos consumidos de um gerador)."""
+    s = current_span()
+    if s is not None:
+        s.rows_in = (s.rows_in or 0) + int(n)
+
+
+def count_rows(obj) -> Optional[int]:
+    """Linhas de um DataFrame/Series/array (ou do primeiro item de uma tupla)."""
+    if isinstance(obj, tuple) and obj:
+        obj = obj[0]
+    shape = getattr(obj, 'shape', None)
+    if shape:
+        return int(shape[0])
+    return None
+
+
+@contextmanager
+def span(name: str, rows_in: Optional[int] = None, **attrs) -> Iterator[Optional[Span]]:
+    """Mede o bloco como um span filho do span atual da thread.
+
+    Dentro do bloco, ``s.rows_out``/``s.add_bytes`` completam a medição.
+    Com o profiling desligado devolve ``None`` e não mede nada.
+    """
+    if not ENABLED:
+        yield None
+        return
+    s = Span(name, parent=current_span(), rows_in=rows_in, **attrs)
+    if s.parent is not None:
+        s.parent.children.append(s)
+    _RECORDER.push(s)
+    try:
+        yield s
+    finally:
+        _RECORDER.pop(s)
+
+
+def profiled(name: Optional[str] = None, rows_in: Optional[Callable] = None,
+             rows_out: Optional[Callable] = count_rows):
+    """Decorator que mede a função como um span.
+
+    ``rows_in(*args, **kwargs)`` conta as linhas de entrada (ex.:
+    ``lambda self, *a, **k: len(self.df)``) e ``rows_out(resultado)`` as de
+    saída; por padrão a saída é contada por ``count_rows``.
+    """
+    def decorate(fn):
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            with span(label, rows_in=rows_in(*args, **kwargs) if rows_in else None) as s:
+                result = fn(*args, **kwargs)
+                if rows_out is not None:
+                    s.rows_out = rows_out(result)
+                return result
+        return wrapper
+    return decorate
+
+
+def self_rows(attr: str) -> Callable:
+    """``rows_in`` para métodos: linhas do atributo ``attr`` da instância."""
+    def rows(self, *args, **kwargs):
+        return count_rows(getattr(self, attr, None))
+    return rows
+
+
+def completed() -> List[Span]:
+    """Spans raiz já concluídos (mais antigos primeiro)."""
+    return list(_RECORDER.roots)
+
+
+def reset():
+    _RECORDER.roots.clear()
+
+
+# ---------- profiler por amostragem ----------
+
+class StackSampler:
+    """
+    Profiler por amostragem (opt-in) de uma thread.
+
+    A cada ``interval`` segundos captura a pilha Python da thread alvo e
+    conta as pilhas no formato "folded" (``a;b;c N``), que pode ser aberto
+    direto em flamegraph.pl/speedscope.
+    """
+    def __init__(self, thread_id: Optional[int] = None, interval: float = STACK_INTERVAL):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def start(self) -> 'StackSampler':
+        self._thread = threading.Thread(target=self._sample, name='stack-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def folded(self) -> str:
+        return '\n'.join(f"{stack} {n}" for stack, n in self.counts.most_common())
+
+
+# ---------- relatório / MLflow ----------
+
+def flatten(root: Span) -> List[dict]:
+    """Uma linha por caminho de span (chamadas repetidas são somadas)."""
+    rows: Dict[str, dict] = {}
+
+    def visit(s: Span):
+        row = rows.get(s.path)
+        if row is None:
+            row = rows[s.path] = {'path': s.path, 'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'peak_rss_mb': 0.0,
+                                  'rows_in': 0, 'rows_out': 0, 'bytes': 0}
+        row['calls'] += 1
+        row['wall_s'] += s.wall_s
+        row['cpu_s'] += s.cpu_s
+        row['peak_rss_mb'] = max(row['peak_rss_mb'], round(s.peak_rss / 1024 ** 2, 1))
+        row['rows_in'] += s.rows_in or 0
+        row['rows_out'] += s.rows_out or 0
+        row['bytes'] += s.bytes
+        for child in s.children:
+            visit(child)
+    visit(root)
+    return list(rows.values())
+
+
+def _metric_key(path: str) -> str:
+    # Nomes de métrica do MLflow: alfanuméricos, _ - . / e espaço
+    return ''.join(c if c.isalnum() or c in '_-./ ' else '_' for c in path)
+
+
+def log_profile(root: Span, run_id: Optional[str] = None, sampler: Optional[StackSampler] = None):
+    """Loga o perfil como métricas ``perf/<caminho>/<medida>`` e artefatos JSON/folded."""
+    from src.utils.mlflow_client import log_dict, log_metrics, log_text
+    metrics = {}
+    for row in flatten(root):
+        key = f"{METRIC_PREFIX}/{_metric_key(row['path'])}"
+        metrics[f"{key}/wall_s"] = row['wall_s']
+        metrics[f"{key}/cpu_s"] = row['cpu_s']
+        metrics[f"{key}/peak_rss_mb"] = row['peak_rss_mb']
+        for field in ('rows_in', 'rows_out', 'bytes'):
+            if row[field]:
+                metrics[f"{key}/{field}"] = row[field]
+    log_metrics(metrics, run_id=run_id)
+    log_dict(root.to_dict(), PROFILE_ARTIFACT, run_id=run_id)
+    if sampler is not None and sampler.counts:
+        log_text(sampler.folded(), STACKS_ARTIFACT, run_id=run_id)
+
+
+def print_profile(root: Span):
+    for row in flatten(root):
+        depth = row['path'].count('/')
+        extra = ''
+        if row['rows_in'] or row['rows_out']:
+            extra += f", linhas {row['rows_in'] or '-'} -> {row['rows_out'] or '-'}"
+        if row['bytes']:
+            extra += f", {row['bytes'] / 1024 ** 2:.1f} MB movidos"
+        print(f"   {'  ' * depth}{row['path'].rsplit('/', 1)[-1]}: {row['wall_s']:.2f}s "
+              f"(cpu {row['cpu_s']:.2f}s, pico {row['peak_rss_mb']:.0f} MB{extra})")
+
+
+@contextmanager
+def profile_task(name: str, sampling: Optional[bool] = None, log: bool = True) -> Iterator[Optional[Span]]:
+    """Span raiz de uma tarefa (ex.: task do DAG) com log do perfil no MLflow.
+
+    O perfil vai para o run do MLflow usado pela tarefa (o ativo no fim ou o
+    último encerrado durante ela); se a tarefa não abriu nenhum run, um run
+    ``<name>-profile`` é criado só para ele. ``sampling`` (ou
+    PIPELINE_PROFILE_SAMPLING=true) liga o profiler de pilhas e loga as
+    pilhas em ``profile/stacks.folded``. Com ou sem profiling, o buffer do
+    modo async do cliente MLflow é descarregado no fim da tarefa.
+    """
+    from src.utils.mlflow_client import flush
+    try:
+        if not ENABLED:
+            yield None
+            return
+        yield from _profile_task(name, sampling, log)
+    finally:
+        # O Airflow encerra o processo da tarefa com os._exit (sem atexit):
+        # no modo async, só o flush aqui garante a entrega das escritas
+        flush()
+
+
+def _profile_task(name: str, sampling: Optional[bool], log: bool) -> Iterator[Span]:
+    from src.utils.mlflow_client import active_run, last_active_run, start_run
+    before = last_active_run()
+    sampler = StackSampler().start() if (SAMPLING if sampling is None else sampling) else None
+    try:
+        with span(name) as root:
+            yield root
+    finally:
+        if sampler is not None:
+            sampler.stop()
+    print(f"⏱️ Perfil de '{name}':")
+    print_profile(root)
+    if not log:
+        return
+    run = active_run() or last_active_run()
+    if run is not None and (before is None or run.info.run_id != before.info.run_id):
+        log_profile(root, run_id=run.info.run_id, sampler=sampler)
+    else:
+        with start_run(run_name=f"{name}-profile"):
+            log_profile(root, sampler=sampler)
@@ -0,0 +1,218 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import weakref
+import numpy as np
+import pandas as pd
+from typing import Any, Callable, Dict, Optional, Tuple
+from src.ingest.cache import file_digest
+from src.utils.profiling import count_rows, span
+
+DEFAULT_MAX_BYTES = 5 * 1024 ** 3
+
+
+class SourceFile:
+    """Referência a um arquivo de entrada; o fingerprint é o hash do conteúdo.
+
+    'touch' ou cópia do arquivo não invalidam os estágios; reescrita com o
+    mesmo tamanho e mtime, sim. O hash é calculado uma vez por processo
+    para cada (caminho, tamanho, mtime).
+    """
+    _digests: Dict[Tuple[str, int, int], str] = {}
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __fspath__(self) -> str:
+        return self.path
+
+    def fingerprint(self) -> str:
+        st = os.stat(self.path)
+        key = (os.path.abspath(self.path), st.st_size, st.st_mtime_ns)
+        if key not in self._digests:
+            self._digests[key] = file_digest(self.path)
+        return f"file:{self._digests[key]}"
+
+
+class StageCache:
+    """
+    Cache de estágios do pipeline endereçado por conteúdo.
+
+    A chave de um estágio é o hash do nome + fingerprint das entradas
+    (dados, parâmetros, hiperparâmetros do estimador). Saídas ficam em
+    ``root/<chave>/``: DataFrames/Series em Parquet, o resto com joblib.
+    Objetos devolvidos por um estágio herdam a chave dele como fingerprint
+    (linhagem), então o próximo estágio não precisa re-hashear os dados.
+    O tamanho total é limitado por ``max_bytes`` com despejo LRU.
+    """
+    def __init__(self, root: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lineage = {}
+        os.makedirs(root, exist_ok=True)
+
+    # ---------- fingerprints ----------
+
+    def fingerprint(self, obj: Any) -> str:
+        ref = self._lineage.get(id(obj))
+        if ref is not None and ref[0]() is obj:
+            return ref[1]
+        h = hashlib.sha256()
+        self._update(h, obj)
+        return h.hexdigest()
+
+    def _update(self, h, obj: Any):
+        ref = self._lineage.get(id(obj))
+        if ref is not None and ref[0]() is obj:
+            h.update(f"lineage:{ref[1]}".encode())
+        elif isinstance(obj, pd.DataFrame):
+            h.update(b"frame")
+            h.update(json.dumps([(str(c), str(t)) for c, t in obj.dtypes.items()]).encode())
+            h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+        elif isinstance(obj, pd.Series):
+            h.update(f"series:{obj.name}:{obj.dtype}".encode())
+            h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+        elif isinstance(obj, np.ndarray):
+            h.update(f"array:{obj.dtype}:{obj.shape}".encode())
+            h.update(np.ascontiguousarray(obj).tobytes())
+        elif hasattr(obj, 'fingerprint'):
+            h.update(obj.fingerprint().encode())
+        elif hasattr(obj, 'get_params'):
+            # Estimador sklearn: classe + hiperparâmetros
+            params = {k: v for k, v in obj.get_params(deep=False).items()}
+            h.update(f"estimator:{type(obj).__module__}.{type(obj).__qualname__}".encode())
+            self._update(h, params)
+        elif isinstance(obj, dict):
+            h.update(b"dict")
+            for k in sorted(obj, key=str):
+                h.update(str(k).encode())
+                self._update(h, obj[k])
+        elif isinstance(obj, (list, tuple)):
+            h.update(f"seq:{len(obj)}".encode())
+            for item in obj:
+                self._update(h, item)
+        else:
+            h.update(f"{type(obj).__name__}:{obj!r}".encode())
+
+    def _remember(self, obj: Any, key: str):
+        try:
+            self._lineage[id(obj)] = (weakref.ref(obj), key)
+        except TypeError:
+            # tuple/list/dict não aceitam weakref: registra os elementos
+            if isinstance(obj, (tuple, list)):
+                for i, item in enumerate(obj):
+                    self._remember(item, f"{key}:{i}")
+
+    # ---------- armazenamento ----------
+
+    def _dir(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def _save(self, value: Any, path: str):
+        os.makedirs(path, exist_ok=True)
+        if isinstance(value, pd.DataFrame):
+            value.to_parquet(os.path.join(path, 'frame.parquet'))
+        elif isinstance(value, pd.Series):
+            value.to_frame().to_parquet(os.path.join(path, 'series.parquet'))
+        elif isinstance(value, tuple):
+            with open(os.path.join(path, 'tuple.json'), 'w') as f:
+                json.dump({'size': len(value)}, f)
+            for i, item in enumerate(value):
+                self._save(item, os.path.join(path, f"part_{i}"))
+        else:
+            import joblib
+            joblib.dump(value, os.path.join(path, 'object.joblib'))
+
+    def _load(self, path: str) -> Any:
+        if os.path.exists(os.path.join(path, 'frame.parquet')):
+            return pd.read_parquet(os.path.join(path, 'frame.parquet'))
+        if os.path.exists(os.path.join(path, 'series.parquet')):
+            frame = pd.read_parquet(os.path.join(path, 'series.parquet'))
+            return frame[frame.columns[0]]
+        if os.path.exists(os.path.join(path, 'tuple.json')):
+            with open(os.path.join(path, 'tuple.json')) as f:
+                size = json.load(f)['size']
+            return tuple(self._load(os.path.join(path, f"part_{i}")) for i in range(size))
+        import joblib
+        return joblib.load(os.path.join(path, 'object.joblib'))
+
+    @staticmethod
+    def _dir_size(path: str) -> int:
+        return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+    def _read_meta(self, key: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(self._dir(key), 'meta.json')) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_meta(self, key: str, meta: dict):
+        with open(os.path.join(self._dir(key), 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        meta = self._read_meta(key)
+        if meta is None:
+            return False, None
+        value = self._load(os.path.join(self._dir(key), 'data'))
+        meta['last_access'] = time.time()
+        self._write_meta(key, meta)
+        return True, value
+
+    def put(self, key: str, stage: str, value: Any):
+        tmp = self._dir(key) + '.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        self._save(value, os.path.join(tmp, 'data'))
+        shutil.rmtree(self._dir(key), ignore_errors=True)
+        os.replace(tmp, self._dir(key))
+        now = time.time()
+        self._write_meta(key, {'stage': stage, 'size': self._dir_size(self._dir(key)),
+                               'created': now, 'last_access': now})
+        self.evict()
+
+    def evict(self):
+        """Remove as entradas menos usadas recentemente até caber em ``max_bytes``."""
+        entries = []
+        for key in os.listdir(self.root):
+            meta = self._read_meta(key)
+            if meta is not None:
+                entries.append((meta['last_access'], meta['size'], key))
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self._dir(key), ignore_errors=True)
+            total -= size
+            print(f"🧹 Cache: entrada {key[:12]} removida (LRU).")
+
+    # ---------- execução ----------
+
+    def run(self, stage: str, fn: Callable, *args, **kwargs) -> Any:
+        """Executa ``fn(*args, **kwargs)`` ou devolve a saída já em cache.
+
+        A chave combina o nome do estágio com o fingerprint de todos os
+        argumentos, então mudar só os hiperparâmetros de um estágio
+        recomputa apenas ele (e os que dependem dele).
+        """
+        h = hashlib.sha256(f"stage:{stage}".encode())
+        self._update(h, list(args))
+        self._update(h, kwargs)
+        key = h.hexdigest()
+
+        with span(f"stage:{stage}") as s:
+            hit, value = self.get(key)
+            if hit:
+                print(f"♻️ Estágio '{stage}' reaproveitado do cache ({key[:12]}).")
+            else:
+                start = time.perf_counter()
+                value = fn(*args, **kwargs)
+                self.put(key, stage, value)
+                print(f"💾 Estágio '{stage}' executado em {time.perf_counter() - start:.1f}s e salvo no cache ({key[:12]}).")
+            if s is not None:
+                s.attrs['cache_hit'] = hit
+                s.rows_out = count_rows(value)
+        self._remember(value, key)
+        return value
@@ -1,6 +1,16 @@
+import io
+import tempfile
+from contextlib import contextmanager
 import pandas as pd
-from sqlalchemy import create_engine, text
-from typing import Optional
+import numpy as np
+from sqlalchemy import create_engine, inspect, text, types as sa_types
+from typing import Dict, Iterable, Iterator, List, Optional
+from src.utils.profiling import add_bytes, add_rows_in, profiled, span
+
+# Linhas por bloco enviado no COPY / lidas por fetch
+DEFAULT_CHUNK_ROWS = 100_000
+# Acima disso o buffer de leitura do COPY TO STDOUT vai para disco
+SPOOL_MAX_BYTES = 64 * 1024 * 1024
 
 
 def get_engine(db_url: str):
@@ -8,45 +18,361 @@ def get_engine(db_url: str):
     return create_engine(db_url)
 
 
-def read_table(engine, table_name: str) -> pd.DataFrame:
-    """Lê toda a tabela para um DataFrame usando SQLAlchemy Connection.
+def is_postgres(engine) -> bool:
+    return engine.dialect.name == 'postgresql'
+
+
+@contextmanager
+def _dbapi_connection(engine):
+    """Conexão DBAPI "crua" do engine.
+
+    Pandas só aceita SQLAlchemy >= 2.0 como connectable; com a versão usada
+    pelo Airflow passamos a conexão DBAPI (sqlite3 é suportado nativamente).
+    """
+    raw_conn = engine.raw_connection()
+    try:
+        yield getattr(raw_conn, 'driver_connection', None) or raw_conn.connection
+        raw_conn.commit()
+    finally:
+        raw_conn.close()
+
+
+def _quote(col: str) -> str:
+    return '"' + str(col).replace('"', '""') + '"'
+
+
+def pg_type(dtype) -> str:
+    """Traduz um dtype do pandas para o tipo de coluna Postgres equivalente."""
+    if isinstance(dtype, pd.CategoricalDtype):
+        return pg_type(dtype.categories.dtype)
+    if pd.api.types.is_bool_dtype(dtype):
+        return 'BOOLEAN'
+    if pd.api.types.is_integer_dtype(dtype):
+        size = np.dtype(getattr(dtype, 'numpy_dtype', dtype)).itemsize
+        return {1: 'SMALLINT', 2: 'SMALLINT', 4: 'INTEGER'}.get(size, 'BIGINT')
+    if pd.api.types.is_float_dtype(dtype):
+        size = np.dtype(getattr(dtype, 'numpy_dtype', dtype)).itemsize
+        return 'REAL' if size <= 4 else 'DOUBLE PRECISION'
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return 'TIMESTAMP'
+    return 'TEXT'
+
+
+def table_ddl(df: pd.DataFrame, table_name: str) -> str:
+    """CREATE TABLE tipado a partir dos dtypes do DataFrame.
+
+    Colunas inteiras não-nulas do pandas viram NOT NULL, o que permite
+    devolvê-las como inteiros numpy na leitura.
+    """
+    cols = []
+    for col, dtype in df.dtypes.items():
+        ddl = f"{_quote(col)} {pg_type(dtype)}"
+        if pd.api.types.is_integer_dtype(dtype) and not pd.api.types.is_extension_array_dtype(dtype):
+            ddl += ' NOT NULL'
+        cols.append(ddl)
+    return f"CREATE TABLE {table_name} ({', '.join(cols)});"
+
+
+def _iter_csv_blocks(chunks: Iterable[pd.DataFrame], chunk_rows: int) -> Iterator[bytes]:
+    """Serializa os DataFrames em blocos CSV de no máximo ``chunk_rows`` linhas."""
+    for chunk in chunks:
+        for start in range(0, len(chunk), chunk_rows):
+            block = chunk.iloc[start:start + chunk_rows].to_csv(index=False, header=False).encode('utf-8')
+            add_bytes(len(block))
+            yield block
+
+
+class _GeneratorReader(io.RawIOBase):
+    """Adapta um gerador de bytes à interface de arquivo esperada pelo COPY."""
+    def __init__(self, blocks: Iterator[bytes]):
+        self._blocks = blocks
+        self._buffer = b''
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += next(self._blocks)
+            except StopIteration:
+                break
+        if size < 0:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def _copy_from_chunks(engine, chunks: Iterator[pd.DataFrame], first: pd.DataFrame,
+                      table_name: str, if_exists: str, chunk_rows: int):
+    raw_conn = engine.raw_connection()
+    cur = raw_conn.cursor()
+    try:
+        if if_exists == 'replace':
+            cur.execute(f"DROP TABLE IF EXISTS {table_name};")
+        cur.execute("SELECT to_regclass(%s);", (table_name,))
+        exists = cur.fetchone()[0] is not None
+        if exists and if_exists == 'fail':
+            raise ValueError(f"Tabela '{table_name}' já existe.")
+        if not exists:
+            cur.execute(table_ddl(first, table_name))
+
+        cols = ', '.join(_quote(c) for c in first.columns)
+
+        def all_chunks():
+            add_rows_in(len(first))
+            yield first
+            for chunk in chunks:
+                add_rows_in(len(chunk))
+                yield chunk[first.columns]
+
+        reader = _GeneratorReader(_iter_csv_blocks(all_chunks(), chunk_rows))
+        cur.copy_expert(f"COPY {table_name} ({cols}) FROM STDIN WITH CSV", reader)
+        raw_conn.commit()
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        try:
+            cur.close()
+        except Exception:
+            pass
+        try:
+            raw_conn.close()
+        except Exception:
+            pass
+
+
+@profiled('storage.save_chunks', rows_out=None)
+def save_chunks(engine, chunks: Iterable[pd.DataFrame], table_name: str,
+                if_exists: str = 'replace', chunk_rows: int = DEFAULT_CHUNK_ROWS):
+    """Grava uma sequência (ou gerador) de DataFrames em uma tabela tipada.
+
+    Em Postgres os blocos são enviados em um único ``COPY ... FROM STDIN``
+    alimentado sob demanda, sem materializar o CSV inteiro em memória.
+    Outros dialetos (ex.: SQLite) usam ``to_sql`` bloco a bloco.
+    """
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        return
+
+    if is_postgres(engine):
+        _copy_from_chunks(engine, chunks, first, table_name, if_exists, chunk_rows)
+        return
+
+    sql_types = {col: pg_type(dtype) for col, dtype in first.dtypes.items()}
+    with _dbapi_connection(engine) as conn:
+        add_rows_in(len(first))
+        first.to_sql(table_name, con=conn, if_exists=if_exists, index=False, chunksize=chunk_rows, dtype=sql_types)
+        for chunk in chunks:
+            add_rows_in(len(chunk))
+            chunk[first.columns].to_sql(table_name, con=conn, if_exists='append', index=False, chunksize=chunk_rows)
 
-    Evita passar diretamente objetos que não exponham .cursor() para pandas
-    em alguns ambientes.
+
+def save_df(engine, df: pd.DataFrame, table_name: str, if_exists: str = 'replace',
+            chunk_rows: int = DEFAULT_CHUNK_ROWS):
+    """Salva um DataFrame no banco com colunas tipadas (ver ``save_chunks``)."""
+    save_chunks(engine, [df], table_name, if_exists=if_exists, chunk_rows=chunk_rows)
+
+
+def table_exists(engine, table_name: str) -> bool:
+    return inspect(engine).has_table(table_name)
+
+
+def delete_rows(engine, table_name: str, where: str, params: Optional[dict] = None):
+    """Remove as linhas que atendem ao filtro (no-op se a tabela não existir)."""
+    if not table_exists(engine, table_name):
+        return
+    with engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM {table_name} WHERE {where}"), params or {})
+
+
+def drop_table(engine, table_name: str):
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {table_name}"))
+
+
+def move_rows(engine, source: str, target: str, where: Optional[str] = None, params: Optional[dict] = None) -> int:
+    """Move as linhas de ``source`` para ``target`` dentro do banco e remove ``source``.
+
+    Se ``target`` ainda não existe, ``source`` é apenas renomeada (mantém os
+    tipos das colunas). ``where`` apaga antes esse intervalo de ``target``,
+    tornando o reprocessamento idempotente. Tudo em uma transação.
     """
+    columns = [c['name'] for c in inspect(engine).get_columns(source)]
+    with engine.begin() as conn:
+        rows = conn.execute(text(f"SELECT COUNT(*) FROM {source}")).scalar()
+        if not inspect(conn).has_table(target):
+            conn.execute(text(f"ALTER TABLE {source} RENAME TO {target}"))
+            return int(rows)
+        if where:
+            conn.execute(text(f"DELETE FROM {target} WHERE {where}"), params or {})
+        cols = ', '.join(_quote(c) for c in columns)
+        conn.execute(text(f"INSERT INTO {target} ({cols}) SELECT {cols} FROM {source}"))
+        conn.execute(text(f"DROP TABLE {source}"))
+    return int(rows)
+
+
+def distinct_values(engine, table_name: str, column: str) -> List:
+    """Valores distintos de uma coluna, calculados no banco."""
     with engine.connect() as conn:
-        result = conn.execute(text(f"SELECT * FROM {table_name}"))
-        rows = result.fetchall()
-        cols = result.keys()
-    return pd.DataFrame(rows, columns=cols)
+        rows = conn.execute(text(f"SELECT DISTINCT {_quote(column)} FROM {table_name}"))
+        return [r[0] for r in rows]
+
+
+def _column_dtypes(engine, table_name: str, text_as_category: bool) -> Dict[str, object]:
+    """Mapeia os tipos das colunas da tabela para dtypes do pandas."""
+    dtypes = {}
+    for col in inspect(engine).get_columns(table_name):
+        t, nullable = col['type'], col.get('nullable', True)
+        if isinstance(t, sa_types.Boolean):
+            dtypes[col['name']] = 'boolean' if nullable else 'bool'
+        elif isinstance(t, sa_types.Integer):
+            if isinstance(t, sa_types.SmallInteger):
+                size = 'int16'
+            elif isinstance(t, sa_types.BigInteger):
+                size = 'int64'
+            elif engine.dialect.name == 'sqlite':
+                size = 'int64'
+            else:
+                size = 'int32'
+            dtypes[col['name']] = size.capitalize() if nullable else size
+        elif isinstance(t, (sa_types.Float, sa_types.Numeric)):
+            # REAL é 4 bytes no Postgres, mas 8 bytes no SQLite
+            single = type(t).__name__ == 'REAL' and is_postgres(engine)
+            dtypes[col['name']] = 'float32' if single else 'float64'
+        elif isinstance(t, sa_types.String):
+            dtypes[col['name']] = 'category' if text_as_category else 'object'
+    return dtypes
+
+
+def _apply_dtypes(df: pd.DataFrame, dtypes: Dict[str, object]) -> pd.DataFrame:
+    """Aplica os dtypes e rebaixa inteiros anuláveis sem nulos para numpy."""
+    df = df.astype(dtypes)
+    for col, dtype in dtypes.items():
+        if isinstance(dtype, str) and dtype[0] == 'I' and not df[col].hasnans:
+            df[col] = df[col].astype(dtype.lower())
+    return df
+
+
+def _select_sql(table_name: str, columns: Optional[List[str]], where: Optional[str],
+                limit: Optional[int] = None) -> str:
+    cols = ', '.join(_quote(c) for c in columns) if columns else '*'
+    sql = f"SELECT {cols} FROM {table_name}"
+    if where:
+        sql += f" WHERE {where}"
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"
+    return sql
+
 
+def _literal_sql(engine, sql: str, params: Optional[dict]) -> str:
+    """Interpola os parâmetros de forma segura (COPY não aceita bind params)."""
+    if not params:
+        return sql
+    stmt = text(sql).bindparams(**params)
+    return str(stmt.compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True}))
 
-def save_df(engine, df: pd.DataFrame, table_name: str, if_exists: str = 'replace'):
-    """Salva um DataFrame no banco. Para Postgres usa COPY via raw_connection
-    para maior compatibilidade e performance; fallback para pandas.to_sql.
+
+@profiled('storage.read_table')
+def read_table(engine, table_name: str, columns: Optional[List[str]] = None,
+               where: Optional[str] = None, params: Optional[dict] = None,
+               text_as_category: bool = True, limit: Optional[int] = None) -> pd.DataFrame:
+    """Lê a tabela (ou parte dela) para um DataFrame já tipado.
+
+    ``columns`` restringe as colunas e ``where`` é um filtro SQL com
+    parâmetros nomeados no estilo ``:nome`` (ex.: ``where='"MONTH" = :m'``,
+    ``params={'m': 1}``); ``limit`` limita o número de linhas. Em Postgres usa ``COPY (SELECT ...) TO STDOUT`` para
+    um buffer que transborda para disco, e o CSV é parseado direto nos dtypes
+    derivados do schema da tabela — sem tuplas Python intermediárias.
     """
+    dtypes = _column_dtypes(engine, table_name, text_as_category)
+    if columns:
+        dtypes = {c: dtypes[c] for c in columns if c in dtypes}
+    sql = _select_sql(table_name, columns, where, limit)
+
+    if not is_postgres(engine):
+        with _dbapi_connection(engine) as conn:
+            with span('read_sql_query'):
+                df = pd.read_sql_query(sql, conn, params=params or {})
+        with span('apply_dtypes'):
+            return _apply_dtypes(df, dtypes)
+
+    raw_conn = engine.raw_connection()
     try:
-        raw_conn = engine.raw_connection()
         cur = raw_conn.cursor()
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, mode='w+b') as buf:
+            with span('copy_out'):
+                cur.copy_expert(f"COPY ({_literal_sql(engine, sql, params)}) TO STDOUT WITH CSV HEADER", buf)
+                add_bytes(buf.tell())
+            cur.close()
+            buf.seek(0)
+            with span('parse_csv'):
+                return _apply_dtypes(pd.read_csv(buf, dtype=dtypes), dtypes)
+    finally:
+        raw_conn.close()
+
+
+def iter_table(engine, table_name: str, columns: Optional[List[str]] = None,
+               where: Optional[str] = None, params: Optional[dict] = None,
+               chunksize: int = DEFAULT_CHUNK_ROWS,
+               text_as_category: bool = True, spool: bool = False) -> Iterator[pd.DataFrame]:
+    """Itera sobre a tabela em blocos tipados de até ``chunksize`` linhas.
+
+    Em Postgres usa um cursor do lado do servidor (named cursor), então só um
+    bloco por vez fica em memória no cliente. Com ``spool`` o resultado vem
+    por ``COPY ... TO STDOUT`` para um buffer que transborda para disco e é
+    parseado em blocos: bem mais rápido que montar tuplas Python, ao custo
+    de transferir a consulta inteira antes do primeiro bloco. Nos outros
+    dialetos ``spool`` lê a consulta inteira e fecha a conexão antes de
+    iterar, para que o consumidor possa gravar no mesmo banco (SQLite).
+    """
+    dtypes = _column_dtypes(engine, table_name, text_as_category)
+    if columns:
+        dtypes = {c: dtypes[c] for c in columns if c in dtypes}
+    sql = _select_sql(table_name, columns, where)
+
+    if not is_postgres(engine):
+        if spool:
+            # Lê tudo e libera a conexão antes do primeiro bloco: no SQLite um cursor
+            # aberto segura o lock de leitura e trava quem grava enquanto iteramos
+            with _dbapi_connection(engine) as conn:
+                df = pd.read_sql_query(sql, conn, params=params or {})
+            for start in range(0, len(df), chunksize):
+                yield _apply_dtypes(df.iloc[start:start + chunksize], dtypes)
+            return
+        with _dbapi_connection(engine) as conn:
+            for chunk in pd.read_sql_query(sql, conn, params=params or {}, chunksize=chunksize):
+                yield _apply_dtypes(chunk, dtypes)
+        return
+
+    raw_conn = engine.raw_connection()
+    if spool:
         try:
-            cur.execute(f"DROP TABLE IF EXISTS {table_name};")
-            cols_ddl = ', '.join([f'"{c}" TEXT' for c in df.columns])
-            cur.execute(f"CREATE TABLE {table_name} ({cols_ddl});")
-
-            from io import StringIO
-            csv_buffer = StringIO()
-            df.to_csv(csv_buffer, index=False, header=False)
-            csv_buffer.seek(0)
-            cur.copy_expert(f"COPY {table_name} ({', '.join([f'\"{c}\"' for c in df.columns])}) FROM STDIN WITH CSV", csv_buffer)
-            raw_conn.commit()
-        finally:
-            try:
+            cur = raw_conn.cursor()
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, mode='w+b') as buf:
+                cur.copy_expert(f"COPY ({_literal_sql(engine, sql, params)}) TO STDOUT WITH CSV HEADER", buf)
+                add_bytes(buf.tell())
                 cur.close()
-            except Exception:
-                pass
-            try:
-                raw_conn.close()
-            except Exception:
-                pass
-    except Exception:
-        df.to_sql(table_name, con=engine, if_exists=if_exists, index=False)
+                buf.seek(0)
+                for chunk in pd.read_csv(buf, dtype=dtypes, chunksize=chunksize):
+                    yield _apply_dtypes(chunk, dtypes)
+        finally:
+            raw_conn.close()
+        return
+
+    try:
+        cur = raw_conn.cursor(name=f"iter_{table_name}")
+        cur.itersize = chunksize
+        cur.execute(_literal_sql(engine, sql, params))
+        while True:
+            rows = cur.fetchmany(chunksize)
+            if not rows:
+                break
+            names = [d[0] for d in cur.description]
+            yield _apply_dtypes(pd.DataFrame.from_records(rows, columns=names), dtypes)
+        cur.close()
+    finally:
+        raw_conn.close()
@@ -0,0 +1,55 @@
+import json
+import pandas as pd
+from sqlalchemy import text
+from typing import Optional
+
+WATERMARK_TABLE = 'pipeline_watermarks'
+# Chave de partição diária (YYYYMMDD) gravada nas tabelas raw/silver/gold
+DATE_KEY = 'FLIGHT_DATE'
+
+
+def date_key(df: pd.DataFrame) -> pd.Series:
+    """Calcula a chave YYYYMMDD a partir de YEAR/MONTH/DAY (vetorizado)."""
+    return (
+        df['YEAR'].astype('int32') * 10000
+        + df['MONTH'].astype('int32') * 100
+        + df['DAY'].astype('int32')
+    ).astype('int32')
+
+
+def _ensure_table(conn):
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {WATERMARK_TABLE} ("
+        "table_name TEXT PRIMARY KEY, value BIGINT NOT NULL, meta TEXT)"
+    ))
+
+
+def get_watermark(engine, table_name: str) -> Optional[dict]:
+    """Retorna ``{'value': int, 'meta': dict}`` da tabela, ou None se não houver."""
+    with engine.begin() as conn:
+        _ensure_table(conn)
+        row = conn.execute(
+            text(f"SELECT value, meta FROM {WATERMARK_TABLE} WHERE table_name = :t"),
+            {'t': table_name},
+        ).fetchone()
+    if row is None:
+        return None
+    return {'value': int(row[0]), 'meta': json.loads(row[1]) if row[1] else {}}
+
+
+def set_watermark(engine, table_name: str, value: int, meta: Optional[dict] = None):
+    """Grava (ou substitui) a marca d'água da tabela."""
+    with engine.begin() as conn:
+        _ensure_table(conn)
+        conn.execute(text(f"DELETE FROM {WATERMARK_TABLE} WHERE table_name = :t"), {'t': table_name})
+        conn.execute(
+            text(f"INSERT INTO {WATERMARK_TABLE} (table_name, value, meta) VALUES (:t, :v, :m)"),
+            {'t': table_name, 'v': int(value), 'm': json.dumps(meta or {})},
+        )
+
+
+def clear_watermark(engine, table_name: str):
+    """Remove a marca d'água, forçando a próxima execução a reconstruir a tabela."""
+    with engine.begin() as conn:
+        _ensure_table(conn)
+        conn.execute(text(f"DELETE FROM {WATERMARK_TABLE} WHERE table_name = :t"), {'t': table_name})